@@ -0,0 +1,241 @@
+"""
+Benchmarks of the hot paths, against the simulated B210 of utils/sim_uhd.py (no hardware needed)
+
+    python benchmarks/run_benchmarks.py                   run and compare with benchmarks/baselines.json
+    python benchmarks/run_benchmarks.py --save-baseline   run and store the results as the new baseline
+
+benchmarks:
+    complex_sinusoid     generating the tx data, full size and compact
+    estimate_amp         the amplitude estimators on one capture
+    calibration          one gain calibration pass over radar_parameters.center_freqs
+    sweep                a full sfcw_seep over radar_parameters.center_freqs, plain and timed; unlocked_samps counts the
+                         samples the simulated device received before its LO's locked, a sweep that is fast because
+                         it captured them is no result
+
+every benchmark reports its time, the peak traced memory and the memory blocks it left allocated (tracemalloc, in a
+second run so that tracing does not slow down the timed run), plus steps per second for the sweeps and captures per
+calibrated frequency for the calibration. A result that is worse than the baseline by more than --tolerance is a
+regression and the script exits with status 1.
+A device second of the simulated device takes --time-scale real seconds; the baseline is only comparable at the same
+time scale on the same machine.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import radar_parameters as params
+from utils.MyB210 import MyB210
+from utils.signals import complex_sinusoid
+from utils.sim_uhd import SimMultiUSRP
+
+BaselinePath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# the direction of every reported metric: True if higher is better
+HigherIsBetter = {
+    "seconds": False,
+    "seconds_per_call": False,
+    "peak_bytes": False,
+    "net_blocks": False,
+    "steps_per_second": True,
+    "captures_per_freq": False,
+    "unlocked_samps": False,
+}
+# the smallest absolute change of a metric that can count as a regression, for the metrics that jitter by a few units
+MinChange = {
+    "net_blocks": 100,
+}
+# metrics that are a regression above this value, whatever the baseline
+MaxValue = {
+    "unlocked_samps": 0,
+}
+
+
+def traced(func):
+    """
+    run func() once under tracemalloc
+    :return: peak_bytes, net_blocks
+            the peak traced memory during func() and the number of memory blocks it left allocated
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    net_blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return peak, net_blocks
+
+
+def timed(func, repeat=1):
+    """
+    :return: the shortest time of repeat runs of func(), in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def per_call(func, repeat=7):
+    """
+    :return: the time of one call of func() in seconds, from the best of repeat runs of a loop of calls that takes
+             at least 0.2 seconds, so that short calls are not lost in the timer and scheduler noise
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def new_device(time_scale):
+    B210 = MyB210(params.samp_rate, params.master_clock_rate, params.tx_bandwidth, params.rx_bandwidth,
+                  usrp=SimMultiUSRP(time_scale=time_scale, seed=0))
+    tx_data, _ = complex_sinusoid(params.samp_rate, compact=True)
+    return B210, tx_data
+
+
+def bench_complex_sinusoid(args):
+    results = {}
+    for name, compact in (("complex_sinusoid", False), ("complex_sinusoid_compact", True)):
+        def run():
+            complex_sinusoid(params.samp_rate, compact=compact)
+        peak, net_blocks = traced(run)
+        results[name] = {"seconds_per_call": per_call(run), "peak_bytes": peak, "net_blocks": net_blocks}
+    return results
+
+
+def bench_estimate_amp(args):
+    rng = np.random.default_rng(0)
+    num_samps = 10 * MyB210.LengthOnePeriod
+    rx_buffer = (rng.standard_normal((2, num_samps)) + 1j * rng.standard_normal((2, num_samps))).astype(np.complex64)
+    results = {}
+    for name, run in (
+            ("estimate_amp", lambda: [MyB210.estimate_amp(rx_buffer[channel]) for channel in (0, 1)]),
+            ("estimate_tone_amp", lambda: MyB210.estimate_tone_amp(rx_buffer, params.samp_rate)),
+    ):
+        peak, net_blocks = traced(run)
+        results[name] = {"seconds_per_call": per_call(run), "peak_bytes": peak, "net_blocks": net_blocks}
+    return results
+
+
+def calibrate(B210, tx_data):
+    B210.thread_send_data(tx_data)
+    B210.get_gains_for_all_freqs(params.center_freqs, params.txA_gain, params.txB_gain, params.target_rxA_amp,
+                                 params.target_rxB_amp, params.amp_tolerence)
+    B210.stop_transmit()
+
+
+def bench_calibration(args):
+    B210, tx_data = new_device(args.time_scale)
+    seconds = timed(lambda: calibrate(B210, tx_data))
+    captures_per_freq = sum(B210.calibration_captures.values()) / len(params.center_freqs)
+    B210, tx_data = new_device(args.time_scale)
+    peak, net_blocks = traced(lambda: calibrate(B210, tx_data))
+    return {"calibration": {"seconds": seconds, "captures_per_freq": captures_per_freq, "peak_bytes": peak,
+                            "net_blocks": net_blocks}}
+
+
+def bench_sweep(args):
+    B210, tx_data = new_device(args.time_scale)
+    calibrate(B210, tx_data)
+    out = B210.sweep_buffer(params.center_freqs)
+    results = {}
+    for name, sweep in (("sweep", B210.sfcw_seep), ("sweep_timed", B210.sfcw_seep_timed)):
+        def run():
+            sweep(tx_data, params.center_freqs, params.txA_gain, params.txB_gain, out=out)
+        B210.usrp.num_unlocked_samps = 0
+        seconds = timed(run)
+        unlocked_samps = B210.usrp.num_unlocked_samps
+        peak, net_blocks = traced(run)
+        results[name] = {"seconds": seconds, "steps_per_second": len(params.center_freqs) / seconds,
+                         "unlocked_samps": unlocked_samps, "peak_bytes": peak, "net_blocks": net_blocks}
+    return results
+
+
+Benchmarks = {
+    "complex_sinusoid": bench_complex_sinusoid,
+    "estimate_amp": bench_estimate_amp,
+    "calibration": bench_calibration,
+    "sweep": bench_sweep,
+}
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: the list of regressions, as printable strings
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            if metric in MaxValue and value > MaxValue[metric]:
+                regressions.append("{} {}: {:.4g}, more than {}".format(name, metric, value, MaxValue[metric]))
+                continue
+            base = baseline.get(name, {}).get(metric)
+            if base is None or base == 0:
+                continue
+            if abs(value - base) < MinChange.get(metric, 0):
+                continue
+            change = (value - base) / base
+            if HigherIsBetter[metric]:
+                change = -change
+            if change > tolerance:
+                regressions.append("{} {}: {:.4g} vs baseline {:.4g} ({:+.0%})".format(
+                    name, metric, value, base, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks of the MyB210 hot paths on the simulated device")
+    parser.add_argument("--only", nargs="*", choices=sorted(Benchmarks), help="run only these benchmarks")
+    parser.add_argument("--time-scale", type=float, default=0.25,
+                        help="real seconds per device second of the simulated device (default 0.25: 4x real time)")
+    parser.add_argument("--baseline", default=BaselinePath, help="the baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="the relative change for a regression (default 0.25)")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only or Benchmarks:
+        results.update(Benchmarks[name](args))
+
+    print("\n{:<28}{}".format("benchmark", "results"))
+    for name, metrics in results.items():
+        print("{:<28}{}".format(name, ", ".join("{} {:.4g}".format(k, v) for k, v in metrics.items())))
+
+    stored = {"time_scale": args.time_scale, "results": {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+
+    if args.save_baseline:
+        stored["time_scale"] = args.time_scale
+        stored["results"].update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+        print("baseline saved into {}".format(args.baseline))
+        return 0
+
+    if stored["time_scale"] != args.time_scale:
+        print("the baseline was measured with --time-scale {}, not compared".format(stored["time_scale"]))
+        return 0
+    regressions = compare(results, stored["results"], args.tolerance)
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    if not regressions:
+        print("no regressions against {}".format(args.baseline))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,10 @@ import numpy as np
 # device parameters
 samp_rate = 1e6    # sample rate of the ADC and DAC for baseband signal
 master_clock_rate = 16e6   # device reference clock rate, should be larger than the samp_rate
+simulate_device = False    # True runs the scripts against the simulated B210 in utils/sim_uhd.py, no hardware needed
+cpu_format = "fc32"   # the host sample format: "fc32" complex64, or "sc16" int16 I/Q at half the memory and disk space
+daemon_address = ("localhost", 6000)  # where sfcw_radar_daemon.py listens for sweep jobs, see utils/radar_service.py
+radio_serials = []  # serials of the B210 units that sfcw_radar_multi.py sweeps in parallel, see utils/multi_radio.py
 tx_bandwidth = 0.2e6  # RF transmit filter bandwidth
 rx_bandwidth = 0.2e6  # RF receiver filter bandwidth
 
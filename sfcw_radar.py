@@ -3,40 +3,38 @@ from utils.MyB210 import MyB210
 from radar_parameters import *
 import numpy as np
 from utils.signals import complex_sinusoid
+from utils.sim_uhd import SimMultiUSRP
+from utils.sweep_writer import NpySweepWriter, export_mat
 
 import time
-import scipy.io
 import os
 # get gain table name
 gain_table_name = input("Enter the gain table name that you want to load: ")
 sfcw_rx_signal_name = input("Enter the file name for the sfcw_rx_signal: ")
 
 # prepare data
-tx_data, length_wave_one_period = complex_sinusoid(samp_rate)
+tx_data, length_wave_one_period = complex_sinusoid(samp_rate, compact=True, cpu_format=cpu_format)
 
 # construct the hardware object
-B210 = MyB210(samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth)
+B210 = MyB210(samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth,
+              usrp=SimMultiUSRP() if simulate_device else None, cpu_format=cpu_format)
 B210.load_gain_table(gain_table_name)
 
+# the sweep streams into memory-mapped .npy files, one frequency step at a time
+npy_path = "./data/npy_data/channel_data_{}".format(sfcw_rx_signal_name)
+writer = NpySweepWriter(npy_path, center_freqs, B210.num_rx_samps,
+                        attrs={"txA_gain": txA_gain, "txB_gain": txB_gain, "samp_rate": samp_rate},
+                        dtype=B210.host_dtype)
+
 start_time = time.time()
-sfcw_rx_signal, center_freqs = B210.sfcw_seep(tx_data, center_freqs, txA_gain, txB_gain)
+with writer:
+    sfcw_rx_signal, center_freqs = B210.sfcw_seep(tx_data, center_freqs, txA_gain, txB_gain, writer=writer)
 end_time = time.time()
 print("sfcw radar survey takes {} seconds".format(end_time - start_time))
-# stop transmit
-B210.stop_transmit()
-
-# save data
-# np.save("./data/npy_data/channel_data_{}.npy".format(sfcw_rx_signal_name), sfcw_rx_signal)
 
-# syntax:
-#   scipy.io.savemat(<string: file path>, <dictionary: {variable_name : numpy data}>)
-
-# file path
+# export the stored sweep for MATLAB
 file_path = "./data/matlab_data/channel_data_{}.mat".format(sfcw_rx_signal_name)
-
-with open(file_path,'wb') as f:  # need 'wb' in Python3
-    scipy.io.savemat(f, {"channel_data_{}".format(sfcw_rx_signal_name): sfcw_rx_signal} )
-    scipy.io.savemat(f, {"center_freqs": center_freqs})
+export_mat(npy_path, file_path, sfcw_rx_signal_name)
 
 # Beep when finish
 duration = 0.3  # second
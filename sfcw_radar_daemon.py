@@ -0,0 +1,13 @@
+from utils.MyB210 import MyB210
+from radar_parameters import *
+from utils.radar_service import RadarService
+from utils.sim_uhd import SimMultiUSRP
+
+# the daemon opens and sets up the B210 once, then serves sweep, calibrate and load-table requests of
+# utils.radar_service.RadarClient until a client sends a shutdown request
+
+# construct the hardware object
+B210 = MyB210(samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth,
+              usrp=SimMultiUSRP() if simulate_device else None, cpu_format=cpu_format)
+
+RadarService(B210, daemon_address).serve_forever()
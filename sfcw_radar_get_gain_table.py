@@ -2,16 +2,18 @@
 from utils.MyB210 import MyB210
 from radar_parameters import *
 from utils.signals import complex_sinusoid
+from utils.sim_uhd import SimMultiUSRP
 import time
 
 # get gain table name
 gain_table_name = input("Enter the gain table name: ")
 
 # prepare data
-tx_data, length_wave_one_period = complex_sinusoid(samp_rate)
+tx_data, length_wave_one_period = complex_sinusoid(samp_rate, compact=True, cpu_format=cpu_format)
 
 # construct the hardware object
-B210 = MyB210(samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth)
+B210 = MyB210(samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth,
+              usrp=SimMultiUSRP() if simulate_device else None, cpu_format=cpu_format)
 
 # transmitting data
 B210.thread_send_data(tx_data)
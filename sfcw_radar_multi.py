@@ -0,0 +1,50 @@
+from radar_parameters import *
+from utils.multi_radio import MultiRadio
+from utils.sweep_writer import NpySweepWriter, export_mat
+
+import time
+import os
+
+# the sweep of sfcw_radar.py on all the B210 units of radio_serials at once, each on its own sub-band of center_freqs;
+# every radio has a gain table of its own, the entered name followed by its serial
+
+# the radio processes are spawned and import this module again, so the script only runs as __main__
+if __name__ == "__main__":
+    if not radio_serials:
+        raise Exception('radio_serials in radar_parameters.py is empty')
+    gain_table_name = input("Enter the gain table name that you want to load (or to calibrate into): ")
+    calibrate_flag = input("Calibrate the radios first? (y/n): ") == "y"
+    sfcw_rx_signal_name = input("Enter the file name for the sfcw_rx_signal: ")
+
+    with MultiRadio(radio_serials, samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth,
+                    simulate=simulate_device, cpu_format=cpu_format) as radios:
+        gain_table_names = radios.gain_table_names(gain_table_name)
+        if calibrate_flag:
+            radios.calibrate(center_freqs, txA_gain, txB_gain, target_rxA_amp, target_rxB_amp, amp_tolerence)
+            radios.save_gain_tables(gain_table_names)
+        else:
+            radios.load_gain_tables(gain_table_names)
+
+        start_time = time.time()
+        sfcw_rx_signal, sweep_freqs, rx_gains = radios.sweep(center_freqs, txA_gain, txB_gain)
+        end_time = time.time()
+        print("sfcw radar survey takes {} seconds".format(end_time - start_time))
+
+    # store the merged sweep like sfcw_radar.py does, with the rx gains of every step
+    npy_path = "./data/npy_data/channel_data_{}".format(sfcw_rx_signal_name)
+    with NpySweepWriter(npy_path, sweep_freqs, sfcw_rx_signal.shape[-1],
+                        attrs={"txA_gain": txA_gain, "txB_gain": txB_gain, "samp_rate": samp_rate,
+                               "radio_serials": list(radio_serials)},
+                        dtype=sfcw_rx_signal.dtype) as writer:
+        for i in range(sweep_freqs.size):
+            writer.step_buffer(i)[...] = sfcw_rx_signal[i]
+            writer.write(i, rx_gains[i])
+
+    # export the stored sweep for MATLAB
+    file_path = "./data/matlab_data/channel_data_{}.mat".format(sfcw_rx_signal_name)
+    export_mat(npy_path, file_path, sfcw_rx_signal_name)
+
+    # Beep when finish
+    duration = 0.3  # second
+    freq = 440
+    os.system("play -nq -t alsa synth {} sine {}".format(duration, freq))
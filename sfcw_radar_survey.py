@@ -0,0 +1,35 @@
+from utils.MyB210 import MyB210
+from radar_parameters import *
+from utils.signals import complex_sinusoid
+from utils.sim_uhd import SimMultiUSRP
+from utils.survey import SurveySession
+
+# get gain table name
+gain_table_name = input("Enter the gain table name that you want to load: ")
+survey_name = input("Enter the survey name (an interrupted survey of the same name is resumed): ")
+
+# prepare data
+tx_data, length_wave_one_period = complex_sinusoid(samp_rate, compact=True, cpu_format=cpu_format)
+
+# construct the hardware object
+B210 = MyB210(samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth,
+              usrp=SimMultiUSRP() if simulate_device else None, cpu_format=cpu_format)
+B210.load_gain_table(gain_table_name)
+
+# the transmitter stays on between locations, and every sweep is stored in the background
+# into ./data/npy_data/<survey_name>/<location>
+with SurveySession(B210, "./data/npy_data/{}".format(survey_name), tx_data, center_freqs, txA_gain, txB_gain,
+                   attrs={"survey": survey_name}) as session:
+    while True:
+        location = input("Move the radar and enter the location name (empty to finish): ")
+        if not location:
+            break
+        try:
+            location = SurveySession.check_location(location)
+        except Exception as e:
+            print(e)
+            continue
+        if session.is_done(location):
+            print("location {} is done already".format(location))
+            continue
+        session.sweep(location)
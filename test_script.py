@@ -9,7 +9,7 @@ import matplotlib.pyplot as plt
 # create our state machine to implement the SFCW radar
 
 # prepare tx data
-tx_data, length_wave_one_period = complex_sinusoid(samp_rate)
+tx_data, length_wave_one_period = complex_sinusoid(samp_rate, compact=True)
 
 # construct the hardware object
 B210 = MyB210(samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth)
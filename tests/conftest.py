@@ -0,0 +1,50 @@
+"""
+Fixtures of the tests: MyB210 objects on the simulated device, see utils/sim_uhd.py
+"""
+import numpy as np
+import pytest
+
+SAMP_RATE = 1e6
+TX_GAIN = 89
+TARGET_AMP = 0.5
+AMP_TOLERENCE = 0.1
+
+
+@pytest.fixture
+def make_b210():
+    """
+    :return: make_b210(time_scale=0.5, seed=0, cpu_format="fc32", **sim_kwargs), a MyB210 on a SimMultiUSRP;
+             the transmitters of the objects it made are stopped after the test
+    """
+    from utils import MyB210 as MyB210_module
+    from utils.sim_uhd import SimMultiUSRP, libpyuhd
+    if MyB210_module.lib is not libpyuhd:
+        pytest.skip('UHD is installed: the simulated device needs the types of utils.sim_uhd.libpyuhd')
+
+    radios = []
+
+    def make(time_scale=0.5, seed=0, cpu_format="fc32", **sim_kwargs):
+        usrp = SimMultiUSRP(time_scale=time_scale, seed=seed, **sim_kwargs)
+        B210 = MyB210_module.MyB210(SAMP_RATE, 16e6, 0.2e6, 0.2e6, usrp=usrp, cpu_format=cpu_format)
+        radios.append(B210)
+        return B210
+
+    yield make
+    for B210 in radios:
+        if B210.transmit_flag:
+            B210.stop_transmit()
+
+
+@pytest.fixture
+def tx_data():
+    from utils.signals import complex_sinusoid
+    return complex_sinusoid(SAMP_RATE, compact=True)[0]
+
+
+def calibrate(B210, tx_data, center_freqs):
+    """
+    fill B210.gain_table for center_freqs, for TARGET_AMP
+    """
+    B210.thread_send_data(tx_data)
+    B210.get_gains_for_all_freqs(np.asarray(center_freqs), TX_GAIN, TX_GAIN, TARGET_AMP, TARGET_AMP, AMP_TOLERENCE)
+    B210.stop_transmit()
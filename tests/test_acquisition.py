@@ -0,0 +1,83 @@
+import time
+
+import numpy as np
+import pytest
+
+from conftest import AMP_TOLERENCE, SAMP_RATE, TARGET_AMP, TX_GAIN, calibrate
+from utils.acquisition import AcquisitionPipeline
+from utils.demod import tone_response
+
+CENTER_FREQS = np.arange(1e9, 1.2e9, 20e6)
+
+
+@pytest.fixture
+def calibrated_b210(make_b210, tx_data):
+    # in real time: the tx thread, the acquisition thread and the workers share the host
+    B210 = make_b210(time_scale=1.0)
+    calibrate(B210, tx_data, CENTER_FREQS)
+    return B210
+
+
+def test_pipeline_needs_a_gain_table(make_b210, tx_data):
+    pipeline = AcquisitionPipeline(make_b210())
+    with pytest.raises(Exception, match="Gain table is not updated"):
+        pipeline.sweep(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+
+
+def test_pipeline_takes_the_tone_responses(calibrated_b210, tx_data):
+    B210 = calibrated_b210
+    pipeline = AcquisitionPipeline(B210)
+    results, freqs = pipeline.sweep(tx_data, CENTER_FREQS[::-1], TX_GAIN, TX_GAIN)
+    assert freqs.tolist() == CENTER_FREQS.tolist()
+    np.testing.assert_allclose(np.abs(np.array(results)), TARGET_AMP, atol=AMP_TOLERENCE)
+    stats = pipeline.stats()
+    assert stats["captures"] == stats["processed"] == len(CENTER_FREQS)
+    assert stats["dropped"] == 0
+    assert not B210.transmit_flag
+
+
+def test_pipeline_hands_the_raw_rx_data_to_process(calibrated_b210, tx_data):
+    def process(i, center_freq, rx_data):
+        assert rx_data.shape == (2, calibrated_b210.num_rx_samps)
+        return center_freq, tone_response(rx_data, SAMP_RATE, conjugate=True)
+
+    pipeline = AcquisitionPipeline(calibrated_b210, process, num_workers=2)
+    results, freqs = pipeline.sweep(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+    assert [f for f, _ in results] == freqs.tolist()
+    np.testing.assert_allclose(np.abs([response for _, response in results]), TARGET_AMP, atol=AMP_TOLERENCE)
+
+
+def test_slow_processing_stalls_the_acquisition(calibrated_b210, tx_data):
+    def process(i, center_freq, rx_data):
+        time.sleep(0.05)
+        return i
+
+    pipeline = AcquisitionPipeline(calibrated_b210, process, num_buffers=2, queue_depth=1)
+    results, _ = pipeline.sweep(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+    assert results == list(range(len(CENTER_FREQS)))
+    assert pipeline.stats()["stalls"] > 0
+    assert pipeline.stats()["max_queue_depth"] <= 1
+
+
+def test_slow_processing_drops_when_full(calibrated_b210, tx_data):
+    def process(i, center_freq, rx_data):
+        time.sleep(0.1)
+        return i
+
+    pipeline = AcquisitionPipeline(calibrated_b210, process, num_buffers=4, queue_depth=1, drop_when_full=True)
+    results, _ = pipeline.sweep(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+    stats = pipeline.stats()
+    assert stats["dropped"] > 0
+    assert stats["processed"] + stats["dropped"] == stats["captures"] == len(CENTER_FREQS)
+    assert sum(result is None for result in results) == stats["dropped"]
+
+
+def test_a_failing_process_stops_the_sweep(calibrated_b210, tx_data):
+    def process(i, center_freq, rx_data):
+        raise Exception('bad step')
+
+    pipeline = AcquisitionPipeline(calibrated_b210, process)
+    with pytest.raises(Exception, match="bad step"):
+        pipeline.sweep(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+    assert not calibrated_b210.transmit_flag
+    assert pipeline.stats()["processed"] == 0
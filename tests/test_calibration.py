@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from conftest import TX_GAIN, calibrate
+from utils.calibration import ComplexCalibration, build_calibration, known_target_response
+from utils.imaging import range_profiles
+
+# 31 steps of 10 MHz: 0.5 m range resolution, 15 m unambiguous range
+CENTER_FREQS = np.arange(1e9, 1.31e9, 10e6)
+
+
+def _peak_range(responses, center_freqs):
+    # the ratio of channel B to channel A (on the direct path at 0 m) cancels the random phase of every capture
+    profile, ranges = range_profiles(responses, center_freqs, reference_channel=0)
+    return ranges[np.argmax(np.abs(profile))]
+
+
+def test_known_target_response_peaks_at_the_range():
+    expected = known_target_response(CENTER_FREQS, [0.0, 3.0])
+    assert expected.shape == (CENTER_FREQS.size, 2)
+    assert _peak_range(expected, CENTER_FREQS) == pytest.approx(3.0, abs=0.25)
+
+
+def test_calibrating_on_a_known_target_keeps_its_range(make_b210, tx_data):
+    B210 = make_b210(target_ranges=(0.0, 3.0))
+    calibrate(B210, tx_data, CENTER_FREQS)
+    responses, _ = B210.sfcw_seep_response(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+    assert _peak_range(responses, CENTER_FREQS) == pytest.approx(3.0, abs=0.25)
+
+    B210.calibrate_response(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN,
+                            expected=known_target_response(CENTER_FREQS, [0.0, 3.0]))
+    responses, _ = B210.sfcw_seep_response(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN, calibrated=True)
+    assert _peak_range(responses, CENTER_FREQS) == pytest.approx(3.0, abs=0.25)
+    # the calibrated channel ratio is the one of the known target, in amplitude and phase
+    ratio = responses[:, 1] / responses[:, 0]
+    expected = known_target_response(CENTER_FREQS, [0.0, 3.0])
+    np.testing.assert_allclose(ratio, expected[:, 1] / expected[:, 0], atol=0.1)
+
+    # the target moves: the calibrated sweep follows it
+    B210.usrp.target_ranges = np.array([0.0, 5.0])
+    responses, _ = B210.sfcw_seep_response(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN, calibrated=True)
+    assert _peak_range(responses, CENTER_FREQS) == pytest.approx(5.0, abs=0.25)
+
+
+def test_correction_removes_the_rx_gains():
+    responses = np.array([[0.5, 0.25j], [0.5j, -0.25]])
+    rx_gains = np.array([[20.0, 40.0], [20.0, 40.0]])
+    calibration = build_calibration(responses, [1e9, 1.1e9], rx_gains)
+    # a later sweep with other rx gains: corrected to a unit response with channel A as the phase reference
+    corrected = calibration.apply(responses * np.array([1, 10]), [1e9, 1.1e9], rx_gains + [0, 20])
+    np.testing.assert_allclose(np.abs(corrected), 1.0)
+    np.testing.assert_allclose(corrected[:, 1] / corrected[:, 0], 1.0)
+
+
+def test_lookup_interpolates_amplitude_and_phase():
+    correction = np.array([[1.0, 2.0], [np.exp(1j * np.pi / 2), 4.0]])
+    calibration = ComplexCalibration([1e9, 1.1e9], correction)
+    middle = calibration.lookup(1.05e9)
+    np.testing.assert_allclose(middle, [[np.exp(1j * np.pi / 4), 3.0]])
+    np.testing.assert_allclose(calibration.lookup([0.9e9, 1.2e9]), correction)
+    np.testing.assert_allclose(calibration.lookup(1.06e9, method="nearest"), correction[[1]])
+    with pytest.raises(Exception, match="unknown calibration lookup method"):
+        calibration.lookup(1e9, method="cubic")
+
+
+def test_save_and_load(tmp_path):
+    calibration = ComplexCalibration([1e9, 1.1e9], [[1 + 1j, 2], [3, 4 - 1j]], attrs={"txA_gain": TX_GAIN})
+    file_path = str(tmp_path / "calibration.npz")
+    calibration.save(file_path)
+    loaded = ComplexCalibration.load(file_path)
+    np.testing.assert_array_equal(loaded.center_freqs, calibration.center_freqs)
+    np.testing.assert_array_equal(loaded.correction, calibration.correction)
+    assert loaded.attrs == {"txA_gain": TX_GAIN}
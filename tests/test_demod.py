@@ -0,0 +1,28 @@
+import numpy as np
+
+from conftest import TX_GAIN, calibrate
+from utils.demod import tone_response
+from utils.sc16 import from_complex64
+
+
+def test_tone_response():
+    samp_rate, tone_freq, num_samps = 1e6, 1000, 4000
+    amps = np.array([0.5 * np.exp(0.3j), 0.2 * np.exp(-1j)])
+    tone = np.exp(2j * np.pi * tone_freq / samp_rate * np.arange(num_samps))
+    rx_data = (amps[:, None] * tone).astype(np.complex64)
+
+    np.testing.assert_allclose(tone_response(rx_data, samp_rate, tone_freq), amps, atol=1e-5)
+    # the raw data of a conjugated sweep, and sc16 data
+    np.testing.assert_allclose(tone_response(np.conjugate(rx_data), samp_rate, tone_freq, conjugate=True), amps,
+                               atol=1e-5)
+    np.testing.assert_allclose(tone_response(from_complex64(rx_data), samp_rate, tone_freq), amps, atol=1e-4)
+
+
+def test_sweep_response_matches_the_raw_samples(make_b210, tx_data):
+    B210 = make_b210()
+    center_freqs = [1e9, 1.1e9]
+    calibrate(B210, tx_data, center_freqs)
+    sfcw_response, _, sfcw_rx_signal = B210.sfcw_seep_response(tx_data, center_freqs, TX_GAIN, TX_GAIN,
+                                                                keep_raw=True)
+    # the raw samples are conjugated like the ones of sfcw_seep()
+    np.testing.assert_allclose(sfcw_response, tone_response(sfcw_rx_signal, B210.samp_rate), atol=1e-5)
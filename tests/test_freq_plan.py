@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from utils.freq_plan import RetuneCostModel, plan_sweep
+from utils.sim_uhd import SimMultiUSRP
+
+
+def test_plan_sweep():
+    freqs = np.array([1.5e9, 0.5e9, 1e9, 2e9])
+    order, seconds = plan_sweep(freqs)
+    assert freqs[order].tolist() == sorted(freqs)
+    assert seconds == pytest.approx(RetuneCostModel().path_cost(np.sort(freqs)))
+
+    # the LO's are at the top of the band: descending wins
+    order, _ = plan_sweep(freqs, start_freq=2e9)
+    assert freqs[order].tolist() == sorted(freqs, reverse=True)
+    assert sorted(order.tolist()) == [0, 1, 2, 3]
+
+
+def test_fit_recovers_the_model():
+    model = RetuneCostModel(base=200e-6, per_ghz=500e-6, band_cross=2e-3)
+    rng = np.random.default_rng(0)
+    freqs = rng.uniform(100e6, 3e9, 50)
+    retune_log = [(a, b, model.cost(a, b)) for a, b in zip(freqs[:-1], freqs[1:])]
+    fitted = RetuneCostModel.fit([(None, freqs[0], 1.0)] + retune_log)
+    assert fitted.base == pytest.approx(200e-6)
+    assert fitted.per_ghz == pytest.approx(500e-6)
+    assert fitted.band_cross == pytest.approx(2e-3)
+
+    # too few retunes keep the defaults
+    assert RetuneCostModel.fit(retune_log[:2]).base == RetuneCostModel.Base
+
+
+def test_simulated_lo_locks_by_the_planner_model():
+    usrp = SimMultiUSRP(lock_time_per_ghz=1e-3)
+    model = RetuneCostModel(per_ghz=1e-3)
+    assert usrp._lock_delay(None, 1e9) == model.cost(None, 1e9)
+    for from_freq, to_freq in ((1e9, 1.01e9), (1e9, 2e9), (700e6, 800e6)):
+        assert 0.9 <= usrp._lock_delay(from_freq, to_freq) / model.cost(from_freq, to_freq) <= 1.1
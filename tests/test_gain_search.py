@@ -0,0 +1,48 @@
+import pytest
+
+from utils.gain_search import RxGainSearch
+
+
+def _run_search(search, path_gain):
+    """
+    run the search against a linear channel that saturates at 1.0
+    """
+    rx_gain = search.start_gain
+    gains = []
+    while rx_gain is not None:
+        gains.append(rx_gain)
+        amp = min(path_gain * 10 ** (rx_gain / 20), 1.0)
+        rx_gain = search.update(rx_gain, amp)
+    return gains
+
+
+def test_gain_search_converges_in_one_model_step():
+    search = RxGainSearch(target_amp=0.5, amp_tolerence=0.05, start_gain=0.0)
+    _run_search(search, path_gain=0.01)
+    assert search.converged
+    assert search.good_gain == pytest.approx(34.0)
+    assert search.num_captures == 2
+
+
+def test_gain_search_bisects_from_saturation():
+    search = RxGainSearch(target_amp=0.5, amp_tolerence=0.05, start_gain=76.0)
+    _run_search(search, path_gain=0.01)
+    assert search.converged
+    assert abs(0.01 * 10 ** (search.good_gain / 20) - 0.5) <= 0.05
+
+
+def test_gain_search_gives_up_at_max_gain():
+    search = RxGainSearch(target_amp=0.5, amp_tolerence=0.05)
+    gains = _run_search(search, path_gain=1e-6)
+    assert not search.converged
+    assert search.good_gain == 76.0
+    assert len(gains) <= search.max_captures
+
+
+def test_gain_search_fine_tolerance_steps_one_gain():
+    # the tolerance is narrower than one gain step: the search tries the neighbouring steps and stops
+    search = RxGainSearch(target_amp=0.5, amp_tolerence=1e-4, start_gain=0.0)
+    gains = _run_search(search, path_gain=0.01)
+    assert not search.converged
+    assert len(gains) == len(set(gains))
+    assert abs(search.good_gain - 34.0) <= 1.0
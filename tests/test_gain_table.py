@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.gain_table import GainTable
+
+
+def test_gain_table_lookup():
+    table = GainTable([2e9, 1e9], [[20, 40], [10, 30]])
+    assert table.center_freqs.tolist() == [1e9, 2e9]
+    assert table[1e9] == [10, 30]
+    np.testing.assert_array_equal(table.lookup([1.2e9, 1.8e9, 3e9]), [[10, 30], [20, 40], [20, 40]])
+    np.testing.assert_allclose(table.lookup([0.5e9, 1.25e9], "linear"), [[10, 30], [12.5, 32.5]])
+
+    table[1.5e9] = [0, 0]
+    assert 1.5e9 in table and len(table) == 3
+    with pytest.raises(Exception):
+        table.lookup(1e9, "cubic")
+    with pytest.raises(Exception):
+        GainTable().lookup(1e9)
+
+
+def test_gain_table_round_trip(tmp_path):
+    table = GainTable([1e9, 2e9, 1.5e9], [[1, 2], [3, 4], [5, 6]], attrs={"txA_gain": 89})
+    file_path = str(tmp_path / "table.npz")
+    table.save(file_path)
+    loaded = GainTable.load(file_path)
+    np.testing.assert_array_equal(loaded.center_freqs, table.center_freqs)
+    np.testing.assert_array_equal(loaded.rx_gains, table.rx_gains)
+    assert loaded.attrs == {"txA_gain": 89}
+    assert GainTable.from_dict(table.to_dict()).to_dict() == table.to_dict()
+
+
+def test_b210_gain_table_files(make_b210, tmp_path, monkeypatch):
+    # MyB210 keeps its gain tables in ./utils/gain_tables
+    monkeypatch.chdir(tmp_path)
+    B210 = make_b210()
+    B210.gain_table = GainTable([1e9, 2e9], [[10, 30], [20, 40]], attrs={"txA_gain": 89})
+    B210.save_gain_table("table")
+    B210.gain_table = GainTable()
+    B210.load_gain_table("table")
+    assert B210.gain_table.to_dict() == {1e9: [10, 30], 2e9: [20, 40]}
+    assert B210.gain_table_updated_flag
+
+    # the old pickled dictionary format is still read
+    np.save(os.path.join("utils", "gain_tables", "old.npy"), {1e9: [1, 2]}, allow_pickle=True)
+    B210.load_gain_table("old")
+    assert B210.gain_table.to_dict() == {1e9: [1, 2]}
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from conftest import SAMP_RATE
+from utils.demod import reference_tone
+from utils.imaging import SPEED_OF_LIGHT, compensate_rx_gains, extract_responses, load_responses, range_profiles
+from utils.sweep_writer import NpySweepWriter
+
+CENTER_FREQS = np.arange(1e9, 1.32e9, 5e6)
+NUM_RX_SAMPS = 1000
+
+
+def _target_responses(target_ranges, center_freqs=CENTER_FREQS):
+    """
+    :return: len(target_ranges) by n_freqs by 2 responses of one point target per location, both channels alike
+    """
+    delays = 2 * np.asarray(target_ranges)[:, np.newaxis] / SPEED_OF_LIGHT
+    responses = np.exp(-2j * np.pi * center_freqs * delays)
+    return np.repeat(responses[..., np.newaxis], 2, axis=-1)
+
+
+def _rx_data(responses):
+    """
+    :return: the conjugated rx data (what MyB210.sfcw_seep() returns) whose tone responses are responses
+    """
+    return (responses[..., np.newaxis] * np.conjugate(reference_tone(NUM_RX_SAMPS, SAMP_RATE, 1000))).astype(
+        np.complex64)
+
+
+def _peak_range(profile, ranges):
+    return ranges[np.argmax(np.abs(profile))]
+
+
+def test_range_profiles_peak_at_the_target():
+    range_resolution = SPEED_OF_LIGHT / (2 * (CENTER_FREQS[-1] - CENTER_FREQS[0]))
+    profiles, ranges = range_profiles(_target_responses([3.0, 7.5]), CENTER_FREQS)
+    assert profiles.shape == (2, ranges.size, 2)
+    assert abs(_peak_range(profiles[0, :, 0], ranges) - 3.0) < range_resolution / 2
+    assert abs(_peak_range(profiles[1, :, 1], ranges) - 7.5) < range_resolution / 2
+
+
+def test_range_profiles_with_a_reference_channel_and_background():
+    # channel A on the direct path sees only the random phase of every capture, channel B sees it too, times the
+    # antenna coupling at 4 m (the same at every location) and a target that moves
+    phases = np.exp(1j * np.random.default_rng(0).uniform(0, 2 * np.pi, (3, CENTER_FREQS.size)))
+    scene = _target_responses([4.0, 4.0, 4.0])[..., 0] + 0.5 * _target_responses([2.0, 6.0, 9.0])[..., 0]
+    responses = np.stack([phases, phases * scene], axis=-1)
+
+    profiles, ranges = range_profiles(responses, CENTER_FREQS, reference_channel=0, background="mean")
+    assert profiles.shape == (3, ranges.size)
+    for profile, target_range in zip(profiles, [2.0, 6.0, 9.0]):
+        assert abs(_peak_range(profile, ranges) - target_range) < 0.5
+
+
+def test_range_profiles_errors():
+    with pytest.raises(Exception, match="equally spaced"):
+        range_profiles(_target_responses([3.0])[0], CENTER_FREQS[[0, 1, 3]])
+    with pytest.raises(Exception, match="leading locations axis"):
+        range_profiles(_target_responses([3.0])[0], CENTER_FREQS, reference_channel=0, background="mean")
+    with pytest.raises(Exception, match="unknown background"):
+        range_profiles(_target_responses([3.0]), CENTER_FREQS, background="median")
+
+
+def test_extract_responses_of_a_stack_of_sweeps():
+    responses = _target_responses([3.0, 4.0, 5.0])
+    np.testing.assert_allclose(extract_responses(_rx_data(responses), SAMP_RATE, chunk_size=2), responses, atol=1e-5)
+    raw = np.conjugate(_rx_data(responses[0]))
+    np.testing.assert_allclose(extract_responses(raw, SAMP_RATE, conjugate=True), responses[0], atol=1e-5)
+
+
+@pytest.mark.parametrize("num_processes", [1, 2])
+def test_load_responses_of_stored_sweeps(tmp_path, num_processes):
+    responses = _target_responses([3.0, 5.0])
+    rx_gains = np.array([[10, 20], [30, 40]], dtype=np.float64)
+    paths = []
+    for k, rx_data in enumerate(_rx_data(responses)):
+        path = str(tmp_path / "location_{}".format(k))
+        with NpySweepWriter(path, CENTER_FREQS, NUM_RX_SAMPS, attrs={"samp_rate": SAMP_RATE}) as writer:
+            for i in range(CENTER_FREQS.size):
+                writer.step_buffer(i)[...] = rx_data[i]
+                writer.write(i, rx_gains[k])
+        paths.append(path)
+
+    loaded, center_freqs, loaded_gains = load_responses(paths, num_processes=num_processes)
+    np.testing.assert_allclose(loaded, responses, atol=1e-5)
+    np.testing.assert_array_equal(center_freqs, CENTER_FREQS)
+    assert loaded_gains.shape == (2, CENTER_FREQS.size, 2)
+    np.testing.assert_array_equal(loaded_gains[:, 0], rx_gains)
+
+
+def test_load_responses_needs_the_same_freqs(tmp_path):
+    paths = []
+    for k, center_freqs in enumerate([CENTER_FREQS[:4], CENTER_FREQS[1:5]]):
+        path = str(tmp_path / "location_{}".format(k))
+        with NpySweepWriter(path, center_freqs, NUM_RX_SAMPS, attrs={"samp_rate": SAMP_RATE}) as writer:
+            for i in range(center_freqs.size):
+                writer.write(i, [0, 0])
+        paths.append(path)
+    with pytest.raises(Exception, match="different center freqs"):
+        load_responses(paths, num_processes=1)
+
+
+def test_compensate_rx_gains():
+    responses = np.full((2, 3, 2), 10.0 + 0j)
+    rx_gains = np.array([[20.0, 40.0]] * 3)
+    np.testing.assert_allclose(compensate_rx_gains(responses, rx_gains), [[[1.0, 0.1]] * 3] * 2)
@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import pytest
+
+from conftest import TX_GAIN, calibrate
+from utils.metrics import InstrumentedMethods, Metrics
+from utils.sim_uhd import SimRxStreamer
+
+CENTER_FREQS = np.array([1e9, 1.1e9, 1.2e9])
+
+
+@pytest.fixture
+def calibrated_b210(make_b210, tx_data):
+    B210 = make_b210()
+    calibrate(B210, tx_data, CENTER_FREQS)
+    return B210
+
+
+def test_stage_stats():
+    metrics = Metrics()
+    for seconds in [0.1, 0.3, 0.2]:
+        metrics.record("recv", seconds, 1e9)
+    metrics.record("recv", 0.4)
+    stages = metrics.to_dict()["stages"]
+    assert stages["recv"]["count"] == 4
+    assert stages["recv"]["min"] == 0.1
+    assert stages["recv"]["max"] == 0.4
+    assert stages["recv"]["mean"] == pytest.approx(0.25)
+    assert metrics.to_dict()["per_freq"]["recv"][repr(1e9)]["count"] == 3
+
+
+def test_a_sweep_records_its_stages(calibrated_b210, tx_data):
+    B210 = calibrated_b210
+    metrics = B210.enable_metrics()
+    B210.enable_metrics(metrics)  # enabling twice does not wrap twice
+    B210.sfcw_seep(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+
+    data = metrics.to_dict()
+    assert data["stages"]["sfcw_seep"]["count"] == 1
+    for stage in ["tune_center_freq", "recv_and_save_data", "conjugate", "issue_stream_cmd", "recv"]:
+        assert stage in data["stages"]
+    # every step is recorded under its own center freq
+    assert sorted(data["per_freq"]["recv_and_save_data"]) == sorted(repr(float(f)) for f in CENTER_FREQS)
+    assert sum(stats["count"] for stats in data["per_freq"]["recv_and_save_data"].values()) == len(CENTER_FREQS)
+
+
+def test_disable_metrics_restores_the_methods(calibrated_b210, tx_data):
+    B210 = calibrated_b210
+    metrics = B210.enable_metrics()
+    assert "sfcw_seep" in vars(B210)
+    B210.disable_metrics()
+    for name, _, _ in InstrumentedMethods:
+        assert name not in vars(B210)
+    assert isinstance(B210.rx_streamer, SimRxStreamer)
+
+    B210.sfcw_seep(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+    assert metrics.to_dict()["stages"] == {}
+    assert B210.metrics is metrics
+
+
+def test_export(calibrated_b210, tx_data, tmp_path):
+    B210 = calibrated_b210
+    metrics = B210.enable_metrics()
+    B210.sfcw_seep(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+    B210.disable_metrics()
+
+    file_path = str(tmp_path / "metrics.json")
+    text = metrics.to_json(file_path)
+    with open(file_path) as f:
+        assert json.load(f) == json.loads(text) == metrics.to_dict()
+
+    lines = metrics.to_prometheus().splitlines()
+    assert "# TYPE b210_stage_seconds summary" in lines
+    assert 'b210_stage_seconds_count{stage="sfcw_seep"} 1' in lines
+    assert any(line.startswith('b210_stage_seconds_max{stage="recv_and_save_data",center_freq="1000000000.0"}')
+               for line in lines)
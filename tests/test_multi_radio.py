@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import AMP_TOLERENCE, SAMP_RATE, TARGET_AMP, TX_GAIN
+from utils.demod import tone_response
+from utils.multi_radio import MultiRadio
+
+CENTER_FREQS = np.arange(1e9, 1.16e9, 20e6)
+
+
+@pytest.fixture(scope="module")
+def radios(tmp_path_factory):
+    from utils import MyB210 as MyB210_module
+    from utils.sim_uhd import libpyuhd
+    if MyB210_module.lib is not libpyuhd:
+        pytest.skip('UHD is installed: the simulated device needs the types of utils.sim_uhd.libpyuhd')
+
+    # the radio processes save their gain tables under their working directory, so start them in a temporary one
+    cwd = os.getcwd()
+    os.chdir(str(tmp_path_factory.mktemp("radios")))
+    try:
+        radios = MultiRadio(["sim0", "sim1"], SAMP_RATE, 16e6, 0.2e6, 0.2e6, simulate=True, time_scale=0.5)
+    finally:
+        os.chdir(cwd)
+    with radios:
+        radios.calibrate(CENTER_FREQS, TX_GAIN, TX_GAIN, TARGET_AMP, TARGET_AMP, AMP_TOLERENCE)
+        yield radios
+
+
+def _check_sweep(sfcw_rx_signal, center_freqs, rx_gains, radios):
+    assert center_freqs.tolist() == CENTER_FREQS.tolist()
+    assert sfcw_rx_signal.shape == (CENTER_FREQS.size, 2, radios.num_rx_samps)
+    assert rx_gains.shape == (CENTER_FREQS.size, 2)
+    np.testing.assert_allclose(np.abs(tone_response(sfcw_rx_signal, SAMP_RATE)), TARGET_AMP, atol=AMP_TOLERENCE)
+
+
+def test_split_and_gain_table_names(radios):
+    center_freqs, bands = radios.split(CENTER_FREQS[::-1])
+    assert center_freqs.tolist() == CENTER_FREQS.tolist()
+    assert bands == [(0, 4), (4, 8)]
+    assert radios.gain_table_names("table") == ["table_sim0", "table_sim1"]
+
+
+def test_sweep_merges_the_sub_bands(radios):
+    sfcw_rx_signal, center_freqs, rx_gains = radios.sweep(CENTER_FREQS[::-1], TX_GAIN, TX_GAIN)
+    _check_sweep(sfcw_rx_signal, center_freqs, rx_gains, radios)
+    stats = radios.sweep_stats
+    assert stats["num_radios"] == 2
+    assert len(stats["radio_seconds"]) == 2
+    assert stats["estimated_speed_up"] == pytest.approx(sum(stats["radio_seconds"]) / stats["seconds"])
+
+
+def test_timed_sweep_passes_the_sweep_arguments(radios):
+    sfcw_rx_signal, center_freqs, rx_gains = radios.sweep(CENTER_FREQS, TX_GAIN, TX_GAIN, timed=True, lookahead=2,
+                                                          settle_time=2e-3)
+    _check_sweep(sfcw_rx_signal, center_freqs, rx_gains, radios)
+
+    # an argument the sweep does not take fails in the radios, which keep serving
+    with pytest.raises(Exception, match="radio sim0"):
+        radios.sweep(CENTER_FREQS, TX_GAIN, TX_GAIN, lookahead=2)
+    radios.sweep(CENTER_FREQS, TX_GAIN, TX_GAIN)
+
+
+def test_gain_tables_round_trip(radios):
+    _, _, rx_gains = radios.sweep(CENTER_FREQS, TX_GAIN, TX_GAIN)
+    radios.save_gain_tables(radios.gain_table_names("table"))
+    radios.load_gain_tables(radios.gain_table_names("table"))
+    _, _, loaded_rx_gains = radios.sweep(CENTER_FREQS, TX_GAIN, TX_GAIN)
+    np.testing.assert_array_equal(loaded_rx_gains, rx_gains)
+    with pytest.raises(Exception, match="radio sim0"):
+        radios.load_gain_tables(radios.gain_table_names("missing_table"))
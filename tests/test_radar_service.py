@@ -0,0 +1,105 @@
+import os
+import socket
+import stat
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import AMP_TOLERENCE, SAMP_RATE, TARGET_AMP, TX_GAIN
+from utils.demod import tone_response
+from utils.radar_service import RadarClient, RadarService, load_authkey
+
+CENTER_FREQS = np.array([1e9, 1.1e9, 1.2e9])
+
+
+def _free_address():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()
+
+
+@pytest.fixture
+def service(make_b210, tmp_path):
+    """
+    :return: (address, authkey) of a RadarService on a simulated B210, running in a thread
+    """
+    authkey = load_authkey(str(tmp_path / "authkey"))
+    address = _free_address()
+    radar_service = RadarService(make_b210(), address, authkey)
+    thread = threading.Thread(target=radar_service.serve_forever, daemon=True)
+    thread.start()
+    for _ in range(100):
+        try:
+            RadarClient(address, authkey).close()
+            break
+        except OSError:
+            thread.join(0.01)
+    yield address, authkey
+    if thread.is_alive():
+        with RadarClient(address, authkey) as radar:
+            radar.shutdown()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_load_authkey(tmp_path):
+    file_path = str(tmp_path / "authkey")
+    authkey = load_authkey(file_path)
+    assert len(authkey) == 64
+    assert stat.S_IMODE(os.stat(file_path).st_mode) == 0o600
+    assert load_authkey(file_path) == authkey
+    assert load_authkey(str(tmp_path / "other")) != authkey
+
+    os.chmod(file_path, 0o644)
+    with pytest.raises(Exception, match="chmod 600"):
+        load_authkey(file_path)
+
+
+def test_calibrate_and_sweep(service):
+    with RadarClient(*service) as radar:
+        assert not radar.ping()["gain_table_updated"]
+        with pytest.raises(Exception, match="Gain table is not updated"):
+            radar.sweep(CENTER_FREQS, TX_GAIN, TX_GAIN)
+
+        reply = radar.calibrate(CENTER_FREQS, TX_GAIN, TX_GAIN, TARGET_AMP, TARGET_AMP, AMP_TOLERENCE)
+        assert reply["center_freqs"].tolist() == CENTER_FREQS.tolist()
+        assert radar.ping()["gain_table_updated"]
+
+        for timed in (False, True):
+            sfcw_rx_signal, center_freqs, rx_gains = radar.sweep(CENTER_FREQS[::-1], TX_GAIN, TX_GAIN, timed=timed)
+            assert center_freqs.tolist() == CENTER_FREQS.tolist()
+            np.testing.assert_array_equal(rx_gains, reply["rx_gains"])
+            np.testing.assert_allclose(np.abs(tone_response(sfcw_rx_signal, SAMP_RATE)), TARGET_AMP,
+                                       atol=AMP_TOLERENCE)
+
+        sfcw_response, _ = radar.sweep_response(CENTER_FREQS, TX_GAIN, TX_GAIN)
+        np.testing.assert_allclose(np.abs(sfcw_response), TARGET_AMP, atol=AMP_TOLERENCE)
+        assert radar.recalibrate()["patched_freqs"].size == 0
+
+
+def test_bad_requests_keep_the_service_running(service):
+    with RadarClient(*service) as radar:
+        radar.conn.send("not a request")
+        with pytest.raises(Exception, match="dictionary"):
+            radar._recv()
+        with pytest.raises(Exception, match="unknown request"):
+            radar.request("format_disk")
+        radar.calibrate(CENTER_FREQS, TX_GAIN, TX_GAIN, TARGET_AMP, TARGET_AMP, AMP_TOLERENCE)
+
+        # the client goes away in the middle of a sweep
+        steps = radar.iter_sweep(CENTER_FREQS, TX_GAIN, TX_GAIN)
+        next(steps)
+
+    with RadarClient(*service) as radar:
+        assert radar.ping()["gain_table_updated"]
+        sfcw_rx_signal, _, _ = radar.sweep(CENTER_FREQS, TX_GAIN, TX_GAIN)
+        assert sfcw_rx_signal.shape[0] == CENTER_FREQS.size
+
+
+def test_wrong_authkey_is_refused(service):
+    address, authkey = service
+    with pytest.raises(Exception):
+        RadarClient(address, b"0" * 64)
+    with RadarClient(address, authkey) as radar:
+        assert "device" in radar.ping()
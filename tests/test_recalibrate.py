@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from conftest import TARGET_AMP, TX_GAIN, calibrate
+
+CENTER_FREQS = np.arange(1e9, 1.3e9, 20e6)
+DRIFTED_FREQS = CENTER_FREQS[5:8]
+
+
+@pytest.fixture
+def calibrated_b210(make_b210, tx_data):
+    B210 = make_b210()
+    calibrate(B210, tx_data, CENTER_FREQS)
+    B210.thread_send_data(tx_data)
+    return B210
+
+
+def drift(usrp, freqs, gain_db):
+    """
+    raise the path gain of both channels at freqs by gain_db
+    """
+    path_gain_db = usrp.path_gain_db
+
+    def drifted_path_gain_db(freq, channel):
+        return path_gain_db(freq, channel) + gain_db * np.isin(freq, freqs)
+
+    usrp.path_gain_db = drifted_path_gain_db
+
+
+def test_recalibrate_without_drift(calibrated_b210):
+    B210 = calibrated_b210
+    stored = B210.gain_table.rx_gains.copy()
+    assert B210.recalibrate_gain_table() == []
+    np.testing.assert_array_equal(B210.gain_table.rx_gains, stored)
+    # one verification capture per freq
+    assert sum(B210.calibration_captures.values()) == len(CENTER_FREQS)
+
+
+def test_recalibrate_patches_only_the_drifted_freqs(calibrated_b210, tx_data):
+    B210 = calibrated_b210
+    stored = B210.gain_table.rx_gains.copy()
+    drift(B210.usrp, DRIFTED_FREQS, 6.0)
+
+    # a wide tolerance: a start shifted by the drift of a neighbour would pass at the freqs that did not drift
+    patched = B210.recalibrate_gain_table(amp_tolerence=0.25)
+    assert patched == DRIFTED_FREQS.tolist()
+    untouched = ~np.isin(CENTER_FREQS, DRIFTED_FREQS)
+    np.testing.assert_array_equal(B210.gain_table.rx_gains[untouched], stored[untouched])
+    assert np.all(B210.gain_table.rx_gains[~untouched] < stored[~untouched])
+
+    response, _ = B210.sfcw_seep_response(tx_data, DRIFTED_FREQS, TX_GAIN, TX_GAIN)
+    np.testing.assert_allclose(np.abs(response), TARGET_AMP, atol=0.25)
+
+
+def test_recalibrate_adds_new_freqs(calibrated_b210):
+    B210 = calibrated_b210
+    new_freq = CENTER_FREQS[0] + 5e6
+    assert B210.recalibrate_gain_table([new_freq]) == [new_freq]
+    assert new_freq in B210.gain_table
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from conftest import AMP_TOLERENCE, SAMP_RATE, TARGET_AMP, TX_GAIN, calibrate
+from utils.demod import tone_response
+from utils.sc16 import FULL_SCALE, SC16, conjugate_in_place, from_complex64, host_dtype, to_complex64
+
+
+def test_sc16_round_trip():
+    data = np.array([[0.5 - 0.25j, 1.0 + 1.0j], [-1.0 + 0j, 2.0 - 2.0j]], dtype=np.complex64)
+    sc16 = from_complex64(data)
+    assert sc16.dtype == SC16 and sc16.shape == data.shape
+    assert sc16["i"][1, 1] == FULL_SCALE and sc16["q"][1, 1] == -FULL_SCALE  # clipped
+    expected = np.clip(data.real, -1, 1) + 1j * np.clip(data.imag, -1, 1)
+    np.testing.assert_allclose(to_complex64(sc16), expected, atol=1 / FULL_SCALE)
+
+    conjugate_in_place(sc16)
+    np.testing.assert_allclose(to_complex64(sc16), np.conjugate(expected), atol=1 / FULL_SCALE)
+
+
+def test_conjugate_in_place_saturates():
+    data = np.zeros(2, dtype=SC16)
+    data["q"] = [-32768, 100]
+    conjugate_in_place(data)
+    assert data["q"].tolist() == [FULL_SCALE, -100]
+
+    with pytest.raises(Exception):
+        host_dtype("sc8")
+
+
+def test_sc16_sweep(make_b210):
+    from utils.signals import complex_sinusoid
+
+    B210 = make_b210(cpu_format="sc16")
+    tx_data, _ = complex_sinusoid(SAMP_RATE, compact=True, cpu_format="sc16")
+    assert tx_data.dtype == SC16
+    center_freqs = [1e9, 1.1e9]
+    calibrate(B210, tx_data, center_freqs)
+
+    sfcw_rx_signal, _ = B210.sfcw_seep(tx_data, center_freqs, TX_GAIN, TX_GAIN)
+    assert sfcw_rx_signal.dtype == SC16
+    assert sfcw_rx_signal.nbytes == len(center_freqs) * 2 * B210.num_rx_samps * 4
+    np.testing.assert_allclose(np.abs(tone_response(sfcw_rx_signal, SAMP_RATE)), TARGET_AMP, atol=AMP_TOLERENCE)
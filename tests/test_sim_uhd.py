@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from conftest import AMP_TOLERENCE, SAMP_RATE, TARGET_AMP, TX_GAIN, calibrate
+from utils.demod import tone_response
+from utils.sim_uhd import SimMultiUSRP, libpyuhd
+
+
+def test_simulated_sweep(make_b210, tx_data):
+    B210 = make_b210(seed=0)
+    center_freqs = np.array([1e9, 1.2e9, 1.4e9])
+    calibrate(B210, tx_data, center_freqs)
+    assert B210.gain_table.center_freqs.tolist() == center_freqs.tolist()
+
+    sfcw_response, freqs = B210.sfcw_seep_response(tx_data, center_freqs, TX_GAIN, TX_GAIN)
+    assert sfcw_response.shape == (3, 2)
+    np.testing.assert_allclose(np.abs(sfcw_response), TARGET_AMP, atol=AMP_TOLERENCE)
+
+    sfcw_rx_signal, freqs = B210.sfcw_seep(tx_data, center_freqs[::-1], TX_GAIN, TX_GAIN)
+    assert sfcw_rx_signal.shape == (3, 2, B210.num_rx_samps)
+    assert freqs.tolist() == center_freqs.tolist()
+    np.testing.assert_allclose(np.abs(tone_response(sfcw_rx_signal, SAMP_RATE)), TARGET_AMP, atol=AMP_TOLERENCE)
+
+
+def test_same_seed_same_channel():
+    usrps = [SimMultiUSRP(seed=1), SimMultiUSRP(seed=1), SimMultiUSRP(seed=2)]
+    responses = [[usrp.channel_response(1e9, chan) for chan in (0, 1)] for usrp in usrps]
+    assert responses[0] == responses[1]
+    assert responses[0] != responses[2]
+
+
+def test_recv_reports_timeout(make_b210):
+    B210 = make_b210()
+    rx_md = libpyuhd.types.rx_metadata()
+    assert B210.rx_streamer.recv(B210.rx_buffer, rx_md, 0.01) == 0
+    assert rx_md.error_code == libpyuhd.types.rx_metadata_error_code.timeout
+
+    # a stream command in the past is late
+    stream_cmd = libpyuhd.types.stream_cmd(libpyuhd.types.stream_mode.num_done)
+    stream_cmd.num_samps = 100
+    stream_cmd.stream_now = False
+    stream_cmd.time_spec = libpyuhd.types.time_spec(0.0)
+    B210.rx_streamer.issue_stream_cmd(stream_cmd)
+    assert B210.rx_streamer.recv(B210.rx_buffer, rx_md, 0.01) == 0
+    assert rx_md.error_code == libpyuhd.types.rx_metadata_error_code.late
+
+
+def test_recv_rejects_foreign_metadata(make_b210):
+    class ReadOnlyMetadata():
+        error_code = property(lambda self: None)
+
+    B210 = make_b210()
+    with pytest.raises(Exception, match="metadata types"):
+        B210.rx_streamer.recv(B210.rx_buffer, ReadOnlyMetadata(), 0.01)
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import AMP_TOLERENCE, SAMP_RATE, TARGET_AMP, TX_GAIN, calibrate
+from utils.demod import tone_response
+from utils.survey import SurveySession
+from utils.sweep_writer import load_sweep
+
+CENTER_FREQS = np.array([1e9, 1.1e9, 1.2e9])
+
+
+@pytest.fixture
+def calibrated_b210(make_b210, tx_data):
+    B210 = make_b210()
+    calibrate(B210, tx_data, CENTER_FREQS)
+    return B210
+
+
+def _process(location, sfcw_rx_signal, center_freqs):
+    return tone_response(sfcw_rx_signal, SAMP_RATE)
+
+
+def test_survey_stores_and_resumes(calibrated_b210, tx_data, tmp_path):
+    survey_dir = str(tmp_path / "survey")
+    with SurveySession(calibrated_b210, survey_dir, tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN, process=_process,
+                       attrs={"survey": "test"}) as session:
+        session.run(["a", "b"])
+    assert not calibrated_b210.transmit_flag
+
+    for location in ("a", "b"):
+        sweep = load_sweep(os.path.join(survey_dir, location))
+        assert sweep["written"].all()
+        assert sweep["attrs"]["location"] == location and sweep["attrs"]["survey"] == "test"
+        np.testing.assert_array_equal(sweep["rx_gains"], calibrated_b210.gain_table.lookup(CENTER_FREQS))
+        processed = np.load(os.path.join(survey_dir, location, "processed.npy"))
+        np.testing.assert_allclose(processed, tone_response(sweep["data"], SAMP_RATE))
+        np.testing.assert_allclose(np.abs(processed), TARGET_AMP, atol=AMP_TOLERENCE)
+
+    # a new session on the same directory resumes the survey
+    swept = []
+    with SurveySession(calibrated_b210, survey_dir, tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN) as session:
+        assert session.is_done("a") and not session.is_done("c")
+        session.run(["a", "b", "c"], before_sweep=swept.append)
+    assert swept == ["c"]
+    assert session.done_locations == ["a", "b", "c"]
+
+
+def test_survey_uses_the_current_gain_table(calibrated_b210, tx_data, tmp_path):
+    survey_dir = str(tmp_path / "survey")
+    B210 = calibrated_b210
+    with SurveySession(B210, survey_dir, tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN) as session:
+        session.sweep("a")
+        # re-calibrated in the middle of the survey
+        B210.gain_table[CENTER_FREQS[1]] = B210.gain_table[CENTER_FREQS[1]] - np.array([1.0, 1.0])
+        session.sweep("b")
+
+    gains_a = load_sweep(os.path.join(survey_dir, "a"))["rx_gains"]
+    gains_b = load_sweep(os.path.join(survey_dir, "b"))["rx_gains"]
+    np.testing.assert_array_equal(gains_b, B210.gain_table.lookup(CENTER_FREQS))
+    np.testing.assert_array_equal(gains_a[1] - gains_b[1], [1.0, 1.0])
+
+
+@pytest.mark.parametrize("location", ["", ".", "..", "../escape", "a/b", "a\\b", "/tmp/x"])
+def test_survey_rejects_path_locations(calibrated_b210, tx_data, tmp_path, location):
+    survey_dir = str(tmp_path / "survey")
+    with SurveySession(calibrated_b210, survey_dir, tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN) as session:
+        with pytest.raises(Exception, match="plain name"):
+            session.sweep(location)
+    assert sorted(os.listdir(str(tmp_path))) == ["survey"]
+    assert os.listdir(survey_dir) == []
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from conftest import AMP_TOLERENCE, SAMP_RATE, TARGET_AMP, TX_GAIN, calibrate
+from utils.demod import tone_response
+from utils.sc16 import SC16, from_complex64
+from utils.sweep_writer import Hdf5SweepWriter, NpySweepWriter, SweepWriter, export_mat, load_sweep
+
+CENTER_FREQS = [1e9, 1.1e9, 1.2e9]
+
+
+def _write_steps(writer, steps):
+    data = np.arange(np.prod(writer.shape)).reshape(writer.shape) * (1 + 1j) / np.prod(writer.shape)
+    data = data.astype(np.complex64)
+    if writer.dtype == SC16:
+        data = from_complex64(data)
+    for i in steps:
+        writer.step_buffer(i)[...] = data[i]
+        writer.write(i, [i, 2 * i])
+    return data
+
+
+def test_sweep_writer_is_abstract():
+    class HalfWriter(SweepWriter):
+        def step_buffer(self, i):
+            return None
+
+    with pytest.raises(TypeError):
+        HalfWriter(CENTER_FREQS, 10)
+
+
+@pytest.mark.parametrize("dtype", [np.complex64, SC16])
+def test_npy_round_trip(tmp_path, dtype):
+    with NpySweepWriter(str(tmp_path / "sweep"), CENTER_FREQS, 10, attrs={"samp_rate": SAMP_RATE},
+                        dtype=dtype) as writer:
+        data = _write_steps(writer, [0, 2])  # step 1 is missing, like after a crash
+
+    sweep = load_sweep(str(tmp_path / "sweep"))
+    assert sweep["data"].dtype == dtype
+    np.testing.assert_array_equal(sweep["data"][[0, 2]], data[[0, 2]])
+    assert sweep["written"].tolist() == [True, False, True]
+    np.testing.assert_array_equal(sweep["rx_gains"][[0, 2]], [[0, 0], [2, 4]])
+    assert np.all(np.isnan(sweep["rx_gains"][1]))
+    assert sweep["center_freqs"].tolist() == CENTER_FREQS
+    assert sweep["attrs"] == {"samp_rate": SAMP_RATE}
+
+
+def test_hdf5_round_trip(tmp_path):
+    pytest.importorskip("h5py")
+    file_path = str(tmp_path / "sweep.h5")
+    with Hdf5SweepWriter(file_path, CENTER_FREQS, 10, attrs={"samp_rate": SAMP_RATE}) as writer:
+        data = _write_steps(writer, [0, 1, 2])
+
+    sweep = load_sweep(file_path)
+    np.testing.assert_array_equal(sweep["data"], data)
+    assert sweep["written"].all()
+    assert sweep["attrs"]["samp_rate"] == SAMP_RATE
+
+
+def test_export_mat(tmp_path):
+    scipy_io = pytest.importorskip("scipy.io")
+    with NpySweepWriter(str(tmp_path / "sweep"), CENTER_FREQS, 10, dtype=SC16) as writer:
+        _write_steps(writer, [0, 1, 2])
+    export_mat(str(tmp_path / "sweep"), str(tmp_path / "sweep.mat"), "test")
+
+    mat = scipy_io.loadmat(str(tmp_path / "sweep.mat"))
+    assert mat["channel_data_test"].shape == (3, 2, 10)
+    assert np.iscomplexobj(mat["channel_data_test"])
+    np.testing.assert_array_equal(mat["rx_gains"], [[0, 0], [1, 2], [2, 4]])
+
+
+def test_sweep_into_writer(make_b210, tx_data, tmp_path):
+    B210 = make_b210()
+    calibrate(B210, tx_data, CENTER_FREQS)
+    with NpySweepWriter(str(tmp_path / "sweep"), CENTER_FREQS, B210.num_rx_samps) as writer:
+        B210.sfcw_seep(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN, writer=writer)
+
+    sweep = load_sweep(str(tmp_path / "sweep"))
+    assert sweep["written"].all()
+    np.testing.assert_array_equal(sweep["rx_gains"], B210.gain_table.lookup(CENTER_FREQS))
+    np.testing.assert_allclose(np.abs(tone_response(sweep["data"], SAMP_RATE)), TARGET_AMP, atol=AMP_TOLERENCE)
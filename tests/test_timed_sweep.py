@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from conftest import AMP_TOLERENCE, SAMP_RATE, TARGET_AMP, TX_GAIN, calibrate
+from utils.demod import tone_response
+
+CENTER_FREQS = np.arange(1e9, 1.2e9, 20e6)
+
+
+def calibrated(B210, tx_data):
+    calibrate(B210, tx_data, CENTER_FREQS)
+    B210.usrp.num_unlocked_samps = 0
+    return B210
+
+
+@pytest.fixture
+def calibrated_b210(make_b210, tx_data):
+    # the simulated device runs 5 times faster than real time, so the host is the slow side
+    return calibrated(make_b210(time_scale=0.2), tx_data)
+
+
+def test_timed_sweep_with_the_defaults(calibrated_b210, tx_data):
+    B210 = calibrated_b210
+    sfcw_rx_signal, freqs = B210.sfcw_seep_timed(tx_data, CENTER_FREQS[::-1], TX_GAIN, TX_GAIN)
+    assert freqs.tolist() == CENTER_FREQS.tolist()
+    assert B210.usrp.num_unlocked_samps == 0
+    np.testing.assert_allclose(np.abs(tone_response(sfcw_rx_signal, SAMP_RATE)), TARGET_AMP, atol=AMP_TOLERENCE)
+    assert not B210.transmit_flag
+
+
+def test_timed_sweep_slips_instead_of_failing(make_b210, tx_data):
+    # one step ahead cannot cover the lead time: every step is pushed back, none is late.
+    # At 5 times real time the tx thread underflows now and then while the sweep thread waits on the slips
+    B210 = calibrated(make_b210(time_scale=0.5), tx_data)
+    sfcw_rx_signal, _ = B210.sfcw_seep_timed(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN, lookahead=1)
+    assert B210.sweep_stats["slip_seconds"] > 0
+    assert B210.usrp.num_unlocked_samps == 0
+    np.testing.assert_allclose(np.abs(tone_response(sfcw_rx_signal, SAMP_RATE)), TARGET_AMP, atol=AMP_TOLERENCE)
+
+
+def test_timed_sweep_abort_flushes_the_rx_stream(calibrated_b210, tx_data, monkeypatch):
+    B210 = calibrated_b210
+
+    def fail(rx_data):
+        raise Exception('disk full')
+
+    monkeypatch.setattr(B210, "_conjugate", fail)
+    with pytest.raises(Exception, match="disk full"):
+        B210.sfcw_seep_timed(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+    assert not B210.transmit_flag
+    assert len(B210.rx_streamer._commands) == 0
+
+    # the next sweep starts clean
+    monkeypatch.undo()
+    B210.sfcw_seep_timed(tx_data, CENTER_FREQS, TX_GAIN, TX_GAIN)
+    assert B210.usrp.num_unlocked_samps == 0
@@ -0,0 +1,36 @@
+import pytest
+
+
+def test_tune_waits_for_lock_in_device_time(make_b210):
+    # 0.1 device seconds of lock time pass in 0.02 host seconds
+    B210 = make_b210(time_scale=0.2, lock_time_base=0.1, lock_time_band_cross=0.0)
+    B210.tune_center_freq(1e9)
+    assert B210._lo_locked()
+    assert B210.current_center_freq() == 1e9
+
+    latency = B210.lock_latency[1e9][-1]
+    assert 0.09 <= latency < 0.5
+    assert B210.retune_log[-1] == (None, 1e9, latency)
+    assert B210.get_settle_time(1e9) == pytest.approx(latency * B210.SettleMargin)
+
+    # already there: no retune, nothing logged
+    B210.tune_center_freq(1e9)
+    assert len(B210.lock_latency[1e9]) == 1
+
+
+def test_learned_settle_time(make_b210):
+    B210 = make_b210(time_scale=0.2)
+    B210.tune_center_freq(1e9)
+    B210.use_learned_settle = True
+    B210.tune_center_freq(1.01e9)
+    B210.tune_center_freq(1e9)
+    assert B210._lo_locked()
+    assert len(B210.lock_latency[1e9]) == 2
+
+
+def test_tune_timeout_forgets_freq(make_b210):
+    B210 = make_b210(time_scale=1.0, lock_time_base=10.0)
+    with pytest.raises(Exception, match="did not lock"):
+        B210.tune_center_freq(1e9, timeout=0.02)
+    assert B210.current_center_freq() is None
+    assert 1e9 not in B210.lock_latency
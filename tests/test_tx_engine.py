@@ -0,0 +1,75 @@
+import time
+
+import numpy as np
+import pytest
+
+from utils.sim_uhd import SimMultiUSRP, libpyuhd
+from utils.tx_engine import TxEngine
+
+
+@pytest.fixture
+def tx_streamer():
+    usrp = SimMultiUSRP(time_scale=0.5)
+    usrp.set_tx_rate(1e6)
+    st_args = libpyuhd.usrp.stream_args("fc32", "sc16")
+    st_args.channels = (0, 1)
+    return usrp.get_tx_stream(st_args)
+
+
+@pytest.fixture
+def tone():
+    return np.tile(np.exp(2j * np.pi * np.arange(1000) / 1000), (2, 1)).astype(np.complex64)
+
+
+def test_short_buffer_is_tiled_into_whole_chunks(tx_streamer, tone):
+    engine = TxEngine(tx_streamer, 1e6)
+    assert engine.chunk_size == 10000
+    engine.start(tone)
+    try:
+        assert engine.tx_data.shape == (2, 10000)
+        np.testing.assert_array_equal(engine.tx_data[:, 1000:2000], tone)
+    finally:
+        engine.stop()
+
+
+def test_stop_ends_the_burst(tx_streamer, tone):
+    engine = TxEngine(tx_streamer, 1e6)
+    engine.start(tone)
+    time.sleep(0.05)
+    engine.stop()
+    assert not engine.is_running()
+
+    stats = engine.stats()
+    assert stats["samples_sent"] > 0 and stats["samples_sent"] % 1000 == 0
+    assert stats["sample_rate"] > 0
+    assert stats["underflow"] == 0
+    # the end-of-burst packet is acknowledged
+    assert stats["burst_ack"] == 1
+
+
+def test_start_switches_only_on_new_data(tx_streamer, tone):
+    engine = TxEngine(tx_streamer, 1e6)
+    engine.start(tone)
+    thread = engine._send_thread
+    engine.start(tone)
+    assert engine._send_thread is thread
+
+    engine.start(tone.copy())
+    assert engine._send_thread is not thread
+    engine.stop()
+    assert engine.stats()["burst_ack"] == 1
+
+
+def test_timed_start(tx_streamer, tone):
+    engine = TxEngine(tx_streamer, 1e6)
+    tx_md = libpyuhd.types.tx_metadata()
+    tx_md.has_time_spec = True
+    tx_md.time_spec = libpyuhd.types.time_spec(tx_streamer._device.get_time_now().get_real_secs() + 0.05)
+    engine.start(tone, tx_md)
+    time.sleep(0.05)
+    engine.stop()
+
+    first_segment = tx_streamer._segments[0]
+    assert first_segment[0] == pytest.approx(tx_md.time_spec.get_real_secs())
+    # the caller's metadata is not changed
+    assert tx_md.has_time_spec and not tx_md.start_of_burst and not tx_md.end_of_burst
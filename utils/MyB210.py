@@ -1,7 +1,23 @@
-import uhd
-from uhd import libpyuhd as lib
+try:
+    import uhd
+    from uhd import libpyuhd as lib
+except ImportError:
+    # UHD is not installed on this machine: only the simulated device in utils/sim_uhd.py can be used
+    uhd = None
+    from utils.sim_uhd import libpyuhd as lib
 import numpy as np
-from threading import Thread
+import os
+import time
+from collections import deque
+
+from utils.calibration import ComplexCalibration, build_calibration
+from utils.demod import reference_tone, tone_response
+from utils.freq_plan import RetuneCostModel, plan_sweep
+from utils.gain_search import RxGainSearch
+from utils.gain_table import GainTable
+from utils.metrics import Metrics, instrument, uninstrument
+from utils.sc16 import conjugate_in_place, host_dtype, to_complex64
+from utils.tx_engine import TxEngine
 
 
 
@@ -14,23 +30,60 @@ class MyB210():
     # the number of samples of the baseband signal in one period:
     # will affect the self.buffer size
     LengthOnePeriod = 1000
+    # the frequency of the tx tone, see utils/signals.complex_sinusoid()
+    ToneFreq = 1000
+
+    # waiting for the LO's to lock: the poll interval starts at LockPollMin seconds and doubles up to LockPollMax,
+    # so the wait does not spin a core that the tx thread needs
+    LockPollMin = 50e-6
+    LockPollMax = 2e-3
+    # the learned settle times are kept per band of SettleBandWidth Hz, and used with a SettleMargin safety factor
+    SettleBandWidth = 100e6
+    SettleMargin = 1.2
+    # a capture starts RecvLeadTime seconds after its stream command is issued
+    RecvLeadTime = 0.01
+    # the lock latencies kept: the last RetuneLogLength retunes, and the last LockLatencyLength per center freq,
+    # so a long running B210 (a daemon, a survey) does not grow them forever
+    RetuneLogLength = 2000
+    LockLatencyLength = 100
 
     @staticmethod
     def estimate_amp(rx_buffer_one_channel):
         """
-        :param rx_buffer_one_channel: the rx_buffer_one_channel is a numpy 1 by N array of complex numbers
+        :param rx_buffer_one_channel: the rx_buffer_one_channel is a numpy 1 by N array of complex (or sc16) numbers
         :return: amp
                 the estimated rx amplitude of the signals stored in the rx_buffer
         """
         # using the simple average method to estimate amplitude
-        amp = np.mean(np.absolute(rx_buffer_one_channel))
+        amp = np.mean(np.absolute(to_complex64(rx_buffer_one_channel)))
 
         return amp
 
+    @staticmethod
+    def estimate_tone_amp(rx_buffer, samp_rate, tone_freq=1000, conjugate=True):
+        """
+        A tone-selective amplitude estimator: only the power at the tx tone counts as signal, noise and DC do not.
+        All channels are estimated in one vectorized call.
+
+        :param rx_buffer: a numpy array of complex (or sc16) numbers, 2 by N (or ... by N); N should be a whole
+                          number of tone periods
+        :param samp_rate: the sample rate of rx_buffer
+        :param tone_freq: the frequency of the tx tone
+        :param conjugate: True if rx_buffer holds raw rx data, whose conjugate carries the tone (see self.sfcw_seep())
+        :return: amps, snrs
+                the estimated tone amplitude and signal to noise power ratio of each channel, numpy arrays
+        """
+        rx_buffer = to_complex64(rx_buffer)
+        amps = np.absolute(tone_response(rx_buffer, samp_rate, tone_freq, conjugate=conjugate))
+        total_power = np.mean(np.absolute(rx_buffer) ** 2, axis=-1)
+        noise_power = np.maximum(total_power - amps ** 2, np.finfo(np.float32).tiny)
+        return amps, amps ** 2 / noise_power
+
 #################################################################################################################
 # This is the basic functions for USRP B210
 ################################################################################################################
-    def __init__(self, samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth, tx_gains=[0, 0], rx_gains=[0, 0]):
+    def __init__(self, samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth, tx_gains=[0, 0], rx_gains=[0, 0],
+                 args="type = b200", usrp=None, cpu_format="fc32"):
         """
         :param samp_rate: the sample rate of the ADC and DAC
         :param master_clock_rate: the base clock rate that is used as a reference clock for the ADC and DAC and the FPGA
@@ -38,22 +91,37 @@ class MyB210():
         :param rx_bandwidth: the filter bandwidth for the rx chain
         :param tx_gains: 0 -- 89.8 dB of available gain; the first element is for txA gain, the second element is for txB gain
         :param rx_gains: 0 -- 76 dB of available gain; the first element is for rxA gain, the second element is for rxB gain
+        :param args: the UHD device args used to open the B210
+        :param usrp: an already constructed MultiUSRP-like device, e.g. utils.sim_uhd.SimMultiUSRP() to run
+                     without hardware; when None, a real B210 is opened with args
+        :param cpu_format: the sample format of the host buffers, "fc32" (complex64) or "sc16" (int16 I/Q, half the
+                           memory and no conversion on the host, see utils/sc16.py); for rx and tx alike
 
         the key attributes of a my_B210 object is:
         self.usrp
         self.tx_streamer
         self.rx_streamer
 
-        self.transmit_flag  # used to kill the tx_thread when done
+        self.transmit_flag  # True while the tx_engine is transmitting
+        self.tx_engine  # the background tx streaming engine, see utils/tx_engine.py
 
         self.num_rx_samps : the number of rx samples in the self.rx_buffer
-        self.rx_buffer : a 2 by self.num_rx_samps numpy array of complex64 numbers
-
-        self.gain_table = {} : this gain_table stores the key-value pairs of {center_freq: [rxA_gain, rxB_gain]}
+        self.rx_buffer : a 2 by self.num_rx_samps numpy array of complex64 numbers (sc16 with cpu_format="sc16")
+        self.host_dtype : the dtype of the rx buffers and of the tx data, np.complex64 or utils.sc16.SC16
+
+        self.gain_table : a GainTable (utils/gain_table.py) of [rxA_gain, rxB_gain] per center_freq
+        self.gain_interpolation : how the sweeps look up rx gains for freqs between the calibrated ones,
+                                  "nearest" or "linear", see GainTable.lookup()
+        self.calibration : the complex calibration of the tx/rx chain (utils/calibration.py), or None
+        self.calibration_captures = {} : the number of captures the gain search used, {center_freq: num_captures}
+        self.lock_latency = {} : the last LO lock latencies of the tunes in device seconds,
+                                 {center_freq: deque([seconds, ...])}
+        self.retune_log : (from_freq, to_freq, lock latency) of the last retunes, see utils/freq_plan.py
+        self.metrics : the stage timings while self.enable_metrics() is on, else None; see utils/metrics.py
         """
 
         # construct some flags
-        self.transmit_flag = False  # used to kill the tx_thread when done
+        self.transmit_flag = False  # True while the tx_engine is transmitting
         self.gain_table_updated_flag = False # only self.get_gains_for_all_freqs() and self.load_gain_table() can set it to True
 
         # the num_rx_samps
@@ -63,17 +131,40 @@ class MyB210():
         self.samp_rate = samp_rate
 
         # construct the rx_buffer
-        self.rx_buffer = np.zeros((2, self.num_rx_samps), dtype=np.complex64)
+        self.cpu_format = cpu_format
+        self.host_dtype = host_dtype(cpu_format)
+        self.rx_buffer = np.zeros((2, self.num_rx_samps), dtype=self.host_dtype)
+        self.amp_rel_error = 0.02  # the relative error self.measure_rx_amps() aims for
+        self.num_captures = 0  # counts the captures of self.recv_and_save_data()
 
         # construct the gain_table
-        self.gain_table = {}   # this gain_table stores the key-value pairs of {center_freq: [rxA_gain, rxB_gain]}
-
-
-        # construct the tx_streamer and tx_streamer
-        args = "type = b200"
+        self.gain_table = GainTable()   # this gain_table stores [rxA_gain, rxB_gain] for each center_freq
+        self.gain_interpolation = "nearest"
+        self.calibration = None  # the complex calibration, see self.calibrate_response()
+        self.calibration_captures = {}  # {center_freq: the number of captures the gain search used}
+        self.sweep_stats = {}  # timing of the last timed sweep
+
+        # LO lock instrumentation in device seconds, see self.tune_center_freq()
+        self.lock_latency = {}  # {center_freq: deque of the last lock latencies of tunes to center_freq in seconds}
+        self.settle_times = {}  # {band index: the longest lock latency seen in the band}, the learned settle times
+        self.use_learned_settle = False  # True sleeps for the learned settle time instead of polling lo_locked
+        # the last (from_freq, to_freq, lock latency in seconds) retunes, for RetuneCostModel.fit()
+        self.retune_log = deque(maxlen=MyB210.RetuneLogLength)
+
+        # the last gains and freqs set on the device, {("rx_gain", channel): value, ("rx_freq", channel): value, ...};
+        # the setters below skip a call that would not change the value
+        self._settings = {}
+        self.num_skipped_settings = 0
+        self._step_freq = None  # the center freq of the sweep step being worked on, see self.mark_step()
+
+        self.metrics = None  # see self.enable_metrics()
 
         # create a usrp device and set up it with the device parameters defined above
-        self.usrp = uhd.usrp.MultiUSRP(args)
+        if usrp is None:
+            if uhd is None:
+                raise Exception('UHD is not installed, pass a simulated device through usrp=SimMultiUSRP()')
+            usrp = uhd.usrp.MultiUSRP(args)
+        self.usrp = usrp
 
         # set clock ant time
         freq_clock_source = "internal"
@@ -109,22 +200,38 @@ class MyB210():
         print("Actual TX1 bandwidth = {} MHz".format(self.usrp.get_tx_bandwidth(1) / 1e6))
 
         # set front end gain
-        self.usrp.set_rx_gain(rx_gains[0], channel_list[0])
-        self.usrp.set_rx_gain(rx_gains[1], channel_list[1])
-        self.usrp.set_tx_gain(tx_gains[0], channel_list[0])
-        self.usrp.set_tx_gain(tx_gains[1], channel_list[1])
+        self.set_gains(tx_gains, rx_gains)
         print("Actual RX0 gain: {}".format(self.usrp.get_rx_gain(0)))
         print("Actual RX1 gain: {}".format(self.usrp.get_rx_gain(1)))
         print("Actual TX0 gain: {}".format(self.usrp.get_tx_gain(0)))
         print("Actual TX1 gain: {}".format(self.usrp.get_tx_gain(1)))
 
         # create stream args and tx streamer
-        st_args = lib.usrp.stream_args("fc32", "sc16")
+        st_args = lib.usrp.stream_args(cpu_format, "sc16")
         st_args.channels = channel_list
 
         self.tx_streamer = self.usrp.get_tx_stream(st_args)  # create tx streamer
         self.rx_streamer = self.usrp.get_rx_stream(st_args)  # create rx streamer
 
+        # the tx engine streams the tx data in the background, see self.thread_send_data()
+        self.tx_engine = TxEngine(self.tx_streamer, samp_rate)
+
+    def enable_metrics(self, metrics=None):
+        """
+        start timing the hot paths (tuning, gain setting, captures, sweeps, calibration) of this object
+        :param metrics: a utils.metrics.Metrics to record into; None creates a new one
+        :return: self.metrics
+        """
+        self.metrics = Metrics() if metrics is None else metrics
+        instrument(self, self.metrics)
+        return self.metrics
+
+    def disable_metrics(self):
+        """
+        stop timing; the methods run without any instrumentation again. self.metrics keeps what was recorded
+        """
+        uninstrument(self)
+
     def init_usrp_device_time(self):
         """
         set the usrp device time to zero
@@ -138,31 +245,153 @@ class MyB210():
         example
         tx_gains = [10, 20] will set txA_gain to be 10 dB and txB_gain to be 20 dB
         """
-        self.usrp.set_rx_gain(rx_gains[0], 0)
-        self.usrp.set_rx_gain(rx_gains[1], 1)
-        self.usrp.set_tx_gain(tx_gains[0], 0)
-        self.usrp.set_tx_gain(tx_gains[1], 1)  # we don't use tx1, thus set the gain to zero
+        self.set_rx_gain(rx_gains[0], 0)
+        self.set_rx_gain(rx_gains[1], 1)
+        self.set_tx_gain(tx_gains[0], 0)
+        self.set_tx_gain(tx_gains[1], 1)  # we don't use tx1, thus set the gain to zero
+
+    def _set(self, key, value, setter):
+        """
+        call setter() unless self._settings says the device already has value for key
+        :return: True if setter() was called
+        """
+        if self._settings.get(key) == value:
+            self.num_skipped_settings += 1
+            return False
+        setter()
+        self._settings[key] = value
+        return True
+
+    def set_rx_gain(self, gain, channel):
+        """
+        self.usrp.set_rx_gain(gain, channel), skipped if the gain is already set
+        """
+        return self._set(("rx_gain", channel), gain, lambda: self.usrp.set_rx_gain(gain, channel))
+
+    def set_tx_gain(self, gain, channel):
+        """
+        self.usrp.set_tx_gain(gain, channel), skipped if the gain is already set
+        """
+        return self._set(("tx_gain", channel), gain, lambda: self.usrp.set_tx_gain(gain, channel))
 
-    def tune_center_freq(self, target_center_freq):
+    def set_freqs(self, center_freq):
+        """
+        tune the rx and tx frequencies of both channels to center_freq, skipping the ones already there;
+        with set_command_time() active, the calls become timed commands like the plain usrp calls
+        :return: True if any frequency was changed
+        """
+        changed = False
+        for direction, set_freq in (("rx", self.usrp.set_rx_freq), ("tx", self.usrp.set_tx_freq)):
+            for channel in (0, 1):
+                changed |= self._set((direction + "_freq", channel), center_freq,
+                                     lambda: set_freq(lib.types.tune_request(center_freq), channel))
+        return changed
+
+    def forget_settings(self):
+        """
+        forget the cached gains and freqs, so the next setters call the device again;
+        needed after changing them with self.usrp directly
+        """
+        self._settings = {}
+
+    def current_center_freq(self):
+        """
+        :return: the rx freq last set with self.set_freqs(), None if there is none
+        """
+        return self._settings.get(("rx_freq", 0))
+
+    def mark_step(self, center_freq):
+        """
+        :param center_freq: the center freq of the sweep step that the next calls work on, or None after the sweep;
+                            the per-freq metrics file the calls under it (the LO's can be tuned to another step,
+                            e.g. ahead in a timed sweep), see self.step_freq()
+        """
+        self._step_freq = center_freq
+
+    def step_freq(self):
+        """
+        :return: the center freq of the sweep step being worked on, or the current center freq outside of sweeps
+        """
+        return self.current_center_freq() if self._step_freq is None else self._step_freq
+
+    def _lo_locked(self):
+        return (
+                self.usrp.get_rx_sensor("lo_locked", 0).to_bool() and
+                self.usrp.get_tx_sensor("lo_locked", 0).to_bool()
+        )
+
+    def tune_center_freq(self, target_center_freq, timeout=1.0):
         """
         usrp is a MultiUSRP device object
         tune the tx/rx LO to target_center_freq
         wait until the LO's are all locked.
-        Then tell all threads the lo is OK by setting the tune_OK_s to True
+
+        The wait sleeps between lo_locked polls (LockPollMin doubling up to LockPollMax seconds) and raises an
+        exception after timeout seconds. When self.use_learned_settle is True and the band of target_center_freq
+        has a learned settle time, it sleeps for that time first and usually needs a single poll.
+        The lock latency is measured on the device clock (self.usrp.get_time_now()), so the learned settle times
+        can offset the timed commands of self.sfcw_seep_timed(); on a B210 the device clock runs at host speed.
+        It is recorded in self.lock_latency and self.retune_log and teaches self.settle_times.
+        Tuning to the freq the LO's are already at returns right away.
+
+        :param target_center_freq: the center freq in Hz
+        :param timeout: the longest wait for the LO's to lock, in seconds
         """
 
-        # tune center freqs on all channels
-        self.usrp.set_rx_freq(lib.types.tune_request(target_center_freq), 0)
-        self.usrp.set_rx_freq(lib.types.tune_request(target_center_freq), 1)
-        self.usrp.set_tx_freq(lib.types.tune_request(target_center_freq), 0)
-        self.usrp.set_tx_freq(lib.types.tune_request(target_center_freq), 1)
+        # tune center freqs on all channels; the LO's are still locked if they are already at target_center_freq
+        start_time = time.perf_counter()
+        start_device_time = self.usrp.get_time_now()
+        from_freq = self.current_center_freq()
+        if not self.set_freqs(target_center_freq):
+            return
+
+        band = int(target_center_freq // MyB210.SettleBandWidth)
+        if self.use_learned_settle and band in self.settle_times:
+            time.sleep(self.settle_times[band] * MyB210.SettleMargin)
+
+        # wait until the lo's are locked
+        poll_interval = MyB210.LockPollMin
+        num_polls = 0
+        while not self._lo_locked():
+            if time.perf_counter() - start_time > timeout:
+                # the freq is not set until the LO's lock, a retry has to tune again
+                self.forget_settings()
+                raise Exception('LO did not lock within {} seconds at {} Hz'.format(timeout, target_center_freq))
+            time.sleep(poll_interval)
+            poll_interval = min(2 * poll_interval, MyB210.LockPollMax)
+            num_polls += 1
+
+        latency = (self.usrp.get_time_now() - start_device_time).get_real_secs()
+        if target_center_freq not in self.lock_latency:
+            self.lock_latency[target_center_freq] = deque(maxlen=MyB210.LockLatencyLength)
+        self.lock_latency[target_center_freq].append(latency)
+        self.retune_log.append((from_freq, target_center_freq, latency))
+        # a learned settle time only grows when sleeping for it was not enough
+        if not self.use_learned_settle or num_polls > 0:
+            self.settle_times[band] = max(self.settle_times.get(band, 0.0), latency)
+
+    def get_settle_time(self, center_freq, default=2e-3):
+        """
+        :return: the learned settle time in device seconds (with the SettleMargin safety factor) of the band of
+                 center_freq, or default if nothing has been learned for that band yet
+        """
+        band = int(center_freq // MyB210.SettleBandWidth)
+        if band not in self.settle_times:
+            return default
+        return self.settle_times[band] * MyB210.SettleMargin
 
-        # wait until the lo's are locked, or maybe just put some time delay here?
-        while not (
-                self.usrp.get_rx_sensor("lo_locked", 0).to_bool() and
-                self.usrp.get_tx_sensor("lo_locked", 0).to_bool()
-        ):
-            pass
+    def lock_latency_histogram(self, center_freq=None, bins=20):
+        """
+        :param center_freq: the center freq to get the histogram for; None puts the latencies of all freqs together
+        :param bins: passed to np.histogram
+        :return: counts, bin_edges
+            the histogram of the LO lock latencies in seconds recorded by self.tune_center_freq()
+        """
+        if center_freq is None:
+            latencies = [t for freq_latencies in self.lock_latency.values() for t in freq_latencies]
+        else:
+            latencies = self.lock_latency.get(center_freq, [])
+        return np.histogram(latencies, bins=bins)
 
     def send_data_once(self, tx_data, tx_md = lib.types.tx_metadata()):
         """
@@ -176,29 +405,38 @@ class MyB210():
         """
         self.tx_streamer.send(tx_data, tx_md)
 
-    def send_data_cont(self, tx_data, tx_md = lib.types.tx_metadata()):
-        while True:
-            if not self.transmit_flag:
-                break
-            self.tx_streamer.send(tx_data, tx_md)
+    def thread_send_data(self, tx_data, tx_md=None):
+        """
+        start transmitting tx_data over and over with self.tx_engine, in chunks and as one burst;
+        if the engine is already transmitting, it keeps going with the same tx_data object or switches to a new one
 
-    def thread_send_data(self, tx_data, tx_md = lib.types.tx_metadata()):
+        :param tx_data: should be an numpy array with dimension 2 by N, see self.send_data_once();
+                        of self.host_dtype, see the cpu_format parameter of utils/signals.py
+        :param tx_md: the tx metadata, e.g. with a time spec to start the burst at a device time; None starts now.
+                      See TxEngine.start() in utils/tx_engine.py
+        """
+        if tx_data.dtype != self.host_dtype:
+            raise Exception('tx_data should be {} for the {} cpu format'.format(self.host_dtype, self.cpu_format))
         self.transmit_flag = True
-
-        tx_thread = Thread(target=self.send_data_cont, args=(tx_data, tx_md))
-        tx_thread.start()
+        self.tx_engine.start(tx_data, tx_md)
         print("tx thread begins")
 
     def stop_transmit(self):
+        """
+        stop transmitting: the tx engine ends the burst and its threads are joined
+        """
         self.transmit_flag = False
-        print("Stop Transmit")
+        self.tx_engine.stop()
+        stats = self.tx_engine.stats()
+        print("Stop Transmit: sent {} samples at {:.3f} Msps, {} underflows, {} sequence errors".format(
+            stats["samples_sent"], stats["sample_rate"] / 1e6, stats["underflow"], stats["seq_error"]))
 
     def recv_and_save_data(self, rx_buffer, num_rx_samps, rx_md = lib.types.rx_metadata()):
         """
         This method fetches the rx data from the hardware into the rx_buffer provided by the user.
 
         :param rx_buffer: should be an numpy array with dimension 2 by num_rx_samps, where
-                        1) the elements are of type complex64 and 2) the first row of I/Q data is
+                        1) the elements are of type self.host_dtype and 2) the first row of I/Q data is
                         obtained from the rx buffer in channelA and the second row of I/Q data is
                         obtained from the tx buffer in channelB
                         the received data is stored in the rx_buffer.
@@ -213,11 +451,67 @@ class MyB210():
         stream_cmd = lib.types.stream_cmd(lib.types.stream_mode.num_done)
         stream_cmd.num_samps = num_rx_samps
         stream_cmd.stream_now = False
-        stream_cmd.time_spec = self.usrp.get_time_now() + lib.types.time_spec(0.01)
+        stream_cmd.time_spec = self.usrp.get_time_now() + lib.types.time_spec(MyB210.RecvLeadTime)
         self.rx_streamer.issue_stream_cmd(stream_cmd)  # tells all channels to stream
 
         self.rx_streamer.recv(rx_buffer, rx_md)
+        self.num_captures += 1
+
+
+    def flush_rx(self, timeout=0.1):
+        """
+        stop the rx stream and drop everything still queued for it, e.g. the bursts of the stream commands a timed
+        sweep issued ahead, so the next capture does not receive them; receives until a recv times out
+        """
+        stream_cmd = lib.types.stream_cmd(lib.types.stream_mode.stop_cont)
+        stream_cmd.stream_now = True
+        self.rx_streamer.issue_stream_cmd(stream_cmd)
+        rx_md = lib.types.rx_metadata()
+        while True:
+            self.rx_streamer.recv(self.rx_buffer, rx_md, timeout)
+            if rx_md.error_code == lib.types.rx_metadata_error_code.timeout:
+                return
+
+    def measure_rx_amps(self, rel_error=None, min_num_samps=None, tone_freq=None):
+        """
+        Measures the tone amplitude of both rx channels with the shortest capture that reaches the requested
+        confidence: a first short capture estimates the SNR, and if its relative amplitude error is too large, one
+        more capture is taken with the length that the SNR calls for (at most self.num_rx_samps).
+        The relative error of the amplitude from N samples is about 1 / sqrt(2 * N * snr).
+
+        :param rel_error: the requested relative error of the amplitudes; None uses self.amp_rel_error
+        :param min_num_samps: the length of the first capture; None uses 2 tone periods
+        :param tone_freq: the frequency of the tx tone in Hz; None uses MyB210.ToneFreq
+        :return: amps, snrs, num_samps
+                the tone amplitude and SNR of rxA and rxB, and the number of samples of the last capture;
+                the last capture is in the first num_samps columns of self.rx_buffer, see self.rx_buffer_view()
+        """
+        if rel_error is None:
+            rel_error = self.amp_rel_error
+        if tone_freq is None:
+            tone_freq = MyB210.ToneFreq
+        period = MyB210.LengthOnePeriod
+        num_samps = min(2 * period if min_num_samps is None else min_num_samps, self.num_rx_samps)
+
+        while True:
+            rx_buffer = self.rx_buffer_view(num_samps)
+            self.recv_and_save_data(rx_buffer, num_samps)
+            amps, snrs = MyB210.estimate_tone_amp(rx_buffer, self.samp_rate, tone_freq)
+            if num_samps >= self.num_rx_samps:
+                break
+            # the capture length that reaches rel_error on the weaker channel, in whole tone periods
+            needed_num_samps = 1 / (2 * np.min(snrs) * rel_error ** 2)
+            if needed_num_samps <= num_samps:
+                break
+            num_samps = min(int(np.ceil(needed_num_samps / period)) * period, self.num_rx_samps)
+
+        return amps, snrs, num_samps
 
+    def rx_buffer_view(self, num_samps):
+        """
+        :return: a C-contiguous 2 by num_samps view of the memory of self.rx_buffer, to receive short captures into
+        """
+        return self.rx_buffer.reshape(-1)[:2 * num_samps].reshape(2, num_samps)
 
     ###############################################################################################
     #  The following sections are for gain tuning
@@ -240,71 +534,117 @@ class MyB210():
             raise Exception('B210 is not transmitting')
 
         # set hardware parameters
+        self.mark_step(center_freq)
         self.tune_center_freq(center_freq)
-        self.usrp.set_tx_gain(tx_gain, channel)
-        self.usrp.set_rx_gain(0, channel)
-
-        # the following is a simple tuning algorithm
-        # loop init
-        self.recv_and_save_data(self.rx_buffer, self.num_rx_samps)  # receive data
-        estimated_amp = MyB210.estimate_amp(self.rx_buffer[channel])  # get estimated_amp of the channel
-
-        while not (
-                estimated_amp >= target_rx_amp - amp_tolerence
-                and estimated_amp <= target_rx_amp + amp_tolerence
-        ):
-            # if estimated_amp is too small
-            if estimated_amp < target_rx_amp - amp_tolerence :
-                rx_gain_current = self.usrp.get_rx_gain(channel)
-                if rx_gain_current <= 76:
-                    self.usrp.set_rx_gain(rx_gain_current + np.random.uniform(1.21, 5.7), channel)
-                    print(
-                        "trying rx: {} gain {} for frequency {} GHz".format(
-                            channel , self.usrp.get_rx_gain(channel), center_freq / 1e9
-                        )
-                    )
-                else:
-                    print(
-                        "current frequency {} can not be tuned to target amplitude, rx_gain can not exceed 76dB".format(
-                            center_freq
-                        )
+        self.set_tx_gain(tx_gain, channel)
+
+        # model-based search: every capture tells how many dB the rx gain is off, see utils/gain_search.py
+        search = RxGainSearch(target_rx_amp, amp_tolerence, start_gain=0, max_gain=76)
+        first_capture = self.num_captures
+        rx_gain = search.start_gain
+        while rx_gain is not None:
+            self.set_rx_gain(rx_gain, channel)
+            amps, snrs, num_samps = self.measure_rx_amps(0.25 * amp_tolerence / target_rx_amp)  # receive data
+            estimated_amp = amps[channel]  # get estimated_amp of the channel
+            rx_gain = search.update(self.usrp.get_rx_gain(channel), estimated_amp)
+            if rx_gain is not None:
+                print(
+                    "trying rx: {} gain {} for frequency {} GHz".format(
+                        channel, rx_gain, center_freq / 1e9
                     )
-                    break
+                )
 
-            # else if amp is too large
-            elif estimated_amp > target_rx_amp + amp_tolerence:
-                rx_gain_current = self.usrp.get_rx_gain(channel)
-                if rx_gain_current > 0:
-                    self.usrp.set_rx_gain(rx_gain_current - np.random.uniform(0.2, 2.3), channel)
-                    print(
-                        "trying rx: {} gain {} for frequency {} GHz".format(
-                            channel ,self.usrp.get_rx_gain(channel) , center_freq / 1e9
+        if not search.converged:
+            print(
+                "current frequency {} can not be tuned to target amplitude, rx_gain has to stay within 0 -- 76dB".format(
+                    center_freq
+                )
+            )
+
+        # leave the channel at the good rx gain
+        good_rx_gain = search.good_gain
+        self.set_rx_gain(good_rx_gain, channel)
+        num_captures = self.num_captures - first_capture
+        self.calibration_captures[center_freq] = self.calibration_captures.get(center_freq, 0) + num_captures
+        print(
+            "current frequency is {}, the good rx:{} gain is rx_gain = {} ({} captures)".format(
+                center_freq, channel, good_rx_gain, num_captures
+            )
+        )
+
+        return good_rx_gain
+
+    def _get_gains_for_both_channels_one_center_freq(self, center_freq, tx_gains, target_rx_amps, amp_tolerence,
+                                                     start_gains=(0, 0)):
+        """
+        Given a center_freq, tx_gains, target_rx_amps, amp_tolerence,
+        this helper method finds good rx gains for channelA and channelB together:
+        the LO is tuned once, and every 2 by N capture updates the gain search of both channels.
+        It returns when both channels are within the tolerance (or can not be tuned any further).
+
+        :param center_freq: center_freq for both channels
+        :param tx_gains: [txA_gain, txB_gain]
+        :param target_rx_amps: [target_rxA_amp, target_rxB_amp]
+        :param amp_tolerence:
+        :param start_gains: the rx gains of the first capture; a good guess, like the gains of an earlier
+                            calibration, usually ends the search after this one capture
+        :return: [good_rxA_gain, good_rxB_gain]
+        """
+
+        # suppose the transmitter is turned on through self.thread_send_data()
+        if not self.transmit_flag:
+            raise Exception('B210 is not transmitting')
+
+        # set hardware parameters
+        self.mark_step(center_freq)
+        self.tune_center_freq(center_freq)
+        self.set_tx_gain(tx_gains[0], 0)
+        self.set_tx_gain(tx_gains[1], 1)
+
+        searches = [
+            RxGainSearch(target_rx_amps[channel], amp_tolerence, start_gain=start_gains[channel], max_gain=76)
+            for channel in (0, 1)
+        ]
+        rx_gains = [search.start_gain for search in searches]
+        first_capture = self.num_captures
+        while any(rx_gain is not None for rx_gain in rx_gains):
+            for channel in (0, 1):
+                if rx_gains[channel] is not None:
+                    self.set_rx_gain(rx_gains[channel], channel)
+            # receive data on both channels, just long enough for an amplitude error well inside the tolerance
+            amps, snrs, num_samps = self.measure_rx_amps(0.25 * amp_tolerence / max(target_rx_amps))
+
+            for channel in (0, 1):
+                if rx_gains[channel] is None:
+                    continue  # this channel is done, it stays at its good rx gain
+                rx_gains[channel] = searches[channel].update(self.usrp.get_rx_gain(channel), amps[channel])
+                if rx_gains[channel] is None:
+                    self.set_rx_gain(searches[channel].good_gain, channel)
+                    if not searches[channel].converged:
+                        print(
+                            "current frequency {} can not be tuned to target amplitude on rx: {}, "
+                            "rx_gain has to stay within 0 -- 76dB".format(center_freq, channel)
                         )
-                    )
-                elif rx_gain_current < 0:
+                else:
                     print(
-                        "current frequency {} can not be tuned to target amplitude, rx_gain can not be less than 0dB".format(
-                            center_freq
+                        "trying rx: {} gain {} for frequency {} GHz".format(
+                            channel, rx_gains[channel], center_freq / 1e9
                         )
                     )
-                    break
-
-            # update the rx_buffer for next loop
-            self.recv_and_save_data(self.rx_buffer, self.num_rx_samps)  # receive data
-            estimated_amp = MyB210.estimate_amp(self.rx_buffer[channel])  # get estimated_amp of the channel
-
 
-        # when it is outside the loop, the amp should be within the range
-        good_rx_gain = self.usrp.get_rx_gain(channel)
+        good_rx_gains = [searches[0].good_gain, searches[1].good_gain]
+        num_captures = self.num_captures - first_capture
+        self.calibration_captures[center_freq] = self.calibration_captures.get(center_freq, 0) + num_captures
         print(
-            "current frequency is {}, the good rx:{} gain is rx_gain = {}".format(
-                center_freq, channel, good_rx_gain
+            "current frequency is {}, the good rx gains are rx_gains = {} ({} captures)".format(
+                center_freq, good_rx_gains, num_captures
             )
         )
 
-        return good_rx_gain
+        return good_rx_gains
 
-    def get_gains_for_all_freqs(self, center_freqs, txA_gain, txB_gain, target_rxA_amp, target_rxB_amp, amp_tolerence):
+    def get_gains_for_all_freqs(self, center_freqs, txA_gain, txB_gain, target_rxA_amp, target_rxB_amp, amp_tolerence,
+                                joint=True):
         """
         This method get good gains for all freqs
         Then, set the self.gain_table_updated_flag to True
@@ -315,47 +655,232 @@ class MyB210():
         :param target_rxA_amp: 0 to 1
         :param target_rxB_amp: 0 to 1
         :param amp_tolerence: a small positive number, like 0.2, 0.3
+        :param joint: True tunes each center freq once and calibrates rxA and rxB from the same captures;
+                      False calibrates one channel after the other
         :return: stores the good gains in the gain table
         """
 
+        self.calibration_captures = {}
+        self.gain_table = GainTable(attrs={
+            "tx_gains": [txA_gain, txB_gain],
+            "target_rx_amps": [target_rxA_amp, target_rxB_amp],
+            "amp_tolerence": amp_tolerence,
+            "samp_rate": self.samp_rate,
+            "master_clock_rate": self.usrp.get_master_clock_rate(),
+            "tx_bandwidths": [self.usrp.get_tx_bandwidth(0), self.usrp.get_tx_bandwidth(1)],
+            "rx_bandwidths": [self.usrp.get_rx_bandwidth(0), self.usrp.get_rx_bandwidth(1)],
+        })
         for f in center_freqs:
-            # get the good rx gain for rxA
-            good_rxA_gain = self._get_gain_for_one_channel_one_center_freq(0, f, txA_gain, target_rxA_amp, amp_tolerence)
-            good_rxB_gain = self._get_gain_for_one_channel_one_center_freq(1, f, txB_gain, target_rxB_amp, amp_tolerence)
+            if joint:
+                good_rxA_gain, good_rxB_gain = self._get_gains_for_both_channels_one_center_freq(
+                    f, [txA_gain, txB_gain], [target_rxA_amp, target_rxB_amp], amp_tolerence
+                )
+            else:
+                # get the good rx gain for rxA
+                good_rxA_gain = self._get_gain_for_one_channel_one_center_freq(0, f, txA_gain, target_rxA_amp, amp_tolerence)
+                good_rxB_gain = self._get_gain_for_one_channel_one_center_freq(1, f, txB_gain, target_rxB_amp, amp_tolerence)
 
             # store the gain table
             self.gain_table[f] = [good_rxA_gain, good_rxB_gain]
 
+        num_captures = sum(self.calibration_captures.values())
+        print("gain table uses {} captures for {} frequencies".format(num_captures, len(center_freqs)))
         self.gain_table_updated_flag = True
 
+    def recalibrate_gain_table(self, center_freqs=None, amp_tolerence=None):
+        """
+        This method verifies self.gain_table and patches only the freqs that drifted, instead of calibrating from
+        rx gain 0 at every freq like self.get_gains_for_all_freqs().
+        Each freq is verified with one capture at its stored rx gains. Only a channel that fails the verification
+        is searched again, starting at its stored rx gain shifted by the drift found at the previous (neighbouring)
+        freq; a freq that passes keeps its stored gains and resets the drift.
+        Load a saved table with self.load_gain_table() first to re-calibrate it.
+        The tx gains and target amplitudes are the ones stored in self.gain_table.attrs.
+
+        :param center_freqs: the freqs to verify; None verifies every freq of the table;
+                             freqs that are not in the table start from the gains of the nearest freq
+        :param amp_tolerence: None uses the tolerance the table was calibrated with
+        :return: the list of the center_freqs whose rx gains were patched
+        """
+        if not self.gain_table_updated_flag:
+            raise Exception('Gain table is not updated')
+        # suppose the transmitter is turned on through self.thread_send_data()
+        if not self.transmit_flag:
+            raise Exception('B210 is not transmitting')
+
+        attrs = self.gain_table.attrs
+        if "tx_gains" not in attrs or "target_rx_amps" not in attrs:
+            raise Exception('gain table has no tx_gains / target_rx_amps, run self.get_gains_for_all_freqs() instead')
+        if amp_tolerence is None:
+            amp_tolerence = attrs["amp_tolerence"]
+        if center_freqs is None:
+            center_freqs = self.gain_table.center_freqs
+        center_freqs = np.sort(np.asarray(center_freqs, dtype=np.float64))
+        stored_gains = self.gain_table.lookup(center_freqs)
+        tx_gains = attrs["tx_gains"]
+        target_rx_amps = np.asarray(attrs["target_rx_amps"], dtype=np.float64)
+
+        self.calibration_captures = {}
+        patched_freqs = []
+        drift = np.zeros(2)  # the gain change found at the previous freq
+        for f, stored in zip(center_freqs, stored_gains):
+            # 1. verify the stored gains with one capture
+            self.mark_step(f)
+            self.tune_center_freq(f)
+            self.set_tx_gain(tx_gains[0], 0)
+            self.set_tx_gain(tx_gains[1], 1)
+            self.set_rx_gain(stored[0], 0)
+            self.set_rx_gain(stored[1], 1)
+            amps, snrs, num_samps = self.measure_rx_amps(0.25 * amp_tolerence / np.max(target_rx_amps))
+            self.calibration_captures[f] = 1
+            failed = np.abs(amps - target_rx_amps) > amp_tolerence
+            if not np.any(failed):
+                drift = np.zeros(2)
+                if f not in self.gain_table:
+                    self.gain_table[f] = stored
+                    patched_freqs.append(f)
+                continue
+
+            # 2. search again where the stored gains failed, warm started by the drift of the neighbour
+            start_gains = np.clip(stored + np.where(failed, drift, 0), 0, 76)
+            good_rx_gains = self._get_gains_for_both_channels_one_center_freq(
+                f, tx_gains, target_rx_amps, amp_tolerence, start_gains=start_gains
+            )
+            drift = np.array(good_rx_gains) - stored
+            self.gain_table[f] = good_rx_gains
+            patched_freqs.append(f)
+        self.mark_step(None)
+
+        num_captures = sum(self.calibration_captures.values())
+        print("gain table re-calibration patches {} of {} frequencies with {} captures".format(
+            len(patched_freqs), len(center_freqs), num_captures))
+        return patched_freqs
+
     def save_gain_table(self, file_name):
         """
         file_name: string, the file name
-        This method save the current self.gain_table into a file in utils for later use
-        The file will be overwritten if it exists
+        This method save the current self.gain_table into a .npz file in utils for later use,
+        and self.calibration (if any) into a {file_name}_calibration.npz file next to it
+        The files will be overwritten if they exist
         """
-        np.save('./utils/gain_tables/{}.npy'.format(file_name), self.gain_table)
-        print('gain table is saved into ./utils/gain_tables/{}.npy'.format(file_name))
+        os.makedirs('./utils/gain_tables', exist_ok=True)
+        self.gain_table.save('./utils/gain_tables/{}.npz'.format(file_name))
+        print('gain table is saved into ./utils/gain_tables/{}.npz'.format(file_name))
+        if self.calibration is not None:
+            self.calibration.save('./utils/gain_tables/{}_calibration.npz'.format(file_name))
+            print('calibration is saved into ./utils/gain_tables/{}_calibration.npz'.format(file_name))
 
     def load_gain_table(self, file_name):
         """
         file_name: string, the gain table name without postfix
 
-        load a gain table into self.gain_table for use
+        load a gain table into self.gain_table for use, and its calibration into self.calibration if it has one;
+        a gain table saved in the old pickled dictionary format (.npy) is still read and converted
         :return:
         """
-        self.gain_table = np.load('./utils/gain_tables/{}.npy'.format(file_name),allow_pickle='TRUE').item()
-        if type(self.gain_table) is not dict:
-            raise Exception('gain table should be a python dictionary object')
+        file_path = './utils/gain_tables/{}.npz'.format(file_name)
+        if os.path.exists(file_path):
+            self.gain_table = GainTable.load(file_path)
+        else:
+            file_path = './utils/gain_tables/{}.npy'.format(file_name)
+            gain_dict = np.load(file_path, allow_pickle=True).item()
+            if type(gain_dict) is not dict:
+                raise Exception('gain table should be a python dictionary object')
+            self.gain_table = GainTable.from_dict(gain_dict)
 
         self.gain_table_updated_flag = True
-        print('successfully loading ./utils/gain_tables/{}.npy into self.gain_table'.format(file_name))
+        print('successfully loading {} into self.gain_table'.format(file_path))
+
+        calibration_path = './utils/gain_tables/{}_calibration.npz'.format(file_name)
+        self.calibration = ComplexCalibration.load(calibration_path) if os.path.exists(calibration_path) else None
+        if self.calibration is not None:
+            print('successfully loading {} into self.calibration'.format(calibration_path))
 
     ###############################################################################################
     #  The following sections are for performing the SFCW radar function: an application program
     ################################################################################################
 
-    def sfcw_seep(self, tx_data, center_freqs, txA_gain, txB_gain):
+    def plan_sweep(self, center_freqs):
+        """
+        plan the order of a sweep over center_freqs from where the LO's are now, with a RetuneCostModel fitted to
+        self.retune_log (the default model until a few retunes are logged), see utils/freq_plan.py
+
+        :return: order, predicted_seconds
+                order: the indices into center_freqs in the order to visit them
+                predicted_seconds: the predicted total LO lock time of the sweep
+        """
+        return plan_sweep(center_freqs, self.current_center_freq(), RetuneCostModel.fit(self.retune_log))
+
+    def _sweep_order(self, center_freqs, optimize_order):
+        """
+        :return: center_freqs, order, predicted_settle_seconds
+                center_freqs: the center_freqs sorted ascending, the order the sweep results are stored in
+                order: the order the steps are visited in; ascending, or self.plan_sweep() if optimize_order
+                predicted_settle_seconds: the predicted total LO lock time of visiting the steps in order
+        """
+        center_freqs = np.sort(np.asarray(center_freqs, dtype=np.float64))
+        if optimize_order:
+            order, predicted = self.plan_sweep(center_freqs)
+        else:
+            order = np.arange(len(center_freqs))
+            predicted = RetuneCostModel.fit(self.retune_log).path_cost(center_freqs, self.current_center_freq())
+        return center_freqs, order, predicted
+
+    def _conjugate(self, rx_data):
+        # a method of its own, so that self.enable_metrics() can time it
+        conjugate_in_place(rx_data)
+
+    def _report_sweep(self, name, num_steps, seconds, predicted_seconds):
+        self.sweep_stats = {
+            "num_steps": num_steps,
+            "seconds": seconds,
+            "steps_per_second": num_steps / seconds,
+            "predicted_seconds": float(predicted_seconds),
+        }
+        print("{}: {} steps in {:.3f} seconds (predicted {:.3f}), {:.1f} steps per second".format(
+            name, num_steps, seconds, predicted_seconds, num_steps / seconds))
+
+    def sweep_buffer(self, center_freqs, out=None):
+        """
+        :param center_freqs: the center_freqs of the sweep
+        :param out: None, or a caller supplied buffer to check
+        :return: a len(center_freqs) by 2 by self.num_rx_samps numpy array of self.host_dtype that a sweep
+                 receives into; a new one if out is None. Pass it back to the next sweep to reuse it.
+        """
+        shape = (len(center_freqs), 2, self.num_rx_samps)
+        if out is None:
+            return np.empty(shape, dtype=self.host_dtype)
+        if out.shape != shape or out.dtype != self.host_dtype or not out.flags.c_contiguous:
+            raise Exception('sweep buffer should be a C-contiguous {} array of shape {}'.format(self.host_dtype, shape))
+        return out
+
+    def apply_calibration(self, data, center_freqs, out=None):
+        """
+        correct a sweep with self.calibration and the rx gains self.gain_table gives for center_freqs,
+        see ComplexCalibration.apply()
+
+        :param data: the tone responses or the conjugated rx data of a sweep over center_freqs
+        :param center_freqs: the center freqs of data, sorted ascending like the sweeps return them
+        :param out: None returns a corrected copy; data corrects it in place
+        only the amplitudes and the channel ratio are corrected, the common phase of every capture stays random
+        :return: the corrected data
+        """
+        if self.calibration is None:
+            raise Exception('no calibration, see self.calibrate_response()')
+        rx_gains = self.gain_table.lookup(center_freqs, self.gain_interpolation)
+        return self.calibration.apply(data, center_freqs, rx_gains, out)
+
+    def _check_calibrated(self, conjugate=True, writer=None):
+        """
+        raise before a sweep with calibrated=True that could not be corrected in place
+        """
+        if self.calibration is None:
+            raise Exception('no calibration, see self.calibrate_response()')
+        if not conjugate or writer is not None or self.host_dtype != np.complex64:
+            raise Exception('calibrated sweeps need conjugate=True, no writer and cpu_format="fc32"')
+
+    def sfcw_seep(self, tx_data, center_freqs, txA_gain, txB_gain, out=None, conjugate=True, writer=None,
+                  optimize_order=False, keep_tx=False, calibrated=False):
         """
         This method performs the sfcw sweep at one survey location, using the txA_gain and txB_gain as the
         transmit gains and self.gain_table as the rx gains.
@@ -364,48 +889,307 @@ class MyB210():
         :param center_freqs: the center_freqs at which you want to sweep
         :param txA_gain: channel A transmit gain
         :param txB_gain: channel B transmit gain
+        :param out: the buffer to receive into, see self.sweep_buffer(); None allocates a new one
+        :param conjugate: True takes the complex conjugate of the rx data in place; False leaves the raw rx data,
+                          for processing that folds the conjugate in later
+        :param writer: a sweep writer from utils/sweep_writer.py; every step is received into the writer and
+                       committed to disk with its rx gains right away, and out is not used
+        :param optimize_order: True visits the freqs in the order of self.plan_sweep() (e.g. descending when the
+                               LO's are at the top of the band), False visits them ascending;
+                               the results are in ascending freq order either way
+        :param keep_tx: True leaves the transmitter on after the sweep, for the next sweep with the same tx_data;
+                        stop it with self.stop_transmit()
+        :param calibrated: True corrects the rx data in place with self.calibration after the sweep,
+                           see self.apply_calibration()
         :return: sfcw_rx_signal, center_freqs
             the received baseband signals obtained by using the txA_gain and txB_gain as the
             transmit gains and self.gain_table as the rx gains at each center_freq.
 
             the data structure looks like
-            sfcw_rx_signal = a list of
-                <a 2 by self.num_rx_samps numpy array of complex64 numbers; with the first row for rxA I/Q data and the second row for rxB I/Q data  >
-                           = [rx_data at the first freq, rx_data at the second freq, ... ]
+            sfcw_rx_signal = a len(center_freqs) by 2 by self.num_rx_samps numpy array of self.host_dtype;
+                sfcw_rx_signal[i] is the rx data at the i-th freq, with the first row for rxA I/Q data and
+                the second row for rxB I/Q data
 
-            center_freqs = [first_freq, second_freq, ...]
+            center_freqs = [first_freq, second_freq, ...], sorted ascending
+
+            with a writer, sfcw_rx_signal is writer.data
+            the predicted and achieved sweep times are printed and stored in self.sweep_stats
 
         """
         if not self.gain_table_updated_flag:
             raise Exception('Gain table is not updated')
+        if calibrated:
+            self._check_calibrated(conjugate, writer)
 
         # prepare transmit data
 
         # set the tx gains
-        self.usrp.set_tx_gain(txA_gain, 0)
-        self.usrp.set_tx_gain(txB_gain, 1)
+        self.set_tx_gain(txA_gain, 0)
+        self.set_tx_gain(txB_gain, 1)
         # turn on the thread_send_data
         self.thread_send_data(tx_data)
 
         # loop through the center_freqs
         #      1. set rx gains
         #      2. tune center freq
-        #      3. receive data and save data
-
-        sfcw_rx_signal = []
-        for f in center_freqs:
+        #      3. receive data straight into the sweep buffer
+
+        center_freqs, order, predicted = self._sweep_order(center_freqs, optimize_order)
+        predicted += len(center_freqs) * (MyB210.RecvLeadTime + self.num_rx_samps / self.samp_rate)
+        if writer is not None and not np.array_equal(writer.center_freqs, center_freqs):
+            raise Exception('the writer should be created with the center_freqs sorted ascending')
+        sfcw_rx_signal = self.sweep_buffer(center_freqs, out) if writer is None else writer.data
+        rx_gains = self.gain_table.lookup(center_freqs, self.gain_interpolation)
+        start_time = time.perf_counter()
+        for i in order:
+            f = center_freqs[i]
+            self.mark_step(f)
+            rx_data = sfcw_rx_signal[i] if writer is None else writer.step_buffer(i)
             # 1. set rx gains
-            self.usrp.set_rx_gain(self.gain_table[f][0], 0)  # set rxA gain
-            self.usrp.set_rx_gain(self.gain_table[f][1], 1)   # set rxB gain
+            self.set_rx_gain(rx_gains[i, 0], 0)  # set rxA gain
+            self.set_rx_gain(rx_gains[i, 1], 1)   # set rxB gain
             # 2. tune center freq
             self.tune_center_freq(f)
             # 3. receive data
-            self.recv_and_save_data(self.rx_buffer, self.num_rx_samps)
-            # 4. store rx data into sfcw_rx_signal
-            rx_buffer_copy = np.copy(self.rx_buffer)  # need to copy the buffer, otherwise, all the appended signals are the same
-            sfcw_rx_signal.append(np.conjugate(rx_buffer_copy))  # take conjugate to satisfy the complex signal model using I/Q modulator and demodulator
+            self.recv_and_save_data(rx_data, self.num_rx_samps)
+            if conjugate:
+                # take conjugate to satisfy the complex signal model using I/Q modulator and demodulator
+                self._conjugate(rx_data)
+            if writer is not None:
+                writer.write(i, rx_gains[i])
+
+        elapsed = time.perf_counter() - start_time
+        self.mark_step(None)
+        if not keep_tx:
+            self.stop_transmit()  # stop the transmitter
+        self._report_sweep("sweep", len(center_freqs), elapsed, predicted)
+        if calibrated:
+            self.apply_calibration(sfcw_rx_signal, center_freqs, out=sfcw_rx_signal)
+
+        return sfcw_rx_signal, center_freqs
+
+    def sfcw_seep_response(self, tx_data, center_freqs, txA_gain, txB_gain, tone_freq=1000, keep_raw=False, out=None,
+                           rel_error=None, optimize_order=False, calibrated=False):
+        """
+        This method performs the sfcw sweep of self.sfcw_seep() and demodulates the tx tone of every capture,
+        so the sweep ends with the complex channel response at each center_freq instead of the raw samples.
+
+        :param tx_data : the tx baseband signal, a tone of tone_freq, see utils/signals.complex_sinusoid()
+        :param center_freqs: the center_freqs at which you want to sweep
+        :param txA_gain: channel A transmit gain
+        :param txB_gain: channel B transmit gain
+        :param tone_freq: the frequency of the tx tone in Hz
+        :param keep_raw: True also returns the raw samples (the sfcw_rx_signal of self.sfcw_seep())
+        :param out: the buffer for the raw samples when keep_raw is True, see self.sweep_buffer()
+        :param rel_error: None captures self.num_rx_samps samples per step; a number captures only as many samples as
+                          that relative amplitude error needs, see self.measure_rx_amps() (not with keep_raw)
+        :param optimize_order: see self.sfcw_seep()
+        :param calibrated: True corrects sfcw_response with self.calibration (not the raw samples),
+                           see self.apply_calibration()
+        :return: sfcw_response, center_freqs  or  sfcw_response, center_freqs, sfcw_rx_signal if keep_raw
+            sfcw_response = a len(center_freqs) by 2 numpy array of complex numbers; the complex amplitude of the
+                tone in rxA (first column) and rxB (second column) at each center_freq
+        """
+        if calibrated and self.calibration is None:
+            raise Exception('no calibration, see self.calibrate_response()')
+        if keep_raw:
+            sfcw_rx_signal, center_freqs = self.sfcw_seep(tx_data, center_freqs, txA_gain, txB_gain, out=out,
+                                                          optimize_order=optimize_order)
+            sfcw_response = tone_response(sfcw_rx_signal, self.samp_rate, tone_freq)
+            if calibrated:
+                self.apply_calibration(sfcw_response, center_freqs, out=sfcw_response)
+            return sfcw_response, center_freqs, sfcw_rx_signal
+
+        if not self.gain_table_updated_flag:
+            raise Exception('Gain table is not updated')
+
+        # set the tx gains
+        self.set_tx_gain(txA_gain, 0)
+        self.set_tx_gain(txB_gain, 1)
+        # turn on the thread_send_data
+        self.thread_send_data(tx_data)
 
+        center_freqs, order, predicted = self._sweep_order(center_freqs, optimize_order)
+        predicted += len(center_freqs) * (MyB210.RecvLeadTime + self.num_rx_samps / self.samp_rate)
+        ref = reference_tone(self.num_rx_samps, self.samp_rate, tone_freq)
+        sfcw_response = np.empty((len(center_freqs), 2), dtype=np.complex128)
+        rx_gains = self.gain_table.lookup(center_freqs, self.gain_interpolation)
+        start_time = time.perf_counter()
+        for i in order:
+            f = center_freqs[i]
+            self.mark_step(f)
+            # 1. set rx gains
+            self.set_rx_gain(rx_gains[i, 0], 0)  # set rxA gain
+            self.set_rx_gain(rx_gains[i, 1], 1)   # set rxB gain
+            # 2. tune center freq
+            self.tune_center_freq(f)
+            # 3. receive data
+            if rel_error is None:
+                self.recv_and_save_data(self.rx_buffer, self.num_rx_samps)
+                rx_buffer = self.rx_buffer
+            else:
+                amps, snrs, num_samps = self.measure_rx_amps(rel_error, tone_freq=tone_freq)
+                rx_buffer = self.rx_buffer_view(num_samps)
+            # 4. demodulate, with the conjugate of self.sfcw_seep() folded in
+            sfcw_response[i] = tone_response(rx_buffer, self.samp_rate, conjugate=True, ref=ref[:rx_buffer.shape[-1]])
+
+        elapsed = time.perf_counter() - start_time
+        self.mark_step(None)
         self.stop_transmit()  # stop the transmitter
+        self._report_sweep("sweep", len(center_freqs), elapsed, predicted)
+        if calibrated:
+            self.apply_calibration(sfcw_response, center_freqs, out=sfcw_response)
+
+        return sfcw_response, center_freqs
+
+    def sfcw_seep_timed(self, tx_data, center_freqs, txA_gain, txB_gain, settle_time=None, guard_time=1e-3,
+                        lead_time=0.05, lookahead=None, out=None, conjugate=True, writer=None, optimize_order=False,
+                        keep_tx=False, calibrated=False):
+        """
+        This method performs the same sfcw sweep as self.sfcw_seep(), but pipelines the frequency steps with timed
+        commands: the rx gains, the LO frequencies and the rx stream command of every step are scheduled on the
+        device clock ahead of time (set_command_time + a timed num_done stream command), so the host round trips
+        for the next steps overlap with the LO settling and the capture of the current step.
+
+        every step takes settle time + capture time + guard_time; its capture starts once the settle time is over.
+        All the times are on the device clock. A step is never scheduled less than lead_time ahead of the device
+        time: when the host falls behind (a slow host, or a simulated device that runs faster than real time), the
+        step and all the steps after it slip by the delay instead of failing as late, see self.sweep_stats.
+
+        :param tx_data : the tx baseband signal
+        :param center_freqs: the center_freqs at which you want to sweep
+        :param txA_gain: channel A transmit gain
+        :param txB_gain: channel B transmit gain
+        :param settle_time: the time reserved for the LO's to lock after each retune, in seconds;
+                            None uses the settle times learned by self.tune_center_freq() per band (2 ms if unknown)
+        :param guard_time: extra time between the end of a capture and the next retune, in seconds
+        :param lead_time: the least time between issuing the commands of a step and the start of the step,
+                          in device seconds
+        :param lookahead: how many steps are scheduled on the device ahead of the step being received; None
+                          schedules as many as cover lead_time, so the schedule does not slip while the host keeps up
+        :param out: the buffer to receive into, see self.sweep_buffer(); None allocates a new one
+        :param conjugate: True takes the complex conjugate of the rx data in place
+        :param writer: a sweep writer from utils/sweep_writer.py, see self.sfcw_seep()
+        :param optimize_order: see self.sfcw_seep()
+        :param keep_tx: see self.sfcw_seep()
+        :param calibrated: see self.sfcw_seep()
+        :return: sfcw_rx_signal, center_freqs
+            the same data structure as self.sfcw_seep()
+            the predicted (scheduled) and achieved sweep times are printed and stored in self.sweep_stats, with
+            the total slip of the schedule in "slip_seconds"
+        """
+        if not self.gain_table_updated_flag:
+            raise Exception('Gain table is not updated')
+        if calibrated:
+            self._check_calibrated(conjugate, writer)
+
+        # set the tx gains
+        self.set_tx_gain(txA_gain, 0)
+        self.set_tx_gain(txB_gain, 1)
+        # turn on the thread_send_data
+        self.thread_send_data(tx_data)
+
+        # step k of the schedule receives center_freqs[order[k]]
+        center_freqs, order, _ = self._sweep_order(center_freqs, optimize_order)
+        capture_time = self.num_rx_samps / self.samp_rate
+        if settle_time is None:
+            step_settle_times = [self.get_settle_time(center_freqs[i]) for i in order]
+        else:
+            step_settle_times = [settle_time] * len(center_freqs)
+        step_periods = np.array(step_settle_times) + capture_time + guard_time
+        step_offsets = np.concatenate(([0.0], np.cumsum(step_periods)[:-1]))
+        if lookahead is None:
+            lookahead = int(np.ceil(lead_time / np.min(step_periods))) + 1 if len(center_freqs) > 0 else 1
+        predicted = lead_time + np.sum(step_periods)
+        rx_gains = self.gain_table.lookup(center_freqs, self.gain_interpolation)
+        start_time = time.perf_counter()
+        t0 = self.usrp.get_time_now().get_real_secs() + lead_time
+        slip = 0.0  # how far the steps have slipped behind the schedule, in device seconds
+
+        def schedule_step(k):
+            nonlocal slip
+            i = order[k]
+            f = center_freqs[i]
+            step_secs = t0 + step_offsets[k] + slip
+            earliest = self.usrp.get_time_now().get_real_secs() + lead_time
+            if step_secs < earliest:
+                slip += earliest - step_secs
+                step_secs = earliest
+            step_time = lib.types.time_spec(step_secs)
+            self.mark_step(f)
+            # 1. set rx gains and 2. tune center freq, both at the start of the step
+            self.usrp.set_command_time(step_time)
+            self.set_rx_gain(rx_gains[i, 0], 0)  # set rxA gain
+            self.set_rx_gain(rx_gains[i, 1], 1)  # set rxB gain
+            self.set_freqs(f)
+            self.usrp.clear_command_time()
+            # 3. receive data once the LO's have settled
+            stream_cmd = lib.types.stream_cmd(lib.types.stream_mode.num_done)
+            stream_cmd.num_samps = self.num_rx_samps
+            stream_cmd.stream_now = False
+            stream_cmd.time_spec = step_time + lib.types.time_spec(step_settle_times[k])
+            self.rx_streamer.issue_stream_cmd(stream_cmd)
+
+        for k in range(min(lookahead, len(center_freqs))):
+            schedule_step(k)
+
+        sfcw_rx_signal = self.sweep_buffer(center_freqs, out) if writer is None else writer.data
+        rx_md = lib.types.rx_metadata()
+        recv_timeout = lead_time + (lookahead + 1) * np.max(step_periods) + 0.1
+        try:
+            for k, i in enumerate(order):
+                rx_data = sfcw_rx_signal[i] if writer is None else writer.step_buffer(i)
+                self.mark_step(center_freqs[i])
+                self.rx_streamer.recv(rx_data, rx_md, recv_timeout)
+                if rx_md.error_code != lib.types.rx_metadata_error_code.none:
+                    raise Exception('timed sweep failed at {} Hz: rx error {}'.format(center_freqs[i],
+                                                                                       rx_md.error_code))
+                # keep the device busy with the next steps while this one is stored
+                if k + lookahead < len(center_freqs):
+                    schedule_step(k + lookahead)
+                    self.mark_step(center_freqs[i])
+                if conjugate:
+                    self._conjugate(rx_data)
+                if writer is not None:
+                    writer.write(i, rx_gains[i])
+        except Exception:
+            # the steps scheduled ahead are still queued on the device
+            self.mark_step(None)
+            self.flush_rx()
+            if self.transmit_flag:
+                self.stop_transmit()
+            raise
+
+        elapsed = time.perf_counter() - start_time
+        self.mark_step(None)
+        if not keep_tx:
+            self.stop_transmit()  # stop the transmitter
+        self._report_sweep("timed sweep", len(center_freqs), elapsed, predicted)
+        self.sweep_stats["slip_seconds"] = float(slip)
+        if calibrated:
+            self.apply_calibration(sfcw_rx_signal, center_freqs, out=sfcw_rx_signal)
 
         return sfcw_rx_signal, center_freqs
 
+    def calibrate_response(self, tx_data, center_freqs, txA_gain, txB_gain, expected=1.0, reference_channel=0,
+                           tone_freq=1000):
+        """
+        sweep a reference (a through connection, or a target at a known range) with self.sfcw_seep_response() and
+        build self.calibration from it, see utils/calibration.py; self.save_gain_table() saves it with the gain table
+
+        :param tx_data: the tx baseband signal, a tone of tone_freq
+        :param center_freqs: the center_freqs to calibrate; the calibrated sweeps interpolate between them
+        :param txA_gain: channel A transmit gain
+        :param txB_gain: channel B transmit gain
+        :param expected: the known response of the reference, 1 for a through connection, or see
+                         utils/calibration.known_target_response()
+        :param reference_channel: see utils/calibration.build_calibration()
+        :param tone_freq: the frequency of the tx tone in Hz
+        :return: self.calibration
+        """
+        responses, center_freqs = self.sfcw_seep_response(tx_data, center_freqs, txA_gain, txB_gain, tone_freq)
+        rx_gains = self.gain_table.lookup(center_freqs, self.gain_interpolation)
+        attrs = {"txA_gain": txA_gain, "txB_gain": txB_gain, "samp_rate": self.samp_rate, "tone_freq": tone_freq}
+        self.calibration = build_calibration(responses, center_freqs, rx_gains, expected, reference_channel, attrs)
+        print("complex calibration of {} frequencies".format(len(center_freqs)))
+        return self.calibration
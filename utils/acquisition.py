@@ -0,0 +1,198 @@
+"""
+A producer/consumer acquisition pipeline for sfcw sweeps
+
+In MyB210.sfcw_seep() the processing of a step runs on the sweep thread between captures, so it adds to the sweep
+time. Here an acquisition thread only tunes and receives: it takes a free buffer from a pool of pre-allocated
+buffers, receives the step into it and puts it on a bounded queue. Processing workers take the buffers off the
+queue, run process() on them and put them back into the pool, so processing overlaps the next captures and no
+sample is copied.
+
+    pipeline = AcquisitionPipeline(B210, process, num_buffers=4, queue_depth=2)
+    results, center_freqs = pipeline.sweep(tx_data, center_freqs, txA_gain, txB_gain)
+    pipeline.stats()
+
+When processing falls behind, the acquisition thread stalls until a buffer or a queue slot is free (counted in
+stats()["stalls"]); with drop_when_full=True it drops the capture instead (stats()["dropped"]) and its result is None.
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+from utils.demod import tone_response
+
+
+class AcquisitionPipeline():
+    """
+    see the module docstring
+    """
+
+    def __init__(self, B210, process=None, num_buffers=4, queue_depth=2, num_workers=1, drop_when_full=False):
+        """
+        :param B210: a MyB210 object with a gain table
+        :param process: a function process(i, center_freq, rx_data) -> result, run by the workers; rx_data is the
+                        raw (not conjugated) 2 by num_rx_samps rx data of step i, and its buffer is reused once
+                        process() returns, so the result must not be a view of it.
+                        None takes the complex tone response of both channels, see utils/demod.tone_response()
+        :param num_buffers: the number of pre-allocated rx buffers
+        :param queue_depth: the number of received buffers that can wait for a worker
+        :param num_workers: the number of processing threads
+        :param drop_when_full: True drops a capture when the queue is full, False waits for a free slot
+        """
+        self.B210 = B210
+        self.process = self._tone_response if process is None else process
+        self.num_workers = num_workers
+        self.drop_when_full = drop_when_full
+
+        self._free_buffers = queue.Queue()
+        for _ in range(num_buffers):
+            self._free_buffers.put(np.empty((2, B210.num_rx_samps), dtype=B210.host_dtype))
+        self._ready = queue.Queue(maxsize=queue_depth)
+        self._lock = threading.Lock()  # for the counters of the workers
+        self._reset_stats()
+
+    def _tone_response(self, i, center_freq, rx_data):
+        return tone_response(rx_data, self.B210.samp_rate, self.B210.ToneFreq, conjugate=True)
+
+    def _reset_stats(self):
+        self.num_captures = 0
+        self.num_processed = 0
+        self.num_dropped = 0
+        self.num_stalls = 0
+        self.stall_seconds = 0.0
+        self.max_queue_depth = 0
+        self.seconds = 0.0
+        self._errors = []
+
+    def stats(self):
+        """
+        :return: a dictionary with
+            "captures", "processed", "dropped": the counts of the last sweep
+            "stalls", "stall_seconds": how often and how long the acquisition thread waited for a buffer or a slot
+            "max_queue_depth": the most buffers that waited for a worker at once
+            "seconds": the time of the last sweep
+        """
+        return {
+            "captures": self.num_captures,
+            "processed": self.num_processed,
+            "dropped": self.num_dropped,
+            "stalls": self.num_stalls,
+            "stall_seconds": self.stall_seconds,
+            "max_queue_depth": self.max_queue_depth,
+            "seconds": self.seconds,
+        }
+
+    def _get_blocking(self, q):
+        try:
+            return q.get_nowait()
+        except queue.Empty:
+            pass
+        self.num_stalls += 1
+        start_time = time.perf_counter()
+        item = q.get()
+        self.stall_seconds += time.perf_counter() - start_time
+        return item
+
+    def _put_ready(self, item):
+        """
+        :return: False if the item was dropped
+        """
+        try:
+            self._ready.put_nowait(item)
+            return True
+        except queue.Full:
+            if self.drop_when_full:
+                return False
+        self.num_stalls += 1
+        start_time = time.perf_counter()
+        self._ready.put(item)
+        self.stall_seconds += time.perf_counter() - start_time
+        return True
+
+    def _acquire(self, center_freqs, rx_gains, stop_event):
+        B210 = self.B210
+        try:
+            for i, f in enumerate(center_freqs):
+                if stop_event.is_set():
+                    break
+                rx_data = self._get_blocking(self._free_buffers)
+                B210.mark_step(f)
+                B210.set_rx_gain(rx_gains[i, 0], 0)  # set rxA gain
+                B210.set_rx_gain(rx_gains[i, 1], 1)  # set rxB gain
+                B210.tune_center_freq(f)
+                B210.recv_and_save_data(rx_data, B210.num_rx_samps)
+                self.num_captures += 1
+                if not self._put_ready((i, f, rx_data)):
+                    self.num_dropped += 1
+                    self._free_buffers.put(rx_data)
+                self.max_queue_depth = max(self.max_queue_depth, self._ready.qsize())
+        except Exception as e:
+            self._errors.append(e)
+        finally:
+            B210.mark_step(None)
+            for _ in range(self.num_workers):
+                self._ready.put(None)
+
+    def _work(self, results, stop_event):
+        while True:
+            item = self._ready.get()
+            if item is None:
+                return
+            i, f, rx_data = item
+            try:
+                if not stop_event.is_set():
+                    results[i] = self.process(i, f, rx_data)
+                    with self._lock:
+                        self.num_processed += 1
+            except Exception as e:
+                self._errors.append(e)
+                stop_event.set()
+            finally:
+                self._free_buffers.put(rx_data)
+
+    def sweep(self, tx_data, center_freqs, txA_gain, txB_gain, keep_tx=False):
+        """
+        the sfcw sweep of MyB210.sfcw_seep() through the pipeline
+
+        :param tx_data: the tx baseband signal
+        :param center_freqs: the center_freqs at which you want to sweep
+        :param txA_gain: channel A transmit gain
+        :param txB_gain: channel B transmit gain
+        :param keep_tx: True leaves the transmitter on after the sweep
+        :return: results, center_freqs
+            results[i] is the result of process() for center_freqs[i], None if the capture was dropped;
+            center_freqs sorted ascending
+        """
+        B210 = self.B210
+        if not B210.gain_table_updated_flag:
+            raise Exception('Gain table is not updated')
+
+        center_freqs = np.sort(np.asarray(center_freqs, dtype=np.float64))
+        rx_gains = B210.gain_table.lookup(center_freqs, B210.gain_interpolation)
+        results = [None] * len(center_freqs)
+        self._reset_stats()
+
+        B210.set_tx_gain(txA_gain, 0)
+        B210.set_tx_gain(txB_gain, 1)
+        B210.thread_send_data(tx_data)
+
+        stop_event = threading.Event()
+        workers = [threading.Thread(target=self._work, args=(results, stop_event), daemon=True)
+                   for _ in range(self.num_workers)]
+        acquisition = threading.Thread(target=self._acquire, args=(center_freqs, rx_gains, stop_event), daemon=True)
+        start_time = time.perf_counter()
+        for thread in workers + [acquisition]:
+            thread.start()
+        for thread in [acquisition] + workers:
+            thread.join()
+        self.seconds = time.perf_counter() - start_time
+
+        if not keep_tx:
+            B210.stop_transmit()
+        if self._errors:
+            raise self._errors[0]
+
+        print("pipelined sweep: {} steps in {:.3f} seconds, {} dropped, {} stalls ({:.3f} seconds)".format(
+            len(center_freqs), self.seconds, self.num_dropped, self.num_stalls, self.stall_seconds))
+        return results, center_freqs
@@ -0,0 +1,190 @@
+"""
+The complex calibration: a per-freq, per-channel complex correction of the tx/rx chain
+
+    B210.calibrate_response(tx_data, center_freqs, txA_gain, txB_gain)         through connection (or known target)
+    B210.save_gain_table("my_table")                    also saves ./utils/gain_tables/my_table_calibration.npz
+    sfcw_rx_signal, center_freqs = B210.sfcw_seep(tx_data, center_freqs, txA_gain, txB_gain, calibrated=True)
+
+A reference sweep measures the tone response R[f, c] of channel c at freq f with the rx gains g_ref[f, c] of the gain
+table. With the known response E[f, c] of the reference (1 for a through connection, see known_target_response()
+for a target at a known range) the correction is
+
+    correction[f, c] = E[f, c] / (R[f, c] * 10 ** (-g_ref[f, c] / 20))
+
+so it removes the amplitude and phase of the chain at 0 dB rx gain. A later sweep with rx gains g[f, c] is corrected
+by the vector correction * 10 ** (-g / 20), which is computed once per gain table and cached, and applied to the
+responses (n_freqs by 2) or the raw rx data (n_freqs by 2 by num_rx_samps) in one broadcast multiply.
+
+The tone of every capture starts at a random phase that is the same in both channels, so only the ratio of the
+channels has a meaningful absolute phase: build_calibration() takes the phase of the reference channel (channel A by
+default) out of the reference sweep, and a corrected sweep has the right amplitudes and channel ratio, while the
+phase of each channel on its own is still random.
+
+The calibration can be measured on a coarser freq grid than the sweeps, like the gain table: the amplitude and the
+unwrapped phase of the correction are interpolated between the calibrated freqs (the grid has to be fine enough for
+the phase to unwrap, less than half a turn per step).
+"""
+import json
+
+import numpy as np
+
+from utils.sc16 import to_complex64
+
+SPEED_OF_LIGHT = 299792458.0
+
+
+def known_target_response(center_freqs, ranges):
+    """
+    :param center_freqs: the n_freqs center freqs
+    :param ranges: the one way range of the target in meters, for [channelA, channelB]
+    :return: the n_freqs by 2 response exp(-2j * pi * f * 2 * range / c) of a point target at ranges, the expected
+             response of build_calibration(); the conjugated rx data of MyB210.sfcw_seep() sees this phase, and
+             utils/imaging.range_profiles() puts its peak at the range
+    """
+    center_freqs = np.asarray(center_freqs, dtype=np.float64)[:, None]
+    delays = 2 * np.asarray(ranges, dtype=np.float64) / SPEED_OF_LIGHT
+    return np.exp(-2j * np.pi * center_freqs * delays)
+
+
+def build_calibration(reference_responses, center_freqs, rx_gains, expected=1.0, reference_channel=0,
+                      attrs=None):
+    """
+    :param reference_responses: the n_freqs by 2 tone responses of the reference sweep, see
+                                MyB210.sfcw_seep_response()
+    :param center_freqs: the n_freqs center freqs of the reference sweep
+    :param rx_gains: the n_freqs by 2 rx gains in dB the reference sweep was received with
+    :param expected: the known response of the reference, broadcastable to n_freqs by 2; 1 for a through connection
+    :param reference_channel: 0 / 1 removes the common random phase of every capture of the reference sweep by the
+                              phase of that channel; None keeps it, only for a reference sweep without random phase
+    :param attrs: a json serializable dictionary of the conditions of the reference sweep
+    :return: a ComplexCalibration
+    """
+    responses = np.asarray(reference_responses, dtype=np.complex128)
+    if reference_channel is not None:
+        phase = responses[:, reference_channel] / np.abs(responses[:, reference_channel])
+        responses = responses / phase[:, None]
+    if np.any(responses == 0):
+        raise Exception('the reference sweep has a zero response')
+    correction = np.asarray(expected) / (responses * 10 ** (-np.asarray(rx_gains, dtype=np.float64) / 20))
+    return ComplexCalibration(center_freqs, correction, attrs)
+
+
+class ComplexCalibration():
+    """
+        calibration.center_freqs : the sorted center freqs, a numpy array of length n
+        calibration.correction   : an n by 2 complex numpy array, the correction at 0 dB rx gain
+        calibration.attrs        : a dictionary of the conditions of the reference sweep
+
+    calibration.lookup(freqs) interpolates the correction for any freqs, see utils/gain_table.GainTable.lookup()
+    save() writes a .npz file of plain arrays (no pickle), load() reads it back, like utils/gain_table.GainTable
+    """
+
+    def __init__(self, center_freqs, correction, attrs=None):
+        """
+        :param center_freqs: the center freqs, in any order
+        :param correction: a len(center_freqs) by 2 array-like of complex corrections
+        :param attrs: a json serializable dictionary of the conditions of the reference sweep
+        """
+        center_freqs = np.asarray(center_freqs, dtype=np.float64)
+        correction = np.asarray(correction, dtype=np.complex128)
+        if correction.shape != (center_freqs.size, 2):
+            raise Exception('correction should be a {} by 2 array'.format(center_freqs.size))
+        order = np.argsort(center_freqs, kind="stable")
+        self.center_freqs = center_freqs[order]
+        self.correction = correction[order]
+        self.attrs = {} if attrs is None else dict(attrs)
+        self._amplitude = np.abs(self.correction)
+        self._phase = np.unwrap(np.angle(self.correction), axis=0)
+        self._cached_key = None
+        self._cached_vector = None
+
+    def __len__(self):
+        return self.center_freqs.size
+
+    def lookup(self, freqs, method="linear"):
+        """
+        :param freqs: the freqs to get the correction for, a number or an array-like
+        :param method: "linear" interpolates the amplitude and the unwrapped phase between the two neighbouring
+                       calibrated freqs; "nearest" takes the correction of the nearest calibrated freq.
+                       Outside the calibration both use the end values.
+        :return: a len(freqs) by 2 complex numpy array, the correction at 0 dB rx gain
+        """
+        if len(self) == 0:
+            raise Exception('calibration is empty')
+        freqs = np.atleast_1d(np.asarray(freqs, dtype=np.float64))
+
+        if method == "linear":
+            amplitude = np.stack([np.interp(freqs, self.center_freqs, self._amplitude[:, channel])
+                                  for channel in (0, 1)], axis=-1)
+            phase = np.stack([np.interp(freqs, self.center_freqs, self._phase[:, channel]) for channel in (0, 1)],
+                             axis=-1)
+            return amplitude * np.exp(1j * phase)
+        if method != "nearest":
+            raise Exception('unknown calibration lookup method {}'.format(method))
+
+        if len(self) == 1:
+            return self.correction[np.zeros(freqs.size, dtype=np.int64)]
+        upper = np.clip(np.searchsorted(self.center_freqs, freqs), 1, len(self) - 1)
+        lower = upper - 1
+        nearest = np.where(freqs - self.center_freqs[lower] <= self.center_freqs[upper] - freqs, lower, upper)
+        return self.correction[nearest]
+
+    def vector(self, center_freqs, rx_gains, method="linear"):
+        """
+        :param center_freqs: the n_freqs center freqs of a sweep
+        :param rx_gains: the n_freqs by 2 rx gains in dB of the sweep
+        :param method: see self.lookup()
+        :return: the n_freqs by 2 complex64 correction of the sweep; the vector of the last call is cached, so the
+                 sweeps with the same gain table reuse it
+        """
+        center_freqs = np.asarray(center_freqs, dtype=np.float64)
+        rx_gains = np.asarray(rx_gains, dtype=np.float64)
+        key = (center_freqs.tobytes(), rx_gains.tobytes(), method)
+        if key == self._cached_key:
+            return self._cached_vector
+
+        vector = (self.lookup(center_freqs, method) * 10 ** (-rx_gains / 20)).astype(np.complex64)
+        self._cached_key, self._cached_vector = key, vector
+        return vector
+
+    def apply(self, data, center_freqs, rx_gains, out=None):
+        """
+        correct the amplitude of both channels and the ratio of the channels; the common random phase of every
+        capture stays, see the module docstring
+
+        :param data: the tone responses, ... by n_freqs by 2, or the conjugated rx data that MyB210.sfcw_seep()
+                     returns by default, ... by n_freqs by 2 by num_rx_samps (complex or sc16)
+        :param center_freqs: the n_freqs center freqs of data
+        :param rx_gains: the n_freqs by 2 rx gains in dB data was received with
+        :param out: None returns a corrected copy; data (complex) corrects it in place
+        :return: the corrected data
+        """
+        vector = self.vector(center_freqs, rx_gains)
+        n = vector.shape[0]
+        if data.shape[-2:] == (n, 2):
+            pass
+        elif data.shape[-3:-1] == (n, 2):
+            vector = vector[:, :, None]
+        else:
+            raise Exception('data should be ... by {} by 2 or ... by {} by 2 by num_rx_samps'.format(n, n))
+
+        if data.dtype.names is not None:
+            data = to_complex64(data)
+            if out is None:
+                out = data
+        return np.multiply(data, vector, out=out)
+
+    def save(self, file_path):
+        """
+        :param file_path: the .npz file to write; it is overwritten if it exists
+        """
+        np.savez(file_path, center_freqs=self.center_freqs, correction=self.correction,
+                 attrs=np.array(json.dumps(self.attrs)))
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        :param file_path: a .npz file written by save()
+        """
+        with np.load(file_path, allow_pickle=False) as f:
+            return cls(f["center_freqs"], f["correction"], json.loads(str(f["attrs"])))
@@ -0,0 +1,37 @@
+"""
+Tone demodulation: reduces captures of the known tx tone to its complex amplitude (the channel response)
+"""
+import numpy as np
+
+from utils.sc16 import to_complex64
+
+
+def reference_tone(num_samps, samp_rate, tone_freq):
+    """
+    :return: exp(-2j * pi * tone_freq * n / samp_rate) for n = 0 ... num_samps - 1, as complex64
+    """
+    n = np.arange(num_samps)
+    return np.exp(-2j * np.pi * tone_freq / samp_rate * n).astype(np.complex64)
+
+
+def tone_response(rx_data, samp_rate, tone_freq=1000, conjugate=False, ref=None):
+    """
+    Correlates the captures with the reference tone; the result is the complex amplitude of the tone in each capture.
+    Everything but the last axis is batched, so a whole sweep (n_freqs by 2 by num_rx_samps) is one matrix product.
+
+    :param rx_data: a numpy array of complex (or sc16) numbers, ... by num_rx_samps
+    :param samp_rate: the sample rate of the captures
+    :param tone_freq: the frequency of the tx tone, see utils/signals.complex_sinusoid()
+    :param conjugate: True if rx_data is the raw rx data that sfcw_seep() would conjugate; the conjugate is folded
+                      into the correlation instead of being applied to the samples
+    :param ref: a precomputed reference_tone(num_rx_samps, samp_rate, tone_freq), to save computing it per call
+    :return: the complex tone amplitude of every capture, a complex128 numpy array of shape rx_data.shape[:-1]
+    """
+    rx_data = to_complex64(rx_data)
+    num_samps = rx_data.shape[-1]
+    if ref is None:
+        ref = reference_tone(num_samps, samp_rate, tone_freq)
+    if conjugate:
+        # mean(conj(x) * ref) = conj(mean(x * conj(ref)))
+        return np.conjugate(np.matmul(rx_data, np.conjugate(ref)).astype(np.complex128)) / num_samps
+    return np.matmul(rx_data, ref).astype(np.complex128) / num_samps
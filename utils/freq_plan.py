@@ -0,0 +1,150 @@
+"""
+Sweep planning: the order the center freqs of a sweep are visited in
+
+Every step of a sweep retunes the LO's of the AD9361 and waits for them to lock. The lock time grows with the size
+of the frequency jump and jumps up when the LO crosses one of the edges of its divider bands, so the order of the
+steps (and where the LO's are before the sweep starts) sets the total settle time of a sweep.
+
+    model = RetuneCostModel()                 rough defaults
+    model = RetuneCostModel.fit(retune_log)   fitted to the (from_freq, to_freq, latency) log of MyB210
+    order, predicted_seconds = plan_sweep(center_freqs, start_freq, model)
+
+The sweep receives center_freqs[order[0]] first, then center_freqs[order[1]], ..., and stores every step at its
+own index, so the results stay in the order of center_freqs.
+"""
+import numpy as np
+
+
+class RetuneCostModel():
+    """
+    The LO lock time of a retune from from_freq to to_freq:
+
+        base + per_ghz * |to_freq - from_freq| / 1e9 + band_cross * (the LO changes divider band)
+
+    a retune from an unknown frequency (None) costs base + band_cross.
+
+    The simulated device in utils/sim_uhd.py locks its LO's by this model too, so the defaults are the lock times
+    of SimMultiUSRP.
+    """
+    # the edges of the LO divider bands of the AD9361 in Hz
+    BandEdges = (93.75e6, 187.5e6, 375e6, 750e6, 1500e6, 3000e6)
+    # the default lock times in seconds
+    Base = 150e-6
+    PerGhz = 400e-6
+    BandCross = 1e-3
+
+    def __init__(self, base=None, per_ghz=None, band_cross=None, band_edges=None):
+        """
+        :param base: the lock time of a retune with a tiny frequency jump, in seconds; None uses RetuneCostModel.Base
+        :param per_ghz: the extra lock time per GHz of frequency jump, in seconds; None uses RetuneCostModel.PerGhz
+        :param band_cross: the extra lock time when the LO crosses a band edge, in seconds;
+                           None uses RetuneCostModel.BandCross
+        :param band_edges: the band edges in Hz; None uses RetuneCostModel.BandEdges
+        """
+        self.base = RetuneCostModel.Base if base is None else base
+        self.per_ghz = RetuneCostModel.PerGhz if per_ghz is None else per_ghz
+        self.band_cross = RetuneCostModel.BandCross if band_cross is None else band_cross
+        self.band_edges = np.asarray(RetuneCostModel.BandEdges if band_edges is None else band_edges)
+
+    def _features(self, from_freqs, to_freqs):
+        """
+        :return: the n by 3 matrix [1, |jump| in GHz, band crossed] of the retunes from_freqs[k] -> to_freqs[k]
+        """
+        from_freqs = np.asarray(from_freqs, dtype=np.float64)
+        to_freqs = np.asarray(to_freqs, dtype=np.float64)
+        crossed = np.searchsorted(self.band_edges, from_freqs) != np.searchsorted(self.band_edges, to_freqs)
+        return np.stack([np.ones(to_freqs.shape), np.abs(to_freqs - from_freqs) / 1e9, crossed], axis=-1)
+
+    def cost(self, from_freq, to_freq):
+        """
+        :param from_freq: the LO freq before the retune in Hz, None if it is unknown
+        :param to_freq: the LO freq after the retune in Hz
+        :return: the predicted lock time in seconds; 0 if the freq does not change
+        """
+        if from_freq is None:
+            return self.base + self.band_cross
+        if from_freq == to_freq:
+            return 0.0
+        return float(self._features([from_freq], [to_freq])[0] @ [self.base, self.per_ghz, self.band_cross])
+
+    def path_cost(self, freqs, start_freq=None):
+        """
+        :param freqs: the freqs in the order they are visited
+        :param start_freq: the LO freq before the first retune, None if it is unknown
+        :return: the predicted total lock time of visiting freqs, in seconds
+        """
+        freqs = np.asarray(freqs, dtype=np.float64)
+        if freqs.size == 0:
+            return 0.0
+        costs = self._features(freqs[:-1], freqs[1:]) @ [self.base, self.per_ghz, self.band_cross]
+        costs[freqs[:-1] == freqs[1:]] = 0.0
+        return self.cost(start_freq, freqs[0]) + float(np.sum(costs))
+
+    @classmethod
+    def fit(cls, retune_log, band_edges=None):
+        """
+        fit the model to measured lock times by least squares
+
+        :param retune_log: a list of (from_freq, to_freq, latency in seconds), see MyB210.retune_log;
+                           the entries with an unknown from_freq are left out
+        :param band_edges: see RetuneCostModel()
+        :return: a RetuneCostModel; the default model if there are fewer than 3 usable entries
+        """
+        model = cls(band_edges=band_edges)
+        log = [(a, b, t) for a, b, t in retune_log if a is not None and a != b]
+        if len(log) < 3:
+            return model
+        from_freqs, to_freqs, latencies = (np.array(column, dtype=np.float64) for column in zip(*log))
+        features = model._features(from_freqs, to_freqs)
+        if not np.any(features[:, 2]):
+            features = features[:, :2]  # no band crossing was measured, keep the default band_cross
+        params = np.linalg.lstsq(features, latencies, rcond=None)[0]
+        params = np.maximum(params, 0.0)
+        model.base, model.per_ghz = params[0], params[1]
+        if params.size == 3:
+            model.band_cross = params[2]
+        return model
+
+
+def plan_sweep(center_freqs, start_freq=None, model=None):
+    """
+    Choose the order of the sweep steps with the smallest predicted total lock time. The candidates are
+    ascending, descending, and a nearest neighbour tour from start_freq; with a cost that grows with the jump,
+    a sweep that starts where the LO's already are (e.g. descending right after an ascending sweep) wins.
+
+    :param center_freqs: the center freqs of the sweep
+    :param start_freq: the LO freq before the sweep, None if it is unknown
+    :param model: a RetuneCostModel; None uses the default model
+    :return: order, predicted_seconds
+            order: the numpy array of indices into center_freqs in the order to visit them
+            predicted_seconds: the predicted total lock time of the order
+    """
+    if model is None:
+        model = RetuneCostModel()
+    center_freqs = np.asarray(center_freqs, dtype=np.float64)
+    ascending = np.argsort(center_freqs, kind="stable")
+    candidates = [ascending, ascending[::-1]]
+
+    if start_freq is not None and center_freqs.size > 0:
+        # nearest neighbour: always jump to the closest freq that is not visited yet
+        sorted_freqs = center_freqs[ascending]
+        lower = np.searchsorted(sorted_freqs, start_freq) - 1
+        upper = lower + 1
+        current = start_freq
+        tour = []
+        while lower >= 0 or upper < sorted_freqs.size:
+            go_down = upper >= sorted_freqs.size or (
+                lower >= 0 and current - sorted_freqs[lower] <= sorted_freqs[upper] - current)
+            if go_down:
+                current = sorted_freqs[lower]
+                tour.append(lower)
+                lower -= 1
+            else:
+                current = sorted_freqs[upper]
+                tour.append(upper)
+                upper += 1
+        candidates.append(ascending[tour])
+
+    costs = [model.path_cost(center_freqs[order], start_freq) for order in candidates]
+    best = int(np.argmin(costs))
+    return candidates[best], costs[best]
@@ -0,0 +1,109 @@
+"""
+Model-based rx gain search used by the gain tuning in MyB210
+"""
+import numpy as np
+
+
+class RxGainSearch():
+    """
+    Finds the rx gain that brings the measured rx amplitude into target_amp +- amp_tolerence.
+
+    The rx gain is in dB, so away from ADC saturation the amplitude follows
+        amp = amp_now * 10 ** ((gain - gain_now) / 20)
+    and one capture is enough to compute the needed gain. Near saturation that model does not hold
+    (the amplitude is compressed), and the search bisects the bracket of gains that are known to be
+    too low / too high instead.
+
+    usage:
+        search = RxGainSearch(target_amp, amp_tolerence)
+        rx_gain = search.start_gain
+        while rx_gain is not None:
+            <set rx_gain, capture, estimate amp>
+            rx_gain = search.update(<the actual rx gain>, amp)
+
+        search.good_gain, search.converged, search.num_captures
+    """
+
+    def __init__(self, target_amp, amp_tolerence, start_gain=0.0, min_gain=0.0, max_gain=76.0, gain_step=1.0,
+                 saturation_amp=0.9, max_captures=20):
+        """
+        :param target_amp: target rx signal amplitude, 0 to 1
+        :param amp_tolerence: a small positive number, like 0.2, 0.3
+        :param start_gain: the rx gain of the first capture
+        :param min_gain: the smallest rx gain of the device, in dB
+        :param max_gain: the largest rx gain of the device, in dB
+        :param gain_step: the rx gain resolution of the device, in dB
+        :param saturation_amp: above this amplitude the ADC is close to clipping and the search bisects
+        :param max_captures: give up after this many captures
+        """
+        self.target_amp = target_amp
+        self.amp_tolerence = amp_tolerence
+        self.min_gain = min_gain
+        self.max_gain = max_gain
+        self.gain_step = gain_step
+        self.saturation_amp = saturation_amp
+        self.max_captures = max_captures
+
+        self.start_gain = self._quantize(np.clip(start_gain, min_gain, max_gain))
+        self.num_captures = 0
+        self.converged = False
+        self.good_gain = self.start_gain
+        self.good_amp = None
+
+        self._too_low = None    # the largest gain known to give a too small amplitude
+        self._too_high = None   # the smallest gain known to give a too large amplitude
+
+    def _quantize(self, gain):
+        return float(np.round(gain / self.gain_step) * self.gain_step)
+
+    def _in_bracket(self, gain):
+        return (
+                self.min_gain <= gain <= self.max_gain
+                and (self._too_low is None or gain > self._too_low)
+                and (self._too_high is None or gain < self._too_high)
+        )
+
+    def update(self, gain, amp):
+        """
+        :param gain: the rx gain the capture was taken with
+        :param amp: the estimated rx amplitude of the capture
+        :return: the rx gain for the next capture, or None when the search is done
+        """
+        self.num_captures += 1
+
+        # keep the capture closest to the target as the answer in case the search does not converge
+        if self.good_amp is None or abs(amp - self.target_amp) < abs(self.good_amp - self.target_amp):
+            self.good_gain = gain
+            self.good_amp = amp
+
+        if abs(amp - self.target_amp) <= self.amp_tolerence:
+            self.converged = True
+            return None
+        if self.num_captures >= self.max_captures:
+            return None
+
+        if amp < self.target_amp:
+            self._too_low = gain if self._too_low is None else max(self._too_low, gain)
+        else:
+            self._too_high = gain if self._too_high is None else min(self._too_high, gain)
+
+        # one step of the dB model, unless the ADC is close to saturation
+        next_gain = None
+        if 0 < amp < self.saturation_amp:
+            next_gain = self._quantize(gain + 20 * np.log10(self.target_amp / amp))
+            if next_gain == gain:
+                # the tolerance is narrower than one gain step; try the neighbouring step
+                next_gain = gain + np.sign(self.target_amp - amp) * self.gain_step
+
+        # fall back to bisection of the bracket
+        if next_gain is None or not self._in_bracket(next_gain):
+            low = self.min_gain if self._too_low is None else self._too_low
+            high = self.max_gain if self._too_high is None else self._too_high
+            next_gain = self._quantize((low + high) / 2)
+            if not self._in_bracket(next_gain):
+                # the bracket is down to one gain step; only an untested end of the gain range is left
+                next_gain = high if self._too_high is None else low
+
+        if not self._in_bracket(next_gain):
+            return None  # every gain step between the bounds has been tried
+        return next_gain
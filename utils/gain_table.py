@@ -0,0 +1,118 @@
+"""
+The rx gain table: the good rx gains of channelA and channelB per center freq
+"""
+import json
+
+import numpy as np
+
+
+class GainTable():
+    """
+    An rx gain table backed by sorted numpy arrays.
+
+        gain_table.center_freqs : the sorted center freqs, a numpy array of length n
+        gain_table.rx_gains     : an n by 2 numpy array, [rxA_gain, rxB_gain] for each center freq
+        gain_table.attrs        : a dictionary of the conditions the table was measured under
+                                  (tx gains, sample rate, bandwidths, ...)
+
+    gain_table.lookup(freqs) returns the rx gains for any freqs at once, with nearest or linear interpolation,
+    so a sweep can use a finer frequency grid than the calibration.
+    gain_table[f] and gain_table[f] = [rxA_gain, rxB_gain] work like the dictionary the table used to be.
+
+    save() writes a .npz file of plain arrays (no pickle), load() reads it back.
+    """
+
+    def __init__(self, center_freqs=(), rx_gains=None, attrs=None):
+        """
+        :param center_freqs: the center freqs, in any order
+        :param rx_gains: a len(center_freqs) by 2 array-like of [rxA_gain, rxB_gain]
+        :param attrs: a json serializable dictionary of the conditions the table was measured under
+        """
+        center_freqs = np.asarray(center_freqs, dtype=np.float64)
+        rx_gains = np.zeros((0, 2)) if rx_gains is None else np.asarray(rx_gains, dtype=np.float64)
+        if rx_gains.shape != (center_freqs.size, 2):
+            raise Exception('rx_gains should be a {} by 2 array'.format(center_freqs.size))
+        order = np.argsort(center_freqs, kind="stable")
+        self.center_freqs = center_freqs[order]
+        self.rx_gains = rx_gains[order]
+        self.attrs = {} if attrs is None else dict(attrs)
+
+    @classmethod
+    def from_dict(cls, gain_dict, attrs=None):
+        """
+        :param gain_dict: a dictionary {center_freq: [rxA_gain, rxB_gain]}, the old gain table format
+        """
+        center_freqs = list(gain_dict.keys())
+        return cls(center_freqs, [gain_dict[f] for f in center_freqs], attrs)
+
+    def to_dict(self):
+        return {f: list(gains) for f, gains in zip(self.center_freqs.tolist(), self.rx_gains.tolist())}
+
+    def __len__(self):
+        return self.center_freqs.size
+
+    def _index(self, center_freq):
+        """
+        :return: the index of center_freq in self.center_freqs, or None if it is not in the table
+        """
+        i = np.searchsorted(self.center_freqs, center_freq)
+        if i < self.center_freqs.size and self.center_freqs[i] == center_freq:
+            return i
+        return None
+
+    def __contains__(self, center_freq):
+        return self._index(center_freq) is not None
+
+    def __getitem__(self, center_freq):
+        """
+        :return: [rxA_gain, rxB_gain] at center_freq, from the nearest calibrated freq
+        """
+        return self.lookup([center_freq])[0].tolist()
+
+    def __setitem__(self, center_freq, rx_gains):
+        i = self._index(center_freq)
+        if i is not None:
+            self.rx_gains[i] = rx_gains
+            return
+        i = np.searchsorted(self.center_freqs, center_freq)
+        self.center_freqs = np.insert(self.center_freqs, i, center_freq)
+        self.rx_gains = np.insert(self.rx_gains, i, rx_gains, axis=0)
+
+    def lookup(self, freqs, method="nearest"):
+        """
+        :param freqs: the freqs to get the rx gains for, a number or an array-like
+        :param method: "nearest" takes the gains of the nearest calibrated freq; "linear" interpolates the gains
+                       in dB between the two neighbouring calibrated freqs. Outside the table both use the end values.
+        :return: a len(freqs) by 2 numpy array of [rxA_gain, rxB_gain]
+        """
+        if len(self) == 0:
+            raise Exception('gain table is empty')
+        freqs = np.atleast_1d(np.asarray(freqs, dtype=np.float64))
+
+        if method == "linear":
+            return np.stack([np.interp(freqs, self.center_freqs, self.rx_gains[:, channel]) for channel in (0, 1)],
+                            axis=-1)
+        if method != "nearest":
+            raise Exception('unknown gain table lookup method {}'.format(method))
+
+        upper = np.clip(np.searchsorted(self.center_freqs, freqs), 1, max(len(self) - 1, 1))
+        lower = upper - 1
+        if len(self) == 1:
+            return self.rx_gains[np.zeros(freqs.size, dtype=np.int64)]
+        nearest = np.where(freqs - self.center_freqs[lower] <= self.center_freqs[upper] - freqs, lower, upper)
+        return self.rx_gains[nearest]
+
+    def save(self, file_path):
+        """
+        :param file_path: the .npz file to write; it is overwritten if it exists
+        """
+        np.savez(file_path, center_freqs=self.center_freqs, rx_gains=self.rx_gains,
+                 attrs=np.array(json.dumps(self.attrs)))
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        :param file_path: a .npz file written by save()
+        """
+        with np.load(file_path, allow_pickle=False) as f:
+            return cls(f["center_freqs"], f["rx_gains"], json.loads(str(f["attrs"])))
@@ -0,0 +1,151 @@
+"""
+Post-processing of stored sfcw sweeps: range profiles of many survey locations at once
+
+    responses, center_freqs, rx_gains = load_responses(paths)      the tone response of every location, in parallel
+    responses = compensate_rx_gains(responses, rx_gains)
+    profiles, ranges = range_profiles(responses, center_freqs, reference_channel=0, background="mean")
+
+The steps are vectorized across locations:
+    extract_responses()    tone extraction: a ... by n_freqs by 2 by num_rx_samps array of rx data (a stack of
+                           sweeps, or a memory map of one) to the complex tone amplitude, ... by n_freqs by 2
+    compensate_rx_gains()  undo the rx gains of the gain table, so the amplitudes of all freqs compare
+    range_profiles()       optional channel ratio and background subtraction, window over the freqs and a
+                           zero-padded IFFT from frequency to range
+
+The tone of every capture starts at a random phase, and so does the LO after every retune; both channels see the
+same phase, so the ratio to a reference channel (e.g. channel A on a direct path) cancels it.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.demod import reference_tone, tone_response
+from utils.sweep_writer import load_sweep
+
+SPEED_OF_LIGHT = 299792458.0
+
+_windows = {
+    "hann": np.hanning,
+    "hamming": np.hamming,
+    "blackman": np.blackman,
+    "rect": np.ones,
+}
+
+
+def extract_responses(data, samp_rate, tone_freq=1000, conjugate=False, chunk_size=8):
+    """
+    :param data: the rx data of the sweeps, ... by n_freqs by 2 by num_rx_samps, complex or sc16; a memory map
+                 is read chunk by chunk
+    :param samp_rate: the sample rate of the rx data
+    :param tone_freq: the frequency of the tx tone in Hz
+    :param conjugate: True for raw rx data, False for the conjugated data that MyB210.sfcw_seep() returns by default
+    :param chunk_size: the number of sweeps read and converted at once, bounds the memory of sc16 and memory maps
+    :return: the complex tone amplitude of every capture, a complex128 numpy array of shape data.shape[:-1]
+    """
+    ref = reference_tone(data.shape[-1], samp_rate, tone_freq)
+    if data.ndim <= 3:
+        return tone_response(data, samp_rate, tone_freq, conjugate, ref)
+
+    sweeps = data.reshape((-1,) + data.shape[-3:])
+    responses = np.empty(sweeps.shape[:-1], dtype=np.complex128)
+    for start in range(0, sweeps.shape[0], chunk_size):
+        chunk = sweeps[start:start + chunk_size]
+        responses[start:start + chunk_size] = tone_response(chunk, samp_rate, tone_freq, conjugate, ref)
+    return responses.reshape(data.shape[:-1])
+
+
+def _location_response(path, tone_freq, conjugate):
+    """
+    the process pool job of load_responses()
+    """
+    sweep = load_sweep(path)
+    response = extract_responses(sweep["data"], sweep["attrs"]["samp_rate"], tone_freq, conjugate)
+    return response, sweep["center_freqs"], sweep["rx_gains"]
+
+
+def load_responses(paths, tone_freq=1000, conjugate=False, num_processes=None):
+    """
+    the tone responses of stored sweeps (see utils/sweep_writer.py), with one process per sweep at a time;
+    the sweeps are opened as memory maps, so only the responses come back to this process
+
+    :param paths: the sweep directories (or HDF5 files) of the locations; their attrs need "samp_rate"
+    :param tone_freq: the frequency of the tx tone in Hz
+    :param conjugate: see extract_responses()
+    :param num_processes: the size of the process pool; None uses os.cpu_count(), 1 runs in this process
+    :return: responses, center_freqs, rx_gains
+            responses: len(paths) by n_freqs by 2 complex tone responses
+            center_freqs: the center freqs of the sweeps, which must be the same for all
+            rx_gains: len(paths) by n_freqs by 2 rx gains of the sweeps
+    """
+    if num_processes is None:
+        num_processes = os.cpu_count()
+    args = (tone_freq, conjugate)
+    if num_processes == 1 or len(paths) <= 1:
+        results = [_location_response(path, *args) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=num_processes) as pool:
+            results = list(pool.map(_location_response, paths, *[[arg] * len(paths) for arg in args]))
+
+    center_freqs = results[0][1]
+    for path, (_, freqs, _) in zip(paths, results):
+        if not np.array_equal(freqs, center_freqs):
+            raise Exception('the sweep in {} has different center freqs'.format(path))
+    responses = np.stack([response for response, _, _ in results])
+    rx_gains = np.stack([gains for _, _, gains in results])
+    return responses, center_freqs, rx_gains
+
+
+def compensate_rx_gains(responses, rx_gains):
+    """
+    :param responses: ... by n_freqs by 2 tone responses
+    :param rx_gains: the rx gains in dB the responses were received with, broadcastable to responses
+    :return: the responses as if they were all received with 0 dB rx gain
+    """
+    return responses * 10 ** (-np.asarray(rx_gains) / 20)
+
+
+def range_profiles(responses, center_freqs, window="hann", zero_pad=4, reference_channel=None, background=None):
+    """
+    :param responses: ... by n_freqs by 2 tone responses, e.g. len(locations) by n_freqs by 2
+    :param center_freqs: the n_freqs center freqs, equally spaced and ascending
+    :param window: "hann", "hamming", "blackman", "rect" or None (= "rect"), applied across the freqs
+    :param zero_pad: the IFFT length is zero_pad * n_freqs, rounded up to a power of 2
+    :param reference_channel: None keeps both channels; 0 or 1 divides the other channel by this one and
+                              the profiles have one channel, ... by nfft
+    :param background: None; "mean" subtracts the mean response over the first axis (the locations), which removes
+                       what every location sees, like the antenna coupling, and needs a locations axis before the
+                       freq axis; or an array of responses to subtract
+    :return: profiles, ranges
+            profiles: the complex range profiles, ... by nfft by 2 (... by nfft with a reference_channel)
+            ranges: the nfft ranges in meters (one way, half the round trip path)
+    """
+    center_freqs = np.asarray(center_freqs, dtype=np.float64)
+    steps = np.diff(center_freqs)
+    if center_freqs.size < 2 or not np.allclose(steps, steps[0]) or steps[0] <= 0:
+        raise Exception('range profiles need at least 2 equally spaced ascending center freqs')
+    freq_step = steps[0]
+
+    responses = np.asarray(responses)
+    freq_axis = responses.ndim - 2
+    if reference_channel is not None:
+        responses = responses[..., 1 - reference_channel] / responses[..., reference_channel]
+        freq_axis = responses.ndim - 1
+
+    if isinstance(background, str):
+        if background != "mean":
+            raise Exception('unknown background {}'.format(background))
+        if freq_axis == 0:
+            raise Exception('background="mean" needs responses with a leading locations axis')
+        responses = responses - responses.mean(axis=0, keepdims=True)
+    elif background is not None:
+        responses = responses - background
+
+    window = _windows[window or "rect"](center_freqs.size)
+    shape = [1] * responses.ndim
+    shape[freq_axis] = center_freqs.size
+    nfft = 1 << int(np.ceil(np.log2(zero_pad * center_freqs.size)))
+
+    profiles = np.fft.ifft(responses * window.reshape(shape), n=nfft, axis=freq_axis)
+    ranges = np.arange(nfft) * SPEED_OF_LIGHT / (2 * nfft * freq_step)
+    return profiles, ranges
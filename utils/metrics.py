@@ -0,0 +1,204 @@
+"""
+Timing instrumentation of the MyB210 hot paths
+
+    metrics = B210.enable_metrics()
+    B210.sfcw_seep(...)
+    print(metrics.to_json())          or metrics.to_prometheus()
+    B210.disable_metrics()
+
+enable_metrics() wraps the instrumented methods of that one MyB210 object (and its rx streamer) with timing wrappers;
+disable_metrics() removes the wrappers again, so a B210 without metrics runs the plain methods at zero cost.
+
+Every call is recorded under its stage name, and the per-step stages also per center freq, the freq of the sweep
+step the call works on (MyB210.mark_step()), even when the LO's are already tuned ahead to a later step:
+    tune_center_freq     retune + LO lock wait; set_freqs is the retune part, the rest is the lock wait
+    set_gains, set_rx_gain, set_tx_gain
+    issue_stream_cmd, recv                       the rx streamer calls
+    recv_and_save_data, measure_rx_amps          a whole capture
+    conjugate                                    the in-place conjugate of a sweep step
+    calibrate_freq, calibrate_freq_channel       the gain search at one freq (both channels / one channel)
+    calibrate, recalibrate, sfcw_seep, sfcw_seep_timed, sfcw_seep_response   whole calibrations and sweeps
+"""
+import functools
+import json
+import threading
+import time
+
+# (method name, stage name, where the center freq label comes from):
+# an argument index, "step" for the sweep step being worked on (MyB210.step_freq()), or None for no per-freq record
+InstrumentedMethods = (
+    ("tune_center_freq", "tune_center_freq", 0),
+    ("set_freqs", "set_freqs", 0),
+    ("set_gains", "set_gains", "step"),
+    ("set_rx_gain", "set_rx_gain", "step"),
+    ("set_tx_gain", "set_tx_gain", "step"),
+    ("recv_and_save_data", "recv_and_save_data", "step"),
+    ("measure_rx_amps", "measure_rx_amps", "step"),
+    ("_conjugate", "conjugate", "step"),
+    ("_get_gains_for_both_channels_one_center_freq", "calibrate_freq", 0),
+    ("_get_gain_for_one_channel_one_center_freq", "calibrate_freq_channel", 1),
+    ("get_gains_for_all_freqs", "calibrate", None),
+    ("recalibrate_gain_table", "recalibrate", None),
+    ("sfcw_seep", "sfcw_seep", None),
+    ("sfcw_seep_timed", "sfcw_seep_timed", None),
+    ("sfcw_seep_response", "sfcw_seep_response", None),
+)
+InstrumentedStreamerMethods = ("issue_stream_cmd", "recv")
+
+
+class StageStats():
+    """
+    count, total, min and max of the durations of one stage, in seconds
+    """
+    __slots__ = ("count", "total", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+        }
+
+
+class Metrics():
+    """
+    The recorded durations: self.stages {stage: StageStats} and self.per_freq {stage: {center_freq: StageStats}}
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.per_freq = {}
+
+    def record(self, stage, seconds, center_freq=None):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.add(seconds)
+            if center_freq is not None:
+                freq_stats = self.per_freq.setdefault(stage, {})
+                stats = freq_stats.get(center_freq)
+                if stats is None:
+                    stats = freq_stats[center_freq] = StageStats()
+                stats.add(seconds)
+
+    def to_dict(self):
+        """
+        :return: {"stages": {stage: {"count", "total", "mean", "min", "max"}},
+                  "per_freq": {stage: {center_freq: {...}}}}, durations in seconds
+        """
+        with self._lock:
+            return {
+                "stages": {stage: stats.to_dict() for stage, stats in self.stages.items()},
+                "per_freq": {stage: {repr(float(f)): stats.to_dict() for f, stats in sorted(freq_stats.items())}
+                             for stage, freq_stats in self.per_freq.items()},
+            }
+
+    def to_json(self, file_path=None):
+        """
+        :param file_path: None, or the file to write the JSON to
+        :return: the JSON text of self.to_dict()
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+        if file_path is not None:
+            with open(file_path, "w") as f:
+                f.write(text)
+        return text
+
+    def to_prometheus(self, prefix="b210"):
+        """
+        :return: the metrics in the Prometheus text exposition format: a summary (count and sum) and a max gauge
+                 per stage, and the same labelled with center_freq for the per-freq stages
+        """
+        lines = [
+            "# HELP {}_stage_seconds time spent in each MyB210 stage".format(prefix),
+            "# TYPE {}_stage_seconds summary".format(prefix),
+        ]
+        data = self.to_dict()
+        max_lines = [
+            "# HELP {}_stage_seconds_max the longest call of each MyB210 stage".format(prefix),
+            "# TYPE {}_stage_seconds_max gauge".format(prefix),
+        ]
+        for stage, stats in sorted(data["stages"].items()):
+            labels = 'stage="{}"'.format(stage)
+            lines.append("{}_stage_seconds_count{{{}}} {}".format(prefix, labels, stats["count"]))
+            lines.append("{}_stage_seconds_sum{{{}}} {!r}".format(prefix, labels, stats["total"]))
+            max_lines.append("{}_stage_seconds_max{{{}}} {!r}".format(prefix, labels, stats["max"]))
+            for f, freq_stats in data["per_freq"].get(stage, {}).items():
+                freq_labels = '{},center_freq="{}"'.format(labels, f)
+                lines.append("{}_stage_seconds_count{{{}}} {}".format(prefix, freq_labels, freq_stats["count"]))
+                lines.append("{}_stage_seconds_sum{{{}}} {!r}".format(prefix, freq_labels, freq_stats["total"]))
+                max_lines.append("{}_stage_seconds_max{{{}}} {!r}".format(prefix, freq_labels, freq_stats["max"]))
+        return "\n".join(lines + max_lines) + "\n"
+
+
+def _timed(method, stage, freq_source, metrics, B210):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if freq_source == "step":
+            center_freq = B210.step_freq()
+        elif freq_source is not None and len(args) > freq_source:
+            center_freq = args[freq_source]
+        else:
+            center_freq = None
+        start_time = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.record(stage, time.perf_counter() - start_time, center_freq)
+    return wrapper
+
+
+class _TimedStreamer():
+    """
+    wraps a streamer: the InstrumentedStreamerMethods are timed, everything else is passed through
+    """
+
+    def __init__(self, streamer, metrics, B210):
+        self.streamer = streamer
+        for name in InstrumentedStreamerMethods:
+            setattr(self, name, _timed(getattr(streamer, name), name, "step", metrics, B210))
+
+    def __getattr__(self, name):
+        return getattr(self.streamer, name)
+
+
+def instrument(B210, metrics):
+    """
+    time the InstrumentedMethods of B210 and the calls of its rx streamer into metrics
+    """
+    uninstrument(B210)
+    for name, stage, freq_source in InstrumentedMethods:
+        setattr(B210, name, _timed(getattr(B210, name), stage, freq_source, metrics, B210))
+    B210.rx_streamer = _TimedStreamer(B210.rx_streamer, metrics, B210)
+
+
+def uninstrument(B210):
+    """
+    remove the timing wrappers of instrument(), the class methods are used again
+    """
+    for name, _, _ in InstrumentedMethods:
+        B210.__dict__.pop(name, None)
+    if isinstance(B210.rx_streamer, _TimedStreamer):
+        B210.rx_streamer = B210.rx_streamer.streamer
@@ -0,0 +1,234 @@
+"""
+Parallel sfcw sweeps on several B210 units
+
+    with MultiRadio(["30AD2F5", "30AD301"], samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth) as radios:
+        radios.load_gain_tables(radios.gain_table_names("gain_table"))
+        sfcw_rx_signal, center_freqs, rx_gains = radios.sweep(center_freqs, txA_gain, txB_gain)
+
+Every radio runs in a process of its own with its own MyB210 object, opened by serial. A sweep splits the sorted
+center_freqs into one contiguous sub-band per radio, the radios sweep their sub-bands at the same time, and every
+radio receives straight into its slice of one shared memory sweep buffer, so the merged sweep comes out in ascending
+freq order without another copy between the processes.
+
+Each radio needs a gain table for its own sub-band: calibrate() calibrates every radio on the sub-band it sweeps for
+the same center_freqs, and load_gain_tables() loads one table per radio (gain_table_30AD2F5 and gain_table_30AD301
+above). sfcw_radar_multi.py calibrates and sweeps the radios of radar_parameters.radio_serials this way.
+
+simulate=True runs every radio on a SimMultiUSRP (each with its own seed, so with its own path gains), for testing
+without hardware.
+"""
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _radio_process(conn, index, device_args, simulate, time_scale, samp_rate, master_clock_rate, tx_bandwidth,
+                   rx_bandwidth, cpu_format):
+    """
+    the process of one radio: opens the device, then serves the requests of MultiRadio until "close"
+    """
+    # imported here, so that only the radio processes open UHD
+    from utils.MyB210 import MyB210
+    from utils.signals import complex_sinusoid
+    from utils.sim_uhd import SimMultiUSRP
+
+    try:
+        usrp = SimMultiUSRP(device_args, time_scale=time_scale, seed=index) if simulate else None
+        B210 = MyB210(samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth, args=device_args, usrp=usrp,
+                      cpu_format=cpu_format)
+        tx_data, _ = complex_sinusoid(samp_rate, wave_freq=MyB210.ToneFreq, compact=True, cpu_format=cpu_format)
+        conn.send({"num_rx_samps": B210.num_rx_samps, "host_dtype": B210.host_dtype})
+    except Exception as e:
+        conn.send({"error": str(e)})
+        return
+
+    while True:
+        request = conn.recv()
+        cmd = request["cmd"]
+        if cmd == "close":
+            return
+        try:
+            if cmd == "load_table":
+                B210.load_gain_table(request["file_name"])
+                reply = {}
+            elif cmd == "save_table":
+                B210.save_gain_table(request["file_name"])
+                reply = {}
+            elif cmd == "calibrate":
+                B210.thread_send_data(tx_data)
+                B210.get_gains_for_all_freqs(request["center_freqs"], *request["args"])
+                B210.stop_transmit()
+                reply = {"center_freqs": B210.gain_table.center_freqs, "rx_gains": B210.gain_table.rx_gains}
+            elif cmd == "sweep":
+                shm = shared_memory.SharedMemory(name=request["shm_name"])
+                try:
+                    sweep = np.ndarray(request["shape"], dtype=request["dtype"], buffer=shm.buf)
+                    out = sweep[request["start"]:request["stop"]]
+                    sweep_func = B210.sfcw_seep_timed if request["timed"] else B210.sfcw_seep
+                    start_time = time.perf_counter()
+                    sweep_func(tx_data, request["center_freqs"], request["txA_gain"], request["txB_gain"], out=out,
+                               **request["sweep_kwargs"])
+                    seconds = time.perf_counter() - start_time
+                    del sweep, out
+                finally:
+                    shm.close()
+                reply = {"rx_gains": B210.gain_table.lookup(request["center_freqs"], B210.gain_interpolation),
+                         "seconds": seconds}
+            else:
+                raise Exception('unknown request {}'.format(cmd))
+        except Exception as e:
+            if B210.transmit_flag:
+                B210.stop_transmit()
+            reply = {"error": str(e)}
+        conn.send(reply)
+
+
+class MultiRadio():
+    """
+    see the module docstring
+
+    self.sweep_stats : the timing of the last sweep, with an estimate of the speed-up against a single radio
+    """
+
+    def __init__(self, serials, samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth, simulate=False,
+                 time_scale=1.0, cpu_format="fc32"):
+        """
+        :param serials: the serial numbers of the B210 units, one radio process each
+        :param samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth: see MyB210()
+        :param simulate: True runs every radio on a SimMultiUSRP instead of a B210
+        :param time_scale: the time scale of the simulated devices, see SimMultiUSRP()
+        :param cpu_format: see MyB210()
+        """
+        self.serials = list(serials)
+        self.sweep_stats = {}
+        # spawn: a radio process starts clean instead of forking the threads and the device handles of this one
+        context = multiprocessing.get_context("spawn")
+        self._conns = []
+        self._processes = []
+        for index, serial in enumerate(self.serials):
+            conn, child_conn = context.Pipe()
+            device_args = "type = b200, serial = {}".format(serial)
+            process = context.Process(target=_radio_process, daemon=True, args=(
+                child_conn, index, device_args, simulate, time_scale, samp_rate, master_clock_rate, tx_bandwidth,
+                rx_bandwidth, cpu_format))
+            process.start()
+            self._conns.append(conn)
+            self._processes.append(process)
+
+        replies = self._gather()
+        self.num_rx_samps = replies[0]["num_rx_samps"]
+        self.host_dtype = replies[0]["host_dtype"]
+
+    def _gather(self):
+        """
+        :return: the replies of all the radios; raises the error of a failed radio after all have replied
+        """
+        replies = [conn.recv() for conn in self._conns]
+        for serial, reply in zip(self.serials, replies):
+            if "error" in reply:
+                raise Exception('radio {}: {}'.format(serial, reply["error"]))
+        return replies
+
+    def _request_all(self, requests):
+        """
+        send requests[i] to radio i, all at once, then wait for every reply
+        """
+        for conn, request in zip(self._conns, requests):
+            conn.send(request)
+        return self._gather()
+
+    def gain_table_names(self, gain_table_name):
+        """
+        :return: one gain table name per radio, gain_table_name followed by the serial of the radio
+        """
+        return ["{}_{}".format(gain_table_name, serial) for serial in self.serials]
+
+    def split(self, center_freqs):
+        """
+        :return: center_freqs sorted, and the [start, stop) index range of the sub-band of every radio
+        """
+        center_freqs = np.sort(np.asarray(center_freqs, dtype=np.float64))
+        bounds = np.linspace(0, center_freqs.size, len(self.serials) + 1).round().astype(int)
+        return center_freqs, list(zip(bounds[:-1], bounds[1:]))
+
+    def load_gain_tables(self, file_names):
+        """
+        :param file_names: one gain table name per radio, see MyB210.load_gain_table()
+        """
+        self._request_all([{"cmd": "load_table", "file_name": name} for name in file_names])
+
+    def save_gain_tables(self, file_names):
+        """
+        :param file_names: one gain table name per radio, see MyB210.save_gain_table()
+        """
+        self._request_all([{"cmd": "save_table", "file_name": name} for name in file_names])
+
+    def calibrate(self, center_freqs, txA_gain, txB_gain, target_rxA_amp, target_rxB_amp, amp_tolerence):
+        """
+        calibrate every radio on its sub-band of center_freqs, all at once, see MyB210.get_gains_for_all_freqs()
+        :return: the gain tables of the radios, a list of (center_freqs, rx_gains)
+        """
+        center_freqs, bands = self.split(center_freqs)
+        args = (txA_gain, txB_gain, target_rxA_amp, target_rxB_amp, amp_tolerence)
+        replies = self._request_all([{"cmd": "calibrate", "center_freqs": center_freqs[start:stop], "args": args}
+                                     for start, stop in bands])
+        return [(reply["center_freqs"], reply["rx_gains"]) for reply in replies]
+
+    def sweep(self, center_freqs, txA_gain, txB_gain, timed=False, **sweep_kwargs):
+        """
+        sweep center_freqs with all the radios at once, each one on its sub-band
+
+        :param timed: True sweeps with MyB210.sfcw_seep_timed() instead of MyB210.sfcw_seep()
+        :param sweep_kwargs: more arguments of the sweep of every radio, like lookahead=, settle_time= or
+                             lead_time= of MyB210.sfcw_seep_timed(), or optimize_order= of MyB210.sfcw_seep()
+        :return: sfcw_rx_signal, center_freqs, rx_gains
+            the merged sweep in ascending freq order: sfcw_rx_signal is len(center_freqs) by 2 by num_rx_samps
+            like MyB210.sfcw_seep(), rx_gains the len(center_freqs) by 2 rx gains of the steps
+        """
+        center_freqs, bands = self.split(center_freqs)
+        shape = (center_freqs.size, 2, self.num_rx_samps)
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * self.host_dtype.itemsize)
+        try:
+            start_time = time.perf_counter()
+            replies = self._request_all([
+                {"cmd": "sweep", "shm_name": shm.name, "shape": shape, "dtype": self.host_dtype, "start": start,
+                 "stop": stop, "center_freqs": center_freqs[start:stop], "txA_gain": txA_gain, "txB_gain": txB_gain,
+                 "timed": timed, "sweep_kwargs": sweep_kwargs}
+                for start, stop in bands
+            ])
+            seconds = time.perf_counter() - start_time
+            sfcw_rx_signal = np.ndarray(shape, dtype=self.host_dtype, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        rx_gains = np.concatenate([reply["rx_gains"] for reply in replies])
+        # an estimate, not measured: one radio would need about the sum of the sweep times of all the radios
+        estimated_single_radio_seconds = sum(reply["seconds"] for reply in replies)
+        self.sweep_stats = {
+            "num_steps": center_freqs.size,
+            "num_radios": len(self.serials),
+            "seconds": seconds,
+            "radio_seconds": [reply["seconds"] for reply in replies],
+            "estimated_speed_up": estimated_single_radio_seconds / seconds,
+        }
+        print("multi-radio sweep: {} steps on {} radios in {:.3f} seconds, an estimated {:.2f}x the speed of one "
+              "radio".format(center_freqs.size, len(self.serials), seconds, estimated_single_radio_seconds / seconds))
+        return sfcw_rx_signal, center_freqs, rx_gains
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send({"cmd": "close"})
+            except (OSError, EOFError):
+                pass
+        for process in self._processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
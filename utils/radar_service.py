@@ -0,0 +1,330 @@
+"""
+A resident radar service: one process owns the B210 (a MyB210 object) and takes sweep and calibration jobs from
+other processes over a local socket, so a survey does not open and set up the device for every sweep.
+
+    service process (see sfcw_radar_daemon.py):
+        B210 = MyB210(...)
+        RadarService(B210, address).serve_forever()
+
+    any other process:
+        with RadarClient(address) as radar:
+            radar.load_gain_table("gain_table")
+            for i, center_freq, rx_gains, rx_data in radar.iter_sweep(center_freqs, txA_gain, txB_gain):
+                ...
+
+A request is a dictionary {"cmd": name, parameters...} and every reply a dictionary; a failed request replies
+{"error": message} and the service goes on with the next request. A sweep streams one message per frequency step
+as soon as the step is received, then a final {"done": True, ...} message.
+The messages are pickled by multiprocessing.connection, so whoever passes the authkey can run code in the service:
+the key is a random key per install, created on first use in a file only its owner can read (see load_authkey()).
+"""
+import os
+import secrets
+import stat
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from utils.signals import complex_sinusoid
+from utils.sweep_writer import SweepWriter
+
+DEFAULT_ADDRESS = ("localhost", 6000)
+DEFAULT_AUTHKEY_PATH = os.path.join(os.path.expanduser("~"), ".sfcw_radar_authkey")
+
+
+def load_authkey(file_path=DEFAULT_AUTHKEY_PATH):
+    """
+    :param file_path: the key file; it is created with a new random key and mode 0600 if it does not exist
+    :return: the authkey of the service and its clients
+    """
+    try:
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+
+    mode = os.stat(file_path).st_mode
+    if mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise Exception('the authkey file {} must only be readable by its owner (chmod 600)'.format(file_path))
+    with open(file_path) as f:
+        authkey = f.read().strip().encode()
+    if not authkey:
+        raise Exception('the authkey file {} is empty'.format(file_path))
+    return authkey
+
+
+class ConnectionSweepWriter(SweepWriter):
+    """
+    A sweep writer that sends every step over a connection instead of storing it, see utils/sweep_writer.py
+    """
+
+    def __init__(self, conn, center_freqs, num_rx_samps, num_channels=2, attrs=None, dtype=np.complex64):
+        super().__init__(center_freqs, num_rx_samps, num_channels, attrs, dtype)
+        self.conn = conn
+        self.data = None  # nothing is kept, the client gets the steps
+        self._step_buffer = np.empty(self.shape[1:], dtype=self.dtype)
+
+    def step_buffer(self, i):
+        return self._step_buffer
+
+    def write(self, i, rx_gains):
+        self.conn.send({"step": i, "center_freq": self.center_freqs[i], "rx_gains": np.asarray(rx_gains),
+                        "data": self._step_buffer})
+
+    def close(self):
+        pass
+
+
+class RadarService():
+    """
+    Serves the requests of RadarClient with one MyB210 object, one client connection at a time.
+
+    requests:
+        {"cmd": "ping"}
+        {"cmd": "load_table", "file_name": ...}
+        {"cmd": "save_table", "file_name": ...}
+        {"cmd": "calibrate", "center_freqs": ..., "txA_gain": ..., "txB_gain": ..., "target_rxA_amp": ...,
+                             "target_rxB_amp": ..., "amp_tolerence": ..., "joint": True}
+        {"cmd": "recalibrate", "center_freqs": None, "amp_tolerence": None}
+        {"cmd": "sweep", "center_freqs": ..., "txA_gain": ..., "txB_gain": ..., "timed": False,
+                         "optimize_order": False, "response": False}
+        {"cmd": "shutdown"}
+    """
+
+    def __init__(self, B210, address=DEFAULT_ADDRESS, authkey=None, tx_data=None):
+        """
+        :param B210: the MyB210 object to serve
+        :param address: the (host, port) to listen on
+        :param authkey: the key the clients must know; None uses load_authkey()
+        :param tx_data: the tx signal of the sweeps and calibrations; None uses a compact tone of MyB210.ToneFreq
+        """
+        self.B210 = B210
+        self.address = address
+        self.authkey = load_authkey() if authkey is None else authkey
+        if tx_data is None:
+            tx_data, _ = complex_sinusoid(B210.samp_rate, wave_freq=B210.ToneFreq, compact=True,
+                                          cpu_format=B210.cpu_format)
+        self.tx_data = tx_data
+        self._running = False
+        self._handlers = {
+            "ping": self._ping,
+            "load_table": self._load_table,
+            "save_table": self._save_table,
+            "calibrate": self._calibrate,
+            "recalibrate": self._recalibrate,
+            "sweep": self._sweep,
+            "shutdown": self._shutdown,
+        }
+
+    def serve_forever(self):
+        """
+        accept clients and serve their requests until a shutdown request
+        """
+        self._running = True
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print("radar service listening on {}:{}".format(*self.address))
+            while self._running:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    print("radar service: refusing a client: {}".format(e))
+                    continue
+                with conn:
+                    self._serve_client(conn)
+        print("radar service stopped")
+
+    def _serve_client(self, conn):
+        """
+        serve the requests of one client until it goes away; nothing a client sends or fails to receive stops
+        the service
+        """
+        while self._running:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return  # the client went away
+            except Exception as e:
+                print("radar service: dropping a client after an unreadable request: {}".format(e))
+                return
+            try:
+                if not isinstance(request, dict):
+                    raise Exception('a request should be a dictionary, not {}'.format(type(request).__name__))
+                handler = self._handlers.get(request.get("cmd"))
+                if handler is None:
+                    raise Exception('unknown request {}'.format(request.get("cmd")))
+                reply = handler(conn, request)
+            except Exception as e:
+                reply = {"error": str(e)}
+            finally:
+                if self.B210.transmit_flag:
+                    self.B210.stop_transmit()
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                return  # the client went away, e.g. in the middle of a sweep
+
+    def _ping(self, conn, request):
+        return {"device": self.B210.usrp.get_pp_string(), "gain_table_updated": self.B210.gain_table_updated_flag}
+
+    def _load_table(self, conn, request):
+        self.B210.load_gain_table(request["file_name"])
+        return {"num_freqs": len(self.B210.gain_table)}
+
+    def _save_table(self, conn, request):
+        self.B210.save_gain_table(request["file_name"])
+        return {"num_freqs": len(self.B210.gain_table)}
+
+    def _gain_table_reply(self):
+        gain_table = self.B210.gain_table
+        return {"center_freqs": gain_table.center_freqs, "rx_gains": gain_table.rx_gains, "attrs": gain_table.attrs}
+
+    def _calibrate(self, conn, request):
+        self.B210.thread_send_data(self.tx_data)
+        self.B210.get_gains_for_all_freqs(request["center_freqs"], request["txA_gain"], request["txB_gain"],
+                                          request["target_rxA_amp"], request["target_rxB_amp"],
+                                          request["amp_tolerence"], joint=request.get("joint", True))
+        self.B210.stop_transmit()
+        return self._gain_table_reply()
+
+    def _recalibrate(self, conn, request):
+        self.B210.thread_send_data(self.tx_data)
+        patched_freqs = self.B210.recalibrate_gain_table(request.get("center_freqs"), request.get("amp_tolerence"))
+        self.B210.stop_transmit()
+        reply = self._gain_table_reply()
+        reply["patched_freqs"] = np.asarray(patched_freqs)
+        return reply
+
+    def _sweep(self, conn, request):
+        center_freqs = np.sort(np.asarray(request["center_freqs"], dtype=np.float64))
+        txA_gain, txB_gain = request["txA_gain"], request["txB_gain"]
+        optimize_order = request.get("optimize_order", False)
+
+        if request.get("response", False):
+            sfcw_response, center_freqs = self.B210.sfcw_seep_response(self.tx_data, center_freqs, txA_gain, txB_gain,
+                                                                        optimize_order=optimize_order)
+            return {"done": True, "center_freqs": center_freqs, "response": sfcw_response,
+                    "sweep_stats": self.B210.sweep_stats}
+
+        writer = ConnectionSweepWriter(conn, center_freqs, self.B210.num_rx_samps, dtype=self.B210.host_dtype)
+        if request.get("timed", False):
+            self.B210.sfcw_seep_timed(self.tx_data, center_freqs, txA_gain, txB_gain, writer=writer,
+                                      optimize_order=optimize_order)
+        else:
+            self.B210.sfcw_seep(self.tx_data, center_freqs, txA_gain, txB_gain, writer=writer,
+                                optimize_order=optimize_order)
+        return {"done": True, "center_freqs": center_freqs, "sweep_stats": self.B210.sweep_stats}
+
+    def _shutdown(self, conn, request):
+        self._running = False
+        return {"done": True}
+
+
+class RadarClient():
+    """
+    The client side of RadarService; every method sends one request and waits for its reply.
+    A failed request raises an Exception with the message of the service.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None):
+        """
+        :param address: the (host, port) of the service
+        :param authkey: the key of the service; None uses load_authkey(), the key file of this user
+        """
+        self.conn = Client(address, authkey=load_authkey() if authkey is None else authkey)
+        self.last_sweep = None  # the final message of the last sweep, with its "sweep_stats"
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _recv(self):
+        reply = self.conn.recv()
+        if "error" in reply:
+            raise Exception('radar service: {}'.format(reply["error"]))
+        return reply
+
+    def request(self, cmd, **params):
+        """
+        :return: the reply dictionary of the request {"cmd": cmd, **params}
+        """
+        self.conn.send(dict(params, cmd=cmd))
+        return self._recv()
+
+    def ping(self):
+        return self.request("ping")
+
+    def load_gain_table(self, file_name):
+        return self.request("load_table", file_name=file_name)
+
+    def save_gain_table(self, file_name):
+        return self.request("save_table", file_name=file_name)
+
+    def calibrate(self, center_freqs, txA_gain, txB_gain, target_rxA_amp, target_rxB_amp, amp_tolerence, joint=True):
+        """
+        :return: the reply with the new gain table: "center_freqs", "rx_gains", "attrs"
+        """
+        return self.request("calibrate", center_freqs=np.asarray(center_freqs), txA_gain=txA_gain, txB_gain=txB_gain,
+                            target_rxA_amp=target_rxA_amp, target_rxB_amp=target_rxB_amp,
+                            amp_tolerence=amp_tolerence, joint=joint)
+
+    def recalibrate(self, center_freqs=None, amp_tolerence=None):
+        """
+        :return: the reply with the patched gain table and "patched_freqs"
+        """
+        return self.request("recalibrate", center_freqs=center_freqs, amp_tolerence=amp_tolerence)
+
+    def iter_sweep(self, center_freqs, txA_gain, txB_gain, timed=False, optimize_order=False):
+        """
+        run a sweep and yield its steps as they arrive; the generator has to be run to the end
+        :return: a generator of (i, center_freq, rx_gains, rx_data), where i is the index of the step in the sorted
+                 center_freqs and rx_data the 2 by num_rx_samps rx data of the step
+        """
+        self.conn.send({"cmd": "sweep", "center_freqs": np.asarray(center_freqs), "txA_gain": txA_gain,
+                        "txB_gain": txB_gain, "timed": timed, "optimize_order": optimize_order})
+        while True:
+            reply = self._recv()
+            if reply.get("done"):
+                self.last_sweep = reply
+                return
+            yield reply["step"], reply["center_freq"], reply["rx_gains"], reply["data"]
+
+    def sweep(self, center_freqs, txA_gain, txB_gain, timed=False, optimize_order=False, out=None):
+        """
+        run a sweep and collect it like MyB210.sfcw_seep()
+
+        :param out: None, or a len(center_freqs) by 2 by num_rx_samps buffer to receive into
+        :return: sfcw_rx_signal, center_freqs, rx_gains
+                 center_freqs sorted ascending and rx_gains the len(center_freqs) by 2 rx gains of the steps
+        """
+        center_freqs = np.sort(np.asarray(center_freqs, dtype=np.float64))
+        rx_gains = np.empty((center_freqs.size, 2))
+        for i, center_freq, step_rx_gains, rx_data in self.iter_sweep(center_freqs, txA_gain, txB_gain, timed,
+                                                                       optimize_order):
+            if out is None:
+                out = np.empty((center_freqs.size,) + rx_data.shape, dtype=rx_data.dtype)
+            out[i] = rx_data
+            rx_gains[i] = step_rx_gains
+        return out, center_freqs, rx_gains
+
+    def sweep_response(self, center_freqs, txA_gain, txB_gain, optimize_order=False):
+        """
+        :return: sfcw_response, center_freqs, see MyB210.sfcw_seep_response()
+        """
+        reply = self.request("sweep", center_freqs=np.asarray(center_freqs), txA_gain=txA_gain, txB_gain=txB_gain,
+                             optimize_order=optimize_order, response=True)
+        self.last_sweep = reply
+        return reply["response"], reply["center_freqs"]
+
+    def shutdown(self):
+        """
+        stop the service after this request
+        """
+        return self.request("shutdown")
@@ -0,0 +1,71 @@
+"""
+sc16 host buffers: I/Q samples as two int16 numbers, 4 bytes per sample instead of the 8 bytes of complex64
+
+The B210 sends sc16 over the wire anyway. With the "sc16" cpu format UHD copies the samples to the host buffers as
+they are, instead of converting every sample to complex64, so a capture or a stored sweep takes half the memory and
+the host does no conversion work while streaming. The samples are converted to complex64 only where the processing
+needs floats (to_complex64()).
+
+An sc16 buffer is a numpy array of the structured dtype SC16 with the fields "i" and "q", so it has the same shape
+as the complex64 buffer it replaces (2 by N for a capture); full scale 32767 is the amplitude 1.0 of complex64.
+"""
+import numpy as np
+
+SC16 = np.dtype([("i", np.int16), ("q", np.int16)])
+FULL_SCALE = 32767
+
+
+def host_dtype(cpu_format):
+    """
+    :param cpu_format: the cpu format of the streamers, "fc32" or "sc16"
+    :return: the numpy dtype of the host buffers, np.complex64 or SC16
+    """
+    if cpu_format == "fc32":
+        return np.dtype(np.complex64)
+    if cpu_format == "sc16":
+        return SC16
+    raise Exception('unsupported cpu format {}, use "fc32" or "sc16"'.format(cpu_format))
+
+
+def to_complex64(data, out=None):
+    """
+    :param data: an sc16 array; a complex array is returned as it is (or copied into out)
+    :param out: None, or a complex64 array of the shape of data to convert into
+    :return: data as complex64, scaled so that FULL_SCALE is 1.0
+    """
+    if data.dtype != SC16:
+        if out is None:
+            return data
+        out[...] = data
+        return out
+    if out is None:
+        out = np.empty(data.shape, dtype=np.complex64)
+    iq = out.view(np.float32).reshape(data.shape + (2,))
+    np.multiply(data["i"], np.float32(1 / FULL_SCALE), out=iq[..., 0])
+    np.multiply(data["q"], np.float32(1 / FULL_SCALE), out=iq[..., 1])
+    return out
+
+
+def from_complex64(data, out=None):
+    """
+    :param data: a complex array with amplitudes up to 1.0; the I and Q parts are clipped to [-1, 1]
+    :param out: None, or an sc16 array of the shape of data to convert into
+    :return: data as sc16
+    """
+    if out is None:
+        out = np.empty(data.shape, dtype=SC16)
+    for field, part in (("i", data.real), ("q", data.imag)):
+        out[field] = np.rint(np.clip(part, -1.0, 1.0) * FULL_SCALE)
+    return out
+
+
+def conjugate_in_place(data):
+    """
+    take the complex conjugate of a complex64 or an sc16 array in place
+    """
+    if data.dtype != SC16:
+        np.conjugate(data, out=data)
+        return
+    q = data["q"]
+    np.maximum(q, -FULL_SCALE, out=q)  # -32768 has no positive int16
+    np.negative(q, out=q)
@@ -1,48 +1,102 @@
 """
 Generating signals for transmitting
+
+Every generator returns tx_data, length_wave_one_period, where tx_data is a numpy array with dimension 2 by N of
+complex64 numbers: the first row of I/Q data is going to be sent to txA buffer and the second row of I/Q data is
+going to be sent to txB buffer. The waveform is conjugated to satisfy the complex signal model for I/Q modulator
+and demodulator.
+
+cpu_format="sc16" returns tx_data as int16 I/Q (utils/sc16.py) for a MyB210 created with cpu_format="sc16", at half
+the memory of complex64.
+
+tx_data holds num_periods periods of the waveform. The tx thread sends tx_data over and over, so a compact
+tx_data (compact=True: a single period) transmits the same signal with a fraction of the memory.
 """
 import numpy as np
+from math import gcd
+
+from utils.sc16 import from_complex64
+
+
+def _tx_data_from_one_period(wave_one_period, num_periods, compact, cpu_format="fc32"):
+    """
+    :param wave_one_period: one period of the waveform, complex
+    :return: tx_data, length_wave_one_period
+    """
+    if compact:
+        num_periods = 1
+    # conjugate the single period first, then one np.tile makes the only full-size allocation
+    wave_one_period = np.conjugate(wave_one_period.astype(np.complex64))
+    if cpu_format == "sc16":
+        wave_one_period = from_complex64(wave_one_period)
+    elif cpu_format != "fc32":
+        raise Exception('unsupported cpu format {}, use "fc32" or "sc16"'.format(cpu_format))
+    tx_data = np.tile(wave_one_period, (2, num_periods))  # since we have two channels to transmit
+    return tx_data, wave_one_period.size
+
 
-def complex_sinusoid(samp_rate, wave_ampl = 0.8, wave_freq = 1000):
+def complex_sinusoid(samp_rate, wave_ampl = 0.8, wave_freq = 1000, num_periods = 10000, compact = False,
+                     cpu_format = "fc32"):
     """
     :param samp_rate: the sample rate of the DAC in the B210
     :param wave_ampl: amplitude of the complex sinusoid
     :param wave_freq: the frequency of the complex sinusoid
+    :param num_periods: the number of periods in tx_data
+    :param compact: True returns a single period, for the tx thread to send repeatedly
+    :param cpu_format: "fc32" returns complex64 numbers, "sc16" int16 I/Q numbers (see utils/sc16.py)
     :return: the baseband signal that is going to be sent to B210 tx buffers.
              the baseband signal is sotred in a numpy array with dimension 2 by N, where the elements are
              complex64 and the first row of I/Q data is going to be sent to txA buffer and the second row of
              I/Q data is going to be sent to txB buffer
     """
-    channel_list = (0, 1)
-    # generate the tx baseband waveform
-    waveforms = {
-        "complex_exp": lambda n, tone_freq, samp_rate: np.exp(
-            n * 2j * np.pi * tone_freq / samp_rate
-        )
-        # a function that take the n-th sample as input and output the function value exp(2*pi*tone_freq*n*1/samp_freq)
-    }
-    # prepare tx data, tx metadata
-
-    wave_one_period = np.array(
-        list(
-            map(
-                lambda n: wave_ampl * waveforms["complex_exp"](n, wave_freq, samp_rate),
-                np.arange(int(np.floor(samp_rate / wave_freq)), dtype=np.complex64),
-            )
-        ),
-        dtype=np.complex64,
-    )  # create one period of the wave_form
-
-    tx_data = np.tile(
-        wave_one_period, (1, 10000)
-    )  # send 10,000 period of the wave; the send data should be a row vector?
-    tx_data = np.tile(
-        tx_data[0], (len(channel_list), 1)
-    )  # since we have two channels to transmit, we tile tx_data
-
-    # prepare the complex conjugate tx_data
-    tx_data = np.conjugate(tx_data) # take conjugate to satisfy the complex signal model for I/Q modulator and demodulator
-
-    length_wave_one_period = wave_one_period.size
-
-    return tx_data, length_wave_one_period
+    # create one period of the wave_form: exp(2*pi*tone_freq*n*1/samp_freq)
+    n = np.arange(int(np.floor(samp_rate / wave_freq)))
+    wave_one_period = wave_ampl * np.exp(2j * np.pi * wave_freq / samp_rate * n)
+
+    return _tx_data_from_one_period(wave_one_period, num_periods, compact, cpu_format)
+
+
+def multi_tone(samp_rate, wave_freqs, wave_ampl = 0.8, num_periods = 100, compact = False, cpu_format = "fc32"):
+    """
+    A sum of complex sinusoids with equal amplitudes.
+
+    :param samp_rate: the sample rate of the DAC in the B210
+    :param wave_freqs: the tone frequencies in Hz; integers, so that the sum has a period
+    :param wave_ampl: the peak amplitude of the sum, every tone gets wave_ampl / len(wave_freqs)
+    :param num_periods: the number of periods in tx_data
+    :param compact: True returns a single period, for the tx thread to send repeatedly
+    :param cpu_format: "fc32" or "sc16", see complex_sinusoid()
+    :return: tx_data, length_wave_one_period; see complex_sinusoid()
+    """
+    wave_freqs = np.asarray(wave_freqs, dtype=np.int64)
+    # the sum repeats after samp_rate / gcd(wave_freqs) samples
+    base_freq = 0
+    for f in wave_freqs:
+        base_freq = gcd(base_freq, abs(int(f)))
+    n = np.arange(int(np.floor(samp_rate / base_freq)))
+    phases = 2 * np.pi / samp_rate * np.outer(wave_freqs, n)
+    wave_one_period = wave_ampl / len(wave_freqs) * np.exp(1j * phases).sum(axis=0)
+
+    return _tx_data_from_one_period(wave_one_period, num_periods, compact, cpu_format)
+
+
+def chirp(samp_rate, start_freq, stop_freq, chirp_time, wave_ampl = 0.8, num_periods = 100, compact = False,
+          cpu_format = "fc32"):
+    """
+    A linear frequency sweep of a complex sinusoid from start_freq to stop_freq, repeated every chirp_time.
+
+    :param samp_rate: the sample rate of the DAC in the B210
+    :param start_freq: the baseband frequency at the start of the chirp in Hz, can be negative
+    :param stop_freq: the baseband frequency at the end of the chirp in Hz
+    :param chirp_time: the length of one chirp in seconds
+    :param wave_ampl: amplitude of the chirp
+    :param num_periods: the number of chirps in tx_data
+    :param compact: True returns a single chirp, for the tx thread to send repeatedly
+    :param cpu_format: "fc32" or "sc16", see complex_sinusoid()
+    :return: tx_data, length_wave_one_period; see complex_sinusoid()
+    """
+    t = np.arange(int(np.floor(samp_rate * chirp_time))) / samp_rate
+    sweep_rate = (stop_freq - start_freq) / chirp_time
+    wave_one_period = wave_ampl * np.exp(2j * np.pi * (start_freq * t + 0.5 * sweep_rate * t ** 2))
+
+    return _tx_data_from_one_period(wave_one_period, num_periods, compact, cpu_format)
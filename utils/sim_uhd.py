@@ -0,0 +1,667 @@
+"""
+A simulated USRP B210 that runs in-process, without UHD and without hardware.
+
+SimMultiUSRP mimics the parts of uhd.usrp.MultiUSRP that MyB210 uses, so the sweep, the gain tuning and
+the benchmarks can run on a laptop or in CI:
+
+    from utils.sim_uhd import SimMultiUSRP
+    B210 = MyB210(samp_rate, master_clock_rate, tx_bandwidth, rx_bandwidth, usrp=SimMultiUSRP())
+
+The simulated device models
+    1) the LO lock delay after every retune, which grows with the size of the frequency jump (the lock model of
+       utils/freq_plan.RetuneCostModel, which the sweep planner uses too)
+    2) a frequency dependent path gain for each channel, so the good rx gain changes with frequency
+    3) the rx/tx gains in dB, additive receiver noise and ADC clipping at full scale
+    4) recv/send calls that take num_samps / samp_rate seconds, like the real 2-channel streamers,
+       and tx underflow / burst ack async messages
+    5) timed commands: gain and frequency changes issued after set_command_time() take effect at that time
+
+time_scale < 1 runs the whole device faster than real time (the device clock, the lock delays and the
+streaming all speed up together), which keeps long sweeps short in CI.
+
+libpyuhd mirrors the uhd.libpyuhd types (time_spec, tune_request, stream_cmd, ...) for machines where UHD
+is not installed, and MyB210 uses it there. The simulated device writes its results into the metadata objects of
+libpyuhd only: the fields of the real uhd metadata are read-only, so recv() raises on them instead of leaving the
+error code unset.
+"""
+import heapq
+import itertools
+import time
+import threading
+from collections import deque
+from enum import Enum
+from types import SimpleNamespace
+
+import numpy as np
+
+from utils.freq_plan import RetuneCostModel
+from utils.sc16 import from_complex64, to_complex64
+
+
+###################################################################################################################
+# Stand-ins for the uhd.libpyuhd types
+###################################################################################################################
+def _real_secs(t):
+    """
+    :param t: a time_spec like object, or a number of seconds
+    :return: the time in seconds as a float
+    """
+    if hasattr(t, "get_real_secs"):
+        return t.get_real_secs()
+    return float(t)
+
+
+def _enum_name(value):
+    """
+    works for both python Enum members and the pybind11 enums in uhd.libpyuhd
+    """
+    return getattr(value, "name", str(value).rsplit(".", 1)[-1])
+
+
+class TimeSpec():
+    def __init__(self, secs=0.0):
+        self._secs = float(secs)
+
+    def get_real_secs(self):
+        return self._secs
+
+    def get_full_secs(self):
+        return int(np.floor(self._secs))
+
+    def get_frac_secs(self):
+        return self._secs - np.floor(self._secs)
+
+    def __add__(self, other):
+        return TimeSpec(self._secs + _real_secs(other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return TimeSpec(self._secs - _real_secs(other))
+
+    def __repr__(self):
+        return "TimeSpec({})".format(self._secs)
+
+
+class TuneRequest():
+    def __init__(self, target_freq, lo_off=0.0):
+        self.target_freq = float(target_freq)
+        self.lo_off = lo_off
+
+
+class StreamMode(Enum):
+    start_cont = 97
+    stop_cont = 111
+    num_done = 100
+    num_more = 109
+
+
+class StreamCmd():
+    def __init__(self, stream_mode):
+        self.stream_mode = stream_mode
+        self.num_samps = 0
+        self.stream_now = True
+        self.time_spec = TimeSpec(0.0)
+
+
+class StreamArgs():
+    def __init__(self, cpu_format="", otw_format=""):
+        self.cpu_format = cpu_format
+        self.otw_format = otw_format
+        self.args = ""
+        self.channels = [0]
+
+
+class SubdevSpec():
+    def __init__(self, markup=""):
+        self.markup = markup
+
+    def to_string(self):
+        return self.markup
+
+
+class RXMetadataErrorCode(Enum):
+    none = 0x0
+    timeout = 0x1
+    late = 0x2
+    broken_chain = 0x4
+    overflow = 0x8
+    alignment = 0xC
+    bad_packet = 0xF
+
+
+class RXMetadata():
+    def __init__(self):
+        self.has_time_spec = False
+        self.time_spec = TimeSpec(0.0)
+        self.more_fragments = False
+        self.fragment_offset = 0
+        self.start_of_burst = False
+        self.end_of_burst = False
+        self.error_code = RXMetadataErrorCode.none
+        self.out_of_sequence = False
+
+
+class TXMetadata():
+    def __init__(self):
+        self.has_time_spec = False
+        self.time_spec = TimeSpec(0.0)
+        self.start_of_burst = False
+        self.end_of_burst = False
+
+
+class TXMetadataEventCode(Enum):
+    burst_ack = 0x1
+    underflow = 0x2
+    seq_error = 0x4
+    time_error = 0x8
+    underflow_in_packet = 0x10
+    seq_error_in_burst = 0x20
+    user_payload = 0x40
+
+
+class TXAsyncMetadata():
+    def __init__(self):
+        self.channel = 0
+        self.has_time_spec = False
+        self.time_spec = TimeSpec(0.0)
+        self.event_code = TXMetadataEventCode.burst_ack
+
+
+class SensorValue():
+    def __init__(self, name, value, unit=""):
+        self.name = name
+        self.value = value
+        self.unit = unit
+
+    def to_bool(self):
+        return bool(self.value)
+
+    def to_real(self):
+        return float(self.value)
+
+
+libpyuhd = SimpleNamespace(
+    types=SimpleNamespace(
+        time_spec=TimeSpec,
+        tune_request=TuneRequest,
+        stream_mode=StreamMode,
+        stream_cmd=StreamCmd,
+        rx_metadata=RXMetadata,
+        rx_metadata_error_code=RXMetadataErrorCode,
+        tx_metadata=TXMetadata,
+        tx_async_metadata=TXAsyncMetadata,
+        tx_metadata_event_code=TXMetadataEventCode,
+        sensor_value=SensorValue,
+    ),
+    usrp=SimpleNamespace(
+        stream_args=StreamArgs,
+        subdev_spec=SubdevSpec,
+    ),
+)
+
+
+def _set_md(metadata, **fields):
+    """
+    fill in a rx metadata or tx async metadata object of libpyuhd
+    """
+    if not isinstance(metadata, (RXMetadata, TXAsyncMetadata)):
+        raise Exception('the simulated device needs the metadata types of utils.sim_uhd.libpyuhd, got {}'.format(
+            type(metadata)))
+    for key, value in fields.items():
+        setattr(metadata, key, value)
+
+
+###################################################################################################################
+# The simulated device
+###################################################################################################################
+class _SimClock():
+    """
+    the device clock; it runs 1 / time_scale times faster than the host clock
+    """
+    def __init__(self, time_scale):
+        self.time_scale = time_scale
+        self._t0 = time.monotonic()
+        self._offset = 0.0
+
+    def now(self):
+        return (time.monotonic() - self._t0) / self.time_scale + self._offset
+
+    def set_now(self, secs):
+        self._t0 = time.monotonic()
+        self._offset = secs
+
+    def sleep_until(self, secs):
+        delay = secs - self.now()
+        if delay > 0:
+            time.sleep(delay * self.time_scale)
+
+
+class _SimLO():
+    """
+    one AD9361 synthesizer: both rx channels share the rx LO and both tx channels share the tx LO
+    """
+    def __init__(self):
+        self.freq = None
+        self.locked_at = 0.0
+
+
+class SimMultiUSRP():
+    """
+    An in-process stand-in for uhd.usrp.MultiUSRP("type = b200") with 2 rx and 2 tx channels.
+    """
+    MaxRxGain = 76.0
+    RxGainStep = 1.0
+    MaxTxGain = 89.75
+    TxGainStep = 0.25
+
+    def __init__(self, args="type = b200", time_scale=1.0, seed=0, noise_rms=1e-3,
+                 lock_time_base=None, lock_time_per_ghz=None, lock_time_band_cross=None,
+                 target_ranges=(1.5, 2.1)):
+        """
+        :param args: the device args string, only kept for get_pp_string()
+        :param time_scale: host seconds per device second; 1.0 is real time, 0.01 runs 100 times faster
+        :param seed: the seed of the channel model and of the noise
+        :param noise_rms: rms of the complex receiver noise, in full-scale units
+        :param lock_time_base: the LO lock delay of a retune with a tiny frequency jump, in seconds
+        :param lock_time_per_ghz: the extra lock delay per GHz of frequency jump, in seconds
+        :param lock_time_band_cross: the extra lock delay when the LO crosses a divider band edge (a full VCO
+                                     calibration), in seconds
+                                     the LO's lock by utils/freq_plan.RetuneCostModel with these lock times (None
+                                     uses its defaults) and a +-10% jitter, so the sweep planner shares the model
+        :param target_ranges: the round trip path length / 2 of channelA and channelB in meters;
+                              sets the phase slope of the simulated channel over frequency
+        """
+        self.args = args
+        self.noise_rms = noise_rms
+        self.lock_model = RetuneCostModel(lock_time_base, lock_time_per_ghz, lock_time_band_cross)
+        self.target_ranges = np.asarray(target_ranges, dtype=np.float64)
+
+        self._clock = _SimClock(time_scale)
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+        self._command_time = None
+        self._events = []   # a heap of timed commands: (device time, sequence number, action, args)
+        self._event_ids = itertools.count()
+
+        self.master_clock_rate = 16e6
+        self.clock_source = "internal"
+        self.rx_rate = 1e6
+        self.tx_rate = 1e6
+        self.rx_bandwidth = [56e6, 56e6]
+        self.tx_bandwidth = [56e6, 56e6]
+        self.rx_gain = [0.0, 0.0]
+        self.tx_gain = [0.0, 0.0]
+        self.rx_lo = _SimLO()
+        self.tx_lo = _SimLO()
+
+        # the channel model: a path loss falling with frequency plus a per-channel ripple and offset
+        self._ripple_phase = self._rng.uniform(0, 2 * np.pi, 2)
+        self._channel_offset_db = np.array([0.0, -3.0]) + self._rng.uniform(-1.0, 1.0, 2)
+
+        self._tx_streamer = None
+        # the rx samples received while an LO was still locking, per channel; a sweep that captures before the
+        # lock (e.g. with a too short settle time) counts them, a correct one does not
+        self.num_unlocked_samps = 0
+
+    # the simulated channel ------------------------------------------------------------------------------------
+    def path_gain_db(self, freq, channel):
+        """
+        :param freq: the RF frequency in Hz, a number or a numpy array
+        :param channel: 0 for channelA, 1 for channelB
+        :return: the tx-to-rx path gain in dB at 0 dB rx gain and maximum tx gain
+        """
+        freq = np.asarray(freq, dtype=np.float64)
+        ripple = 2.5 * np.sin(2 * np.pi * freq / 410e6 + self._ripple_phase[channel])
+        return -28.0 - 36.0 * (freq - 500e6) / 2.5e9 + ripple + self._channel_offset_db[channel]
+
+    def channel_response(self, freq, channel, tx_gain=None, rx_gain=None):
+        """
+        :return: the complex baseband gain from the tx streamer to the rx streamer at freq,
+                 with the given (or the current) tx/rx gains of the channel
+        """
+        tx_gain = self.tx_gain[channel] if tx_gain is None else tx_gain
+        rx_gain = self.rx_gain[channel] if rx_gain is None else rx_gain
+        gain_db = self.path_gain_db(freq, channel) + rx_gain + tx_gain - SimMultiUSRP.MaxTxGain
+        delay = 2 * self.target_ranges[channel] / 299792458.0
+        # the streamers see the conjugate of the I/Q model signal, see sfcw_seep() in MyB210
+        return 10 ** (gain_db / 20) * np.exp(2j * np.pi * np.asarray(freq) * delay)
+
+    def _lock_delay(self, old_freq, new_freq):
+        if old_freq is None:
+            return self.lock_model.cost(None, new_freq)
+        return self.lock_model.cost(old_freq, new_freq) * self._rng.uniform(0.9, 1.1)
+
+    # timed commands -------------------------------------------------------------------------------------------
+    def set_command_time(self, time_spec, mboard=0):
+        self._command_time = _real_secs(time_spec)
+
+    def clear_command_time(self, mboard=0):
+        self._command_time = None
+
+    def _command(self, action, *args):
+        """
+        apply a settings change now, or queue it for the command time given to set_command_time()
+        """
+        with self._lock:
+            if self._command_time is None:
+                now = self._clock.now()
+                self._run_events(now)
+                action(now, *args)
+            else:
+                heapq.heappush(self._events, (self._command_time, next(self._event_ids), action, args))
+
+    def _run_events(self, until):
+        """
+        apply the queued timed commands up to the device time until
+        """
+        with self._lock:
+            while self._events and self._events[0][0] <= until:
+                event_time, _, action, args = heapq.heappop(self._events)
+                action(event_time, *args)
+
+    def _sync(self):
+        self._run_events(self._clock.now())
+
+    def _retune(self, event_time, lo, freq):
+        if lo.freq == freq:
+            return  # the AD9361 driver skips a retune to the frequency it is already at
+        lo.locked_at = event_time + self._lock_delay(lo.freq, freq)
+        lo.freq = freq
+
+    def _apply_gain(self, event_time, gains, gain, chan):
+        gains[chan] = gain
+
+    # clocks, rates, bandwidths --------------------------------------------------------------------------------
+    def get_pp_string(self):
+        return "Simulated B210 ({}), 2 rx / 2 tx channels".format(self.args)
+
+    def set_clock_source(self, source, mboard=0):
+        self.clock_source = source
+
+    def set_master_clock_rate(self, rate, mboard=0):
+        self.master_clock_rate = rate
+
+    def get_master_clock_rate(self, mboard=0):
+        return self.master_clock_rate
+
+    def set_rx_subdev_spec(self, spec, mboard=0):
+        pass
+
+    def set_tx_subdev_spec(self, spec, mboard=0):
+        pass
+
+    def get_time_now(self, mboard=0):
+        return TimeSpec(self._clock.now())
+
+    def set_time_now(self, time_spec, mboard=0):
+        self._clock.set_now(_real_secs(time_spec))
+
+    def set_rx_rate(self, rate, chan=0):
+        self.rx_rate = rate
+
+    def get_rx_rate(self, chan=0):
+        return self.rx_rate
+
+    def set_tx_rate(self, rate, chan=0):
+        self.tx_rate = rate
+
+    def get_tx_rate(self, chan=0):
+        return self.tx_rate
+
+    def set_rx_bandwidth(self, bandwidth, chan=0):
+        self.rx_bandwidth[chan] = bandwidth
+
+    def get_rx_bandwidth(self, chan=0):
+        return self.rx_bandwidth[chan]
+
+    def set_tx_bandwidth(self, bandwidth, chan=0):
+        self.tx_bandwidth[chan] = bandwidth
+
+    def get_tx_bandwidth(self, chan=0):
+        return self.tx_bandwidth[chan]
+
+    # gains ----------------------------------------------------------------------------------------------------
+    def set_rx_gain(self, gain, chan=0):
+        gain = np.round(gain / SimMultiUSRP.RxGainStep) * SimMultiUSRP.RxGainStep
+        self._command(self._apply_gain, self.rx_gain, float(np.clip(gain, 0.0, SimMultiUSRP.MaxRxGain)), chan)
+
+    def get_rx_gain(self, chan=0):
+        self._sync()
+        return self.rx_gain[chan]
+
+    def set_tx_gain(self, gain, chan=0):
+        gain = np.round(gain / SimMultiUSRP.TxGainStep) * SimMultiUSRP.TxGainStep
+        self._command(self._apply_gain, self.tx_gain, float(np.clip(gain, 0.0, SimMultiUSRP.MaxTxGain)), chan)
+
+    def get_tx_gain(self, chan=0):
+        self._sync()
+        return self.tx_gain[chan]
+
+    # LO tuning ------------------------------------------------------------------------------------------------
+    def set_rx_freq(self, tune_request, chan=0):
+        self._command(self._retune, self.rx_lo, tune_request.target_freq)
+
+    def get_rx_freq(self, chan=0):
+        self._sync()
+        return self.rx_lo.freq
+
+    def set_tx_freq(self, tune_request, chan=0):
+        self._command(self._retune, self.tx_lo, tune_request.target_freq)
+
+    def get_tx_freq(self, chan=0):
+        self._sync()
+        return self.tx_lo.freq
+
+    def get_rx_sensor_names(self, chan=0):
+        return ["lo_locked", "rssi"]
+
+    def get_tx_sensor_names(self, chan=0):
+        return ["lo_locked"]
+
+    def get_rx_sensor(self, name, chan=0):
+        if name != "lo_locked":
+            raise KeyError("simulated B210 has no rx sensor {}".format(name))
+        self._sync()
+        return SensorValue("LO", self._clock.now() >= self.rx_lo.locked_at)
+
+    def get_tx_sensor(self, name, chan=0):
+        if name != "lo_locked":
+            raise KeyError("simulated B210 has no tx sensor {}".format(name))
+        self._sync()
+        return SensorValue("LO", self._clock.now() >= self.tx_lo.locked_at)
+
+    # streamers ------------------------------------------------------------------------------------------------
+    def get_rx_stream(self, stream_args):
+        return SimRxStreamer(self, list(stream_args.channels), stream_args.cpu_format)
+
+    def get_tx_stream(self, stream_args):
+        self._tx_streamer = SimTxStreamer(self, list(stream_args.channels), stream_args.cpu_format)
+        return self._tx_streamer
+
+    def _rx_samples(self, start_time, num_samps, channels):
+        """
+        :return: a len(channels) by num_samps complex64 array of what the ADCs see from start_time on
+        """
+        self._run_events(start_time)
+        samps = self._rng.standard_normal((len(channels), 2 * num_samps), dtype=np.float32)
+        samps = samps.view(np.complex64) * np.float32(self.noise_rms / np.sqrt(2))
+
+        lock_time = max(self.rx_lo.locked_at, self.tx_lo.locked_at)
+        if self.rx_lo.freq is not None:
+            self.num_unlocked_samps += int(np.clip(np.ceil((lock_time - start_time) * self.rx_rate), 0, num_samps))
+        if self._tx_streamer is not None and self.rx_lo.freq is not None and self.rx_lo.freq == self.tx_lo.freq:
+            sample_times = start_time + np.arange(num_samps) / self.rx_rate
+            valid = sample_times >= lock_time
+            for row, chan in enumerate(channels):
+                tx_samps = self._tx_streamer._samples_at(sample_times, chan)
+                if tx_samps is not None:
+                    h = np.complex64(self.channel_response(self.rx_lo.freq, chan))
+                    samps[row] += np.where(valid, tx_samps * h, np.complex64(0))
+
+        np.clip(samps.view(np.float32), -1.0, 1.0, out=samps.view(np.float32))  # ADC full scale
+        return samps
+
+
+class SimRxStreamer():
+    """
+    The 2-channel rx streamer. recv() returns the samples of the issued stream commands once the device
+    clock has passed the last sample, so a capture of N samples takes N / samp_rate seconds.
+    """
+    MaxNumSamps = 2040
+
+    def __init__(self, device, channels, cpu_format="fc32"):
+        self._device = device
+        self._channels = channels
+        self._sc16 = cpu_format == "sc16"
+        self._commands = deque()
+        self._stream_time = None
+        self._remaining = 0  # samples left in the current burst; None while streaming continuously
+
+    def get_num_channels(self):
+        return len(self._channels)
+
+    def get_max_num_samps(self):
+        return SimRxStreamer.MaxNumSamps
+
+    def issue_stream_cmd(self, stream_cmd):
+        mode = _enum_name(stream_cmd.stream_mode)
+        now = self._device._clock.now()
+        start_time = now if stream_cmd.stream_now else _real_secs(stream_cmd.time_spec)
+        if mode == "stop_cont":
+            self._commands.clear()
+            self._remaining = 0
+            return
+        num_samps = None if mode == "start_cont" else int(stream_cmd.num_samps)
+        self._commands.append((start_time, num_samps, start_time < now))
+
+    def recv(self, buffer, metadata, timeout=0.1):
+        clock = self._device._clock
+        if self._remaining == 0:
+            if not self._commands:
+                time.sleep(timeout)
+                _set_md(metadata, error_code=RXMetadataErrorCode.timeout)
+                return 0
+            start_time, num_samps, late = self._commands.popleft()
+            if late:
+                _set_md(metadata, error_code=RXMetadataErrorCode.late)
+                return 0
+            if (start_time - clock.now()) * clock.time_scale > timeout:
+                self._commands.appendleft((start_time, num_samps, late))
+                time.sleep(timeout)
+                _set_md(metadata, error_code=RXMetadataErrorCode.timeout)
+                return 0
+            self._stream_time = start_time
+            self._remaining = num_samps
+            start_of_burst = True
+        else:
+            start_of_burst = False
+
+        buffer_samps = buffer.shape[-1]
+        num_samps = buffer_samps if self._remaining is None else min(buffer_samps, self._remaining)
+        start_time = self._stream_time
+        self._stream_time = start_time + num_samps / self._device.rx_rate
+        if self._remaining is not None:
+            self._remaining -= num_samps
+
+        # the samples are available once the last one has been digitized
+        clock.sleep_until(self._stream_time)
+        samps = self._device._rx_samples(start_time, num_samps, self._channels)
+        if self._sc16:
+            samps = from_complex64(samps)
+        if buffer.ndim == 1:
+            buffer[:num_samps] = samps[0]
+        else:
+            buffer[:, :num_samps] = samps
+
+        _set_md(metadata, error_code=RXMetadataErrorCode.none, has_time_spec=True, time_spec=TimeSpec(start_time),
+                start_of_burst=start_of_burst, end_of_burst=self._remaining == 0)
+        return num_samps
+
+
+class SimTxStreamer():
+    """
+    The 2-channel tx streamer. send() blocks until no more than TxBufferTime seconds of samples are queued on the
+    device, and the rx side sees what was sent at the time it is played out. A gap between two sends inside a
+    burst is an underflow, reported through recv_async_msg() like on the real device.
+    """
+    MaxNumSamps = 2040
+    TxBufferTime = 50e-3
+    NumSegments = 64
+
+    def __init__(self, device, channels, cpu_format="fc32"):
+        self._device = device
+        self._channels = channels
+        self._sc16 = cpu_format == "sc16"
+        self._segments = deque(maxlen=SimTxStreamer.NumSegments)  # (start time, end time, 2 by N buffer)
+        self._in_burst = False
+        self._sent_until = 0.0    # device time right after the last sent sample
+        self._async_msgs = deque()
+
+    def get_num_channels(self):
+        return len(self._channels)
+
+    def get_max_num_samps(self):
+        return SimTxStreamer.MaxNumSamps
+
+    def _async_event(self, event_code, event_time):
+        async_md = TXAsyncMetadata()
+        async_md.event_code = event_code
+        async_md.has_time_spec = True
+        async_md.time_spec = TimeSpec(event_time)
+        self._async_msgs.append(async_md)
+
+    def send(self, buffer, metadata, timeout=0.1):
+        clock = self._device._clock
+        num_samps = buffer.shape[-1]
+        now = clock.now()
+
+        if self._in_burst and now > self._sent_until:
+            self._async_event(TXMetadataEventCode.underflow, self._sent_until)
+        start_time = max(now, self._sent_until)
+        if getattr(metadata, "has_time_spec", False):
+            start_time = max(start_time, _real_secs(metadata.time_spec))
+
+        if num_samps > 0:
+            self._in_burst = True
+            buffer = buffer if buffer.ndim > 1 else buffer[np.newaxis, :]
+            self._sent_until = start_time + num_samps / self._device.tx_rate
+            self._segments.append((start_time, self._sent_until, buffer))
+
+        if getattr(metadata, "end_of_burst", False):
+            self._in_burst = False
+            self._async_event(TXMetadataEventCode.burst_ack, self._sent_until)
+        clock.sleep_until(self._sent_until - SimTxStreamer.TxBufferTime)
+        return num_samps
+
+    def recv_async_msg(self, async_md, timeout=0.1):
+        """
+        :return: True and fills in async_md if an async message arrived within timeout seconds
+        """
+        deadline = time.monotonic() + timeout
+        while not self._async_msgs:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(min(1e-3, timeout))
+        msg = self._async_msgs.popleft()
+        _set_md(async_md, event_code=msg.event_code, has_time_spec=True, time_spec=msg.time_spec)
+        return True
+
+    def _samples_at(self, sample_times, chan):
+        """
+        :return: the tx samples of channel chan at the device times sample_times, zero where nothing was sent
+        """
+        if not self._segments:
+            return None
+        samps = np.zeros(sample_times.size, dtype=np.complex64)
+        first, last = sample_times[0], sample_times[-1]
+        for start_time, end_time, buffer in list(self._segments):
+            if end_time <= first or start_time > last:
+                continue
+            in_segment = (sample_times >= start_time) & (sample_times < end_time)
+            row = buffer[min(self._channels.index(chan), buffer.shape[0] - 1)]
+            if self._sc16:
+                row = to_complex64(row)
+            index = np.round((sample_times[in_segment] - start_time) * self._device.tx_rate).astype(np.int64)
+            samps[in_segment] = row[np.minimum(index, row.size - 1)]
+        return samps
@@ -0,0 +1,192 @@
+"""
+A survey session: the sfcw sweeps of many survey locations with one MyB210 object
+
+    with SurveySession(B210, "./data/survey_1", tx_data, center_freqs, txA_gain, txB_gain) as session:
+        for location in locations:
+            if session.is_done(location):
+                continue        # done before the survey was interrupted
+            ...                 # move the radar to location
+            session.sweep(location)
+
+The transmitter stays on for the whole session, and the sweeps receive into a few reused sweep buffers. A sweep
+hands its buffer to a background worker pool, which stores it (and runs the optional process() on it) while the
+next location is swept; the buffer goes back to the free buffers after that.
+
+Every location is stored with utils/sweep_writer.NpySweepWriter in <survey_dir>/<location>, so load_sweep() opens
+it; a location name is a single directory name, without path separators and not "." or "..".
+checkpoint.json in survey_dir lists the stored locations: a new session on the same survey_dir resumes the
+survey and is_done() tells which locations to skip.
+"""
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.sweep_writer import NpySweepWriter
+
+
+class SurveySession():
+    """
+    see the module docstring
+
+    the key attributes:
+        self.done_locations : the locations whose data is stored, in the order they finished
+        self.center_freqs : the center freqs of every sweep, sorted ascending
+        self.rx_gains : the rx gains of the last sweep, len(self.center_freqs) by 2; every sweep looks them up in
+                        B210.gain_table, so a table re-calibrated during the survey is used from the next location on
+    """
+
+    def __init__(self, B210, survey_dir, tx_data, center_freqs, txA_gain, txB_gain, num_workers=2, num_buffers=3,
+                 process=None, timed=False, attrs=None):
+        """
+        :param B210: a MyB210 object with a gain table
+        :param survey_dir: the directory of the survey; an existing survey in it is resumed
+        :param tx_data: the tx baseband signal, see utils/signals.py
+        :param center_freqs: the center freqs of every sweep
+        :param txA_gain: channel A transmit gain
+        :param txB_gain: channel B transmit gain
+        :param num_workers: the number of background workers that store the sweeps
+        :param num_buffers: the number of sweep buffers; a sweep waits for a free one when all are being stored
+        :param process: None, or a function process(location, sfcw_rx_signal, center_freqs) run by the worker before
+                        storing; a numpy array it returns is stored as processed.npy next to the sweep
+        :param timed: True sweeps with B210.sfcw_seep_timed() instead of B210.sfcw_seep()
+        :param attrs: a json serializable dictionary stored with every location, like the survey name
+        """
+        self.B210 = B210
+        self.survey_dir = survey_dir
+        self.tx_data = tx_data
+        self.center_freqs = np.sort(np.asarray(center_freqs, dtype=np.float64))
+        self.txA_gain = txA_gain
+        self.txB_gain = txB_gain
+        self.process = process
+        self.timed = timed
+        self.attrs = dict({"txA_gain": txA_gain, "txB_gain": txB_gain, "samp_rate": B210.samp_rate},
+                          **({} if attrs is None else attrs))
+        self.rx_gains = None
+
+        os.makedirs(survey_dir, exist_ok=True)
+        self._checkpoint_path = os.path.join(survey_dir, "checkpoint.json")
+        self.done_locations = []
+        if os.path.exists(self._checkpoint_path):
+            with open(self._checkpoint_path) as f:
+                self.done_locations = json.load(f)["done_locations"]
+            print("resuming the survey in {}: {} locations are done".format(survey_dir, len(self.done_locations)))
+        self._done = set(self.done_locations)
+        self._lock = threading.Lock()
+
+        self._free_buffers = queue.Queue()
+        for _ in range(num_buffers):
+            self._free_buffers.put(B210.sweep_buffer(self.center_freqs))
+        self._pool = ThreadPoolExecutor(max_workers=num_workers)
+        self._futures = []
+
+    def is_done(self, location):
+        return str(location) in self._done
+
+    @staticmethod
+    def check_location(location):
+        """
+        :return: location as a string; raises an exception if it is not a plain directory name
+        """
+        location = str(location)
+        if location in ("", ".", "..") or any(sep in location for sep in ("/", "\\", "\0")):
+            raise Exception('location {!r} should be a plain name, without path separators'.format(location))
+        return location
+
+    def sweep(self, location):
+        """
+        sweep at location and hand the data to the background workers
+
+        :param location: the name of the location, a string (or a number); its data goes to <survey_dir>/<location>
+        """
+        location = SurveySession.check_location(location)
+        self._check_workers()
+        buffer = self._free_buffers.get()  # waits while all the buffers are being stored
+
+        try:
+            rx_gains = self.B210.gain_table.lookup(self.center_freqs, self.B210.gain_interpolation)
+            if self.timed:
+                self.B210.sfcw_seep_timed(self.tx_data, self.center_freqs, self.txA_gain, self.txB_gain, out=buffer,
+                                          keep_tx=True)
+            else:
+                self.B210.sfcw_seep(self.tx_data, self.center_freqs, self.txA_gain, self.txB_gain, out=buffer,
+                                    keep_tx=True)
+        except Exception:
+            self._free_buffers.put(buffer)
+            raise
+        self.rx_gains = rx_gains
+        self._futures.append(self._pool.submit(self._store, location, buffer, rx_gains))
+
+    def run(self, locations, before_sweep=None):
+        """
+        sweep every location that is not done yet
+
+        :param locations: the names of the locations, in survey order
+        :param before_sweep: None, or a function before_sweep(location) called before each sweep, e.g. to wait
+                             until the radar is at location
+        """
+        for location in locations:
+            if self.is_done(location):
+                continue
+            if before_sweep is not None:
+                before_sweep(location)
+            self.sweep(location)
+
+    def _store(self, location, buffer, rx_gains):
+        """
+        the worker job: process and store the sweep in buffer, then free the buffer and checkpoint the location
+        """
+        try:
+            location_dir = os.path.join(self.survey_dir, location)
+            if self.process is not None:
+                processed = self.process(location, buffer, self.center_freqs)
+                if processed is not None:
+                    os.makedirs(location_dir, exist_ok=True)
+                    np.save(os.path.join(location_dir, "processed.npy"), processed)
+            with NpySweepWriter(location_dir, self.center_freqs, buffer.shape[-1], buffer.shape[1],
+                                attrs=dict(self.attrs, location=location), dtype=buffer.dtype) as writer:
+                writer.data[:] = buffer
+                writer.rx_gains[:] = rx_gains
+                writer.written[:] = True
+        finally:
+            self._free_buffers.put(buffer)
+
+        with self._lock:
+            self.done_locations.append(location)
+            self._done.add(location)
+            # write the checkpoint to a temporary file first, so an interruption never leaves a broken one
+            temp_path = self._checkpoint_path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"done_locations": self.done_locations}, f)
+            os.replace(temp_path, self._checkpoint_path)
+
+    def _check_workers(self):
+        """
+        raise the exception of a failed worker job, if any
+        """
+        pending = []
+        for future in self._futures:
+            if not future.done():
+                pending.append(future)
+            elif future.exception() is not None:
+                raise future.exception()
+        self._futures = pending
+
+    def close(self):
+        """
+        wait for the workers to store every sweep and stop the transmitter
+        """
+        if self.B210.transmit_flag:
+            self.B210.stop_transmit()
+        self._pool.shutdown(wait=True)
+        self._check_workers()
+        print("survey in {}: {} locations are done".format(self.survey_dir, len(self.done_locations)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
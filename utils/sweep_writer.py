@@ -0,0 +1,198 @@
+"""
+Streaming on-disk storage for sfcw sweeps.
+
+A sweep writer is handed to MyB210.sfcw_seep(..., writer=writer); the sweep receives every frequency step into
+writer.step_buffer(i) and commits it with writer.write(i, rx_gains) right away, so a sweep is bounded by the disk
+instead of the RAM, and the steps done before a crash are kept on disk.
+
+    NpySweepWriter(dir_path, ...)   a directory of memory-mapped .npy files (no extra dependency):
+                                        data.npy          n_freqs by 2 by num_rx_samps complex64 (or sc16) rx data
+                                        center_freqs.npy  the center freqs of the sweep
+                                        rx_gains.npy      the rx gains used at each center freq, n_freqs by 2
+                                        written.npy       True for the steps that are on disk
+                                        attrs.json        tx gains, sample rate, ... of the sweep
+    Hdf5SweepWriter(file_path, ...) the same datasets in one chunked HDF5 file (needs h5py)
+
+Pass dtype=utils.sc16.SC16 (MyB210.host_dtype of a cpu_format="sc16" device) to store the int16 I/Q samples as they
+come from the device, at half the size.
+
+load_sweep() opens either one again, and export_mat() writes a MATLAB .mat file with the same variables the
+sfcw_radar.py script used to save.
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from utils.sc16 import to_complex64
+
+
+class SweepWriter(ABC):
+    """
+    The interface shared by the sweep writers; see NpySweepWriter and Hdf5SweepWriter. A subclass has to implement
+    step_buffer(), write() and close() before it can be created.
+    """
+
+    def __init__(self, center_freqs, num_rx_samps, num_channels=2, attrs=None, dtype=np.complex64):
+        self.center_freqs = np.asarray(center_freqs, dtype=np.float64)
+        self.shape = (len(self.center_freqs), num_channels, num_rx_samps)
+        self.dtype = np.dtype(dtype)
+        self.attrs = {} if attrs is None else dict(attrs)
+
+    @abstractmethod
+    def step_buffer(self, i):
+        """
+        :return: a num_channels by num_rx_samps numpy array of self.dtype that the sweep receives step i into
+        """
+
+    @abstractmethod
+    def write(self, i, rx_gains):
+        """
+        commit step i: the data in self.step_buffer(i) and the rx gains it was received with
+        """
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class NpySweepWriter(SweepWriter):
+    """
+    Writes a sweep into a directory of memory-mapped .npy files. step_buffer(i) is a view of the memory map, so
+    the sweep receives straight into the file's pages without an extra copy.
+    """
+
+    def __init__(self, dir_path, center_freqs, num_rx_samps, num_channels=2, attrs=None, dtype=np.complex64):
+        """
+        :param dir_path: the directory to write into; it is created if it does not exist and its files are overwritten
+        :param center_freqs: the center freqs of the sweep
+        :param num_rx_samps: the number of rx samples per channel and step
+        :param num_channels: the number of rx channels
+        :param attrs: a json serializable dictionary of sweep parameters, like the tx gains and the sample rate
+        :param dtype: the dtype of the rx data, np.complex64 or utils.sc16.SC16; the dtype of the sweep buffers
+        """
+        super().__init__(center_freqs, num_rx_samps, num_channels, attrs, dtype)
+        self.dir_path = dir_path
+        os.makedirs(dir_path, exist_ok=True)
+
+        np.save(os.path.join(dir_path, "center_freqs.npy"), self.center_freqs)
+        with open(os.path.join(dir_path, "attrs.json"), "w") as f:
+            json.dump(self.attrs, f)
+
+        open_memmap = np.lib.format.open_memmap
+        self.data = open_memmap(os.path.join(dir_path, "data.npy"), mode="w+", dtype=self.dtype, shape=self.shape)
+        self.rx_gains = open_memmap(os.path.join(dir_path, "rx_gains.npy"), mode="w+", dtype=np.float64,
+                                    shape=(self.shape[0], num_channels))
+        self.rx_gains[:] = np.nan
+        self.written = open_memmap(os.path.join(dir_path, "written.npy"), mode="w+", dtype=np.bool_,
+                                   shape=(self.shape[0],))
+
+    def step_buffer(self, i):
+        return self.data[i]
+
+    def write(self, i, rx_gains):
+        # the pages of a memory map survive a crash of the process, only written[i] has to come last
+        self.rx_gains[i] = rx_gains
+        self.written[i] = True
+
+    def close(self):
+        self.data.flush()
+        self.rx_gains.flush()
+        self.written.flush()
+
+
+class Hdf5SweepWriter(SweepWriter):
+    """
+    Writes a sweep into one HDF5 file, with one chunk per frequency step. Needs the h5py package.
+    """
+
+    def __init__(self, file_path, center_freqs, num_rx_samps, num_channels=2, attrs=None, dtype=np.complex64):
+        """
+        :param file_path: the .h5 file to write; it is overwritten if it exists
+        the other parameters are the same as in NpySweepWriter
+        """
+        import h5py  # optional dependency, only needed for HDF5 files
+
+        super().__init__(center_freqs, num_rx_samps, num_channels, attrs, dtype)
+        self.file_path = file_path
+        self._file = h5py.File(file_path, "w")
+        self._file.create_dataset("center_freqs", data=self.center_freqs)
+        self.data = self._file.create_dataset("data", shape=self.shape, dtype=self.dtype,
+                                              chunks=(1,) + self.shape[1:])
+        self.rx_gains = self._file.create_dataset("rx_gains", data=np.full((self.shape[0], num_channels), np.nan))
+        self.written = self._file.create_dataset("written", data=np.zeros(self.shape[0], dtype=np.bool_))
+        for key, value in self.attrs.items():
+            self._file.attrs[key] = value
+
+        self._step_buffer = np.empty(self.shape[1:], dtype=self.dtype)
+
+    def step_buffer(self, i):
+        return self._step_buffer
+
+    def write(self, i, rx_gains):
+        self.data[i] = self._step_buffer
+        self.rx_gains[i] = rx_gains
+        self.written[i] = True
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+def load_sweep(path):
+    """
+    :param path: a directory written by NpySweepWriter or a file written by Hdf5SweepWriter
+    :return: a dictionary with the keys
+            "data": the n_freqs by 2 by num_rx_samps rx data; a read-only memory map for a .npy directory
+            "center_freqs", "rx_gains", "written": numpy arrays
+            "attrs": the dictionary of sweep parameters
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, "attrs.json")) as f:
+            attrs = json.load(f)
+        return {
+            "data": np.load(os.path.join(path, "data.npy"), mmap_mode="r"),
+            "center_freqs": np.load(os.path.join(path, "center_freqs.npy")),
+            "rx_gains": np.load(os.path.join(path, "rx_gains.npy")),
+            "written": np.load(os.path.join(path, "written.npy")),
+            "attrs": attrs,
+        }
+
+    import h5py  # optional dependency, only needed for HDF5 files
+
+    with h5py.File(path, "r") as f:
+        return {
+            "data": f["data"][()],
+            "center_freqs": f["center_freqs"][()],
+            "rx_gains": f["rx_gains"][()],
+            "written": f["written"][()],
+            "attrs": dict(f.attrs),
+        }
+
+
+def export_mat(path, mat_file_path, name):
+    """
+    export a stored sweep into a MATLAB .mat file with the variables
+        channel_data_<name>: the n_freqs by 2 by num_rx_samps rx data, complex (sc16 data is converted)
+        center_freqs, rx_gains
+
+    :param path: a directory written by NpySweepWriter or a file written by Hdf5SweepWriter
+    :param mat_file_path: the .mat file to write
+    :param name: the name of the sweep
+    """
+    import scipy.io
+
+    sweep = load_sweep(path)
+    scipy.io.savemat(mat_file_path, {
+        "channel_data_{}".format(name): to_complex64(np.asarray(sweep["data"])),
+        "center_freqs": sweep["center_freqs"],
+        "rx_gains": sweep["rx_gains"],
+    })
@@ -0,0 +1,161 @@
+"""
+The tx streaming engine used by MyB210 to transmit continuously while receiving
+"""
+try:
+    from uhd import libpyuhd as lib
+except ImportError:
+    # UHD is not installed on this machine: only the simulated device in utils/sim_uhd.py can be used
+    from utils.sim_uhd import libpyuhd as lib
+import numpy as np
+import time
+from threading import Event, Thread
+
+
+class TxEngine():
+    """
+    Sends a tx buffer over and over on a background thread, in chunks, so that stop() returns within one chunk.
+
+    The first chunk starts a burst and stop() ends it with an end-of-burst packet. A second thread counts the async
+    messages of the tx streamer (underflows, sequence errors, ...), see self.stats().
+
+    usage:
+        tx_engine = TxEngine(tx_streamer, samp_rate)
+        tx_engine.start(tx_data)
+        ...
+        tx_engine.stop()
+        tx_engine.stats()
+    """
+    # the length of a chunk in seconds of samples
+    ChunkTime = 10e-3
+    # how long the async message thread waits for a message per call, in seconds
+    AsyncTimeout = 10e-3
+
+    def __init__(self, tx_streamer, samp_rate, chunk_size=None):
+        """
+        :param tx_streamer: the tx streamer of the device
+        :param samp_rate: the tx sample rate, used for the chunk size and the achieved sample rate
+        :param chunk_size: the number of samples per send() call; None sends ChunkTime seconds of samples
+        """
+        self.tx_streamer = tx_streamer
+        self.samp_rate = samp_rate
+        if chunk_size is None:
+            chunk_size = max(tx_streamer.get_max_num_samps(), int(samp_rate * TxEngine.ChunkTime))
+        self.chunk_size = chunk_size
+
+        self.tx_data = None
+        self._source_data = None  # the tx_data passed to start(), before tiling
+        self._source_md = None  # the tx_md passed to start()
+        self._stop_event = Event()
+        self._send_thread = None
+        self._async_thread = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.samples_sent = 0
+        self.event_counts = {}  # {async event name: count}, like {"underflow": 3}
+        self._start_time = None
+        self._stop_time = None
+
+    def is_running(self):
+        return self._send_thread is not None and self._send_thread.is_alive()
+
+    def start(self, tx_data, tx_md=None):
+        """
+        start transmitting tx_data over and over; a running engine switches to the new tx_data (or tx_md)
+
+        :param tx_data: a numpy array with dimension 2 by N of complex64 numbers, see utils/signals.py
+        :param tx_md: the tx metadata of the burst; its time spec (if has_time_spec) is the start time of the first
+                      chunk. The engine sends copies, tx_md itself is not changed. None starts right away.
+        """
+        if self.is_running():
+            if tx_data is self._source_data and tx_md is self._source_md:
+                return
+            self.stop()
+
+        # a short buffer (like a single period) is tiled into a ring of at least one chunk
+        self._source_data = tx_data
+        self._source_md = tx_md
+        if tx_data.shape[-1] < self.chunk_size:
+            tx_data = np.tile(tx_data, (1, int(np.ceil(self.chunk_size / tx_data.shape[-1]))))
+        self.tx_data = tx_data
+
+        self._reset_stats()
+        self._stop_event.clear()
+        self._send_thread = Thread(target=self._send_loop, args=(tx_data, tx_md), daemon=True)
+        self._async_thread = Thread(target=self._async_loop, daemon=True)
+        self._start_time = time.perf_counter()
+        self._send_thread.start()
+        self._async_thread.start()
+
+    def stop(self, timeout=None):
+        """
+        stop transmitting: the send thread finishes its chunk, sends the end of burst and is joined
+        """
+        self._stop_event.set()
+        self.join(timeout)
+
+    def join(self, timeout=None):
+        for thread in (self._send_thread, self._async_thread):
+            if thread is not None:
+                thread.join(timeout)
+
+    def _send_loop(self, tx_data, start_md):
+        tx_md = lib.types.tx_metadata()
+        tx_md.start_of_burst = True
+        if start_md is not None and start_md.has_time_spec:
+            tx_md.has_time_spec = True
+            tx_md.time_spec = start_md.time_spec
+        length = tx_data.shape[-1]
+        pos = 0
+        while not self._stop_event.is_set():
+            end = min(pos + self.chunk_size, length)
+            num_sent = self.tx_streamer.send(tx_data[:, pos:end], tx_md)
+            tx_md.start_of_burst = False
+            tx_md.has_time_spec = False
+            self.samples_sent += num_sent
+            pos = (pos + num_sent) % length
+
+        # end the burst, so the device does not report an underflow when the samples run out
+        tx_md.end_of_burst = True
+        self.tx_streamer.send(np.zeros((tx_data.shape[0], 0), dtype=tx_data.dtype), tx_md)
+        self._stop_time = time.perf_counter()
+
+    def _async_loop(self):
+        async_md = lib.types.tx_async_metadata()
+        while self._send_thread.is_alive():
+            self._recv_async_msg(async_md)
+        # collect the messages of the end of the burst
+        while self._recv_async_msg(async_md):
+            pass
+
+    def _recv_async_msg(self, async_md):
+        if not self.tx_streamer.recv_async_msg(async_md, TxEngine.AsyncTimeout):
+            return False
+        event = async_md.event_code
+        name = getattr(event, "name", str(event).rsplit(".", 1)[-1])
+        self.event_counts[name] = self.event_counts.get(name, 0) + 1
+        return True
+
+    def stats(self):
+        """
+        :return: a dictionary with
+            "samples_sent": samples sent per channel since start()
+            "seconds": the time since start() (until stop())
+            "sample_rate": the achieved tx sample rate, samples_sent / seconds
+            "underflow", "seq_error", "time_error": the counts of these async messages
+            plus the counts of any other async message by its event code name
+        """
+        if self._start_time is None:
+            seconds = 0.0
+        else:
+            seconds = (self._stop_time or time.perf_counter()) - self._start_time
+        stats = {
+            "samples_sent": self.samples_sent,
+            "seconds": seconds,
+            "sample_rate": self.samples_sent / seconds if seconds > 0 else 0.0,
+            "underflow": 0,
+            "seq_error": 0,
+            "time_error": 0,
+        }
+        stats.update(self.event_counts)
+        return stats